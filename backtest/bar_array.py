@@ -0,0 +1,143 @@
+"""
+Memory-mapped bar arrays, for histories too big to comfortably hold as DataFrames (years of minute bars across a dozen tickers).
+
+Each ticker/interval is one .npy file of fixed-width records:
+
+backtest/datasets/arrays/
+|--TICKER
+   |--INTERVAL.npy
+
+with fields ts (int64 nanoseconds of US/Eastern wall-clock time, the bar store's index), Open/High/Low/Close (float64, or float32 for half
+the size) and Volume (uint32).  That's 44 bytes a bar in float64 and 28 in float32, against several times that for a DataFrame with a
+DatetimeIndex.  Opening a file maps it rather than reading it, so it "loads" instantly and only the pages actually touched ever come off disk,
+and the OS shares those pages between every process mapping the same file.
+
+Fields and time slices of an opened array are views onto the mapping: run_bracket and run_vectorized take them as they are, and
+to_frame() wraps them in a frame for backtesting.py without copying the columns.
+"""
+import os
+import datetime
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from bar_store import COLUMNS, STORE_ROOT, normalize_bars, normalize_interval, stored_months, read_bars, _partition_dir
+from resample import TIERS, update_tiers, resampled_months, read_resampled
+
+
+ARRAY_ROOT = os.path.join("backtest", "datasets", "arrays")
+PRICES = ["Open", "High", "Low", "Close"]
+
+
+def bar_dtype(price_dtype=np.float64) -> np.dtype:
+    """
+    Record layout of one bar, with prices stored as price_dtype (np.float64 or np.float32).
+    """
+    return np.dtype([("ts", "<i8")] + [(column, np.dtype(price_dtype).newbyteorder("<")) for column in PRICES] + [("Volume", "<u4")])
+
+
+BAR_DTYPE = bar_dtype(np.float64)
+COMPACT_BAR_DTYPE = bar_dtype(np.float32)
+
+
+def _array_path(ticker: str, interval: str, root: str) -> str:
+    return os.path.join(root, ticker.upper(), f"{normalize_interval(interval)}.npy")
+
+
+def _fill(records: np.ndarray, data: pd.DataFrame) -> None:
+    volume = data["Volume"].to_numpy()
+    if len(volume) and volume.max() > np.iinfo(np.uint32).max:
+        raise ValueError(f"Volume of {volume.max()} doesn't fit in a uint32.")
+    records["ts"] = data.index.values.astype("datetime64[ns]").view(np.int64)
+    for column in PRICES:
+        records[column] = data[column].to_numpy()
+    records["Volume"] = volume
+
+
+def to_bar_array(data: pd.DataFrame, price_dtype=np.float64) -> np.ndarray:
+    """
+    In-memory record array of a frame of bars (any loader's output).
+    """
+    data = normalize_bars(data)
+    records = np.empty(len(data), dtype=bar_dtype(price_dtype))
+    _fill(records, data)
+    return records
+
+
+def write_bar_array(data: pd.DataFrame, ticker: str, interval: str, price_dtype=np.float64, root: str=ARRAY_ROOT) -> str:
+    """
+    Writes a frame of bars as the ticker/interval's array file, replacing any previous one.  Returns the file's path.
+    """
+    data = normalize_bars(data)
+    path = _array_path(ticker, interval, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=bar_dtype(price_dtype), shape=(len(data),))
+    _fill(records, data)
+    records.flush()
+    del records
+    # same write-then-rename as the bar store, so readers never map a half-written file
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def build_from_store(ticker: str, interval: str, price_dtype=np.float64, store_root: str=STORE_ROOT, root: str=ARRAY_ROOT) -> str:
+    """
+    Converts everything the bar store holds for a ticker/interval into its array file.
+
+    Row counts come from the Parquet footers, so the file is sized up front and filled one month at a time, never holding more than a
+    month of bars as a DataFrame.  Intervals resample.py can derive include the derived bars, which are counted by reading each month's
+    timestamps instead (fetched and derived bars can overlap).
+    """
+    derivable = normalize_interval(interval) in TIERS
+    if derivable:
+        update_tiers(ticker, [interval], root=store_root)
+        months = resampled_months(ticker, interval, store_root)
+    else:
+        months = stored_months(ticker, interval, store_root)
+    month_bounds = {}
+    for m in months:
+        start = datetime.date(int(m[:4]), int(m[5:]), 1)
+        month_bounds[m] = (start, datetime.date(start.year + start.month // 12, start.month % 12 + 1, 1))
+    if derivable:
+        total = sum(len(read_resampled(ticker, interval, *month_bounds[m], columns=["Close"], root=store_root, update=False)) for m in months)
+    else:
+        partition_dir = _partition_dir(ticker, interval, store_root)
+        total = sum(pq.read_metadata(os.path.join(partition_dir, f"{m}.parquet")).num_rows for m in months)
+    path = _array_path(ticker, interval, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=bar_dtype(price_dtype), shape=(total,))
+    filled = 0
+    for m in months:
+        month_data = read_resampled(ticker, interval, *month_bounds[m], root=store_root, update=False)
+        _fill(records[filled:filled + len(month_data)], month_data)
+        filled += len(month_data)
+    records.flush()
+    del records
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def open_bar_array(ticker: str, interval: str, root: str=ARRAY_ROOT) -> np.ndarray:
+    """
+    Maps a ticker/interval's array file read-only.
+    """
+    path = _array_path(ticker, interval, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No bar array for {ticker} {interval} at {path}, build one with build_from_store or write_bar_array.")
+    return np.load(path, mmap_mode="r")
+
+
+def time_slice(bars: np.ndarray, start_date: datetime.date=None, end_date: datetime.date=None) -> np.ndarray:
+    """
+    The bars in [start_date, end_date), as a view found by bisecting the timestamps.
+    """
+    first = 0 if start_date is None else np.searchsorted(bars["ts"], pd.Timestamp(start_date).value, side="left")
+    last = len(bars) if end_date is None else np.searchsorted(bars["ts"], pd.Timestamp(end_date).value, side="left")
+    return bars[first:last]
+
+
+def to_frame(bars: np.ndarray) -> pd.DataFrame:
+    """
+    Datetime indexed frame over a bar array for backtesting.py.  The OHLCV columns are views onto the array, only the index is copied.
+    """
+    index = pd.DatetimeIndex(bars["ts"].view("datetime64[ns]"), name="Datetime")
+    return pd.DataFrame({column: bars[column] for column in COLUMNS}, index=index, copy=False)
@@ -0,0 +1,202 @@
+"""
+Columnar bar store used by the backtest loaders.  Instead of one CSV per ticker, bars are kept as typed Parquet files partitioned like so:
+
+backtest/datasets/store/
+|--TICKER
+   |--INTERVAL (normalized, i.e. "1m" whether it came from YFinance's "1m" or AlphaVantage's "1min")
+      |--YYYY-MM.parquet
+
+Each file holds a native timestamp column (US/Eastern wall-clock time, timezone-naive) plus float64 OHLC and int64 Volume, so reads skip
+both the text parse and the datetime parse, and only the months/columns asked for are ever touched.
+"""
+import os
+import datetime
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+STORE_ROOT = os.path.join("backtest", "datasets", "store")
+MARKET_TZ = "America/New_York"
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+SCHEMA = {"Open": "float64", "High": "float64", "Low": "float64", "Close": "float64", "Volume": "int64"}
+ARROW_SCHEMA = pa.schema([("Datetime", pa.timestamp("ns")),
+                          ("Open", pa.float64()),
+                          ("High", pa.float64()),
+                          ("Low", pa.float64()),
+                          ("Close", pa.float64()),
+                          ("Volume", pa.int64())])
+INTERVAL_ALIASES = {"1min": "1m", "5min": "5m", "15min": "15m", "30min": "30m", "60min": "1h", "60m": "1h", "1day": "1d"}
+
+
+def normalize_interval(interval: str) -> str:
+    """
+    Maps the provider specific interval names onto the ones used by the store, so 1 minute bars from either provider land in the same place.
+    """
+    return INTERVAL_ALIASES.get(interval, interval)
+
+
+def _partition_dir(ticker: str, interval: str, root: str) -> str:
+    return os.path.join(root, ticker.upper(), normalize_interval(interval))
+
+
+def _month_key(timestamp: pd.Timestamp) -> str:
+    return f"{timestamp.year}-{timestamp.month:02d}"
+
+
+def _months_between(start_date: datetime.date, end_date: datetime.date) -> list:
+    """
+    Month keys touched by the half-open range [start_date, end_date).
+    """
+    months = []
+    cursor = datetime.date(start_date.year, start_date.month, 1)
+    while cursor < end_date:
+        months.append(f"{cursor.year}-{cursor.month:02d}")
+        cursor = datetime.date(cursor.year + cursor.month // 12, cursor.month % 12 + 1, 1)
+    return months
+
+
+def normalize_bars(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coerces a provider frame into the store's layout: Datetime index (US/Eastern, timezone-naive), typed OHLCV columns, sorted ascending, no duplicate timestamps.
+
+    Handles both YFinance frames (possibly MultiIndex columns and a timezone-aware index) and AlphaVantage frames (string index and string values).
+    """
+    if data.empty:
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in SCHEMA.items()}, index=pd.DatetimeIndex([], name="Datetime"))
+    if isinstance(data.columns, pd.MultiIndex):
+        # newer versions of yfinance return (Price, Ticker) columns even for a single ticker
+        data = data.droplevel(-1, axis="columns")
+    index = pd.DatetimeIndex(pd.to_datetime(data.index))
+    if index.tz is not None:
+        index = index.tz_convert(MARKET_TZ).tz_localize(None)
+    data = data[COLUMNS].copy()
+    data.index = index.astype("datetime64[ns]")
+    data.index.name = "Datetime"
+    data = data.apply(pd.to_numeric)
+    data["Volume"] = data["Volume"].fillna(0)
+    data = data.astype(SCHEMA)
+    data = data[~data.index.duplicated(keep="last")]
+    return data.sort_index()
+
+
+def write_bars(data: pd.DataFrame, ticker: str, interval: str, root: str=STORE_ROOT) -> None:
+    """
+    Writes bars into the store, merging with whatever is already stored for the affected months.  Newer rows win on duplicate timestamps.
+
+    Inputs:
+    ------
+    data: a frame of bars from any of the loaders
+    ticker: the ticker the bars belong to
+    interval: the granularity of the bars, provider specific names are fine
+    root: where the store lives
+    """
+    data = normalize_bars(data)
+    if data.empty:
+        return
+    partition_dir = _partition_dir(ticker, interval, root)
+    os.makedirs(partition_dir, exist_ok=True)
+    months = data.index.year * 100 + data.index.month
+    for _, month_data in data.groupby(months):
+        path = os.path.join(partition_dir, f"{_month_key(month_data.index[0])}.parquet")
+        if os.path.exists(path):
+            existing = pq.read_table(path).to_pandas().set_index("Datetime")
+            month_data = pd.concat([existing, month_data])
+            month_data = month_data[~month_data.index.duplicated(keep="last")].sort_index()
+        table = pa.Table.from_pandas(month_data.reset_index(), schema=ARROW_SCHEMA, preserve_index=False)
+        # write then rename, so a crash mid-write never leaves a half-written partition behind
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def stored_months(ticker: str, interval: str, root: str=STORE_ROOT) -> list:
+    """
+    Returns the sorted month keys ("YYYY-MM") that have a partition file for the given ticker and interval.
+    """
+    partition_dir = _partition_dir(ticker, interval, root)
+    if not os.path.isdir(partition_dir):
+        return []
+    return sorted(f[:-len(".parquet")] for f in os.listdir(partition_dir) if f.endswith(".parquet"))
+
+
+def read_bars(ticker: str, interval: str, start_date: datetime.date=None, end_date: datetime.date=None, columns: list=None, root: str=STORE_ROOT) -> pd.DataFrame:
+    """
+    Reads bars from the store.  Only the partitions overlapping the requested range are opened, and only the requested columns are decoded.
+
+    Inputs:
+    ------
+    ticker: the ticker to read
+    interval: the granularity to read
+    start_date: first day to include, defaults to the start of the stored history
+    end_date: first day to exclude, defaults to the end of the stored history
+    columns: subset of Open, High, Low, Close, Volume to read, defaults to all of them
+    root: where the store lives
+
+    Returns a Datetime indexed frame sorted ascending, which is empty if nothing is stored for the range.
+    """
+    columns = COLUMNS if columns is None else list(columns)
+    months = stored_months(ticker, interval, root)
+    if start_date is not None and end_date is not None:
+        wanted = set(_months_between(start_date, end_date))
+        months = [m for m in months if m in wanted]
+    elif start_date is not None:
+        months = [m for m in months if m >= _month_key(pd.Timestamp(start_date))]
+    elif end_date is not None:
+        months = [m for m in months if m <= _month_key(pd.Timestamp(end_date))]
+    filters = []
+    if start_date is not None:
+        filters.append(("Datetime", ">=", pd.Timestamp(start_date)))
+    if end_date is not None:
+        filters.append(("Datetime", "<", pd.Timestamp(end_date)))
+    partition_dir = _partition_dir(ticker, interval, root)
+    tables = [pq.read_table(os.path.join(partition_dir, f"{m}.parquet"), columns=["Datetime"] + columns, filters=filters or None) for m in months]
+    if not tables:
+        return normalize_bars(pd.DataFrame())[columns]
+    data = pa.concat_tables(tables).to_pandas().set_index("Datetime")
+    return data.sort_index()
+
+
+def _manifest_path(ticker: str, interval: str, root: str) -> str:
+    return os.path.join(_partition_dir(ticker, interval, root), "_manifest.json")
+
+
+def cached_ranges(ticker: str, interval: str, root: str=STORE_ROOT) -> list:
+    """
+    Returns the coverage manifest for a ticker and interval, i.e. the sorted, non-overlapping [start, end) date ranges that have been fully fetched.
+
+    A range being cached means a provider was asked for it, not that it holds bars (weekends and holidays are cached but empty).
+    """
+    path = _manifest_path(ticker, interval, root)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        manifest = json.load(f)
+    return [(datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)) for start, end in manifest["ranges"]]
+
+
+def mark_cached(ticker: str, interval: str, start_date: datetime.date, end_date: datetime.date, root: str=STORE_ROOT) -> None:
+    """
+    Records [start_date, end_date) as fully fetched in the coverage manifest, merging it with any touching ranges.
+    """
+    if end_date <= start_date:
+        return
+    ranges = sorted(cached_ranges(ticker, interval, root) + [(start_date, end_date)])
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    path = _manifest_path(ticker, interval, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"ranges": [[start.isoformat(), end.isoformat()] for start, end in merged]}, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def is_cached(ticker: str, interval: str, start_date: datetime.date, end_date: datetime.date, root: str=STORE_ROOT) -> bool:
+    """
+    Whether the whole of [start_date, end_date) is covered by the manifest.
+    """
+    return any(start <= start_date and end_date <= end for start, end in cached_ranges(ticker, interval, root))
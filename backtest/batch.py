@@ -0,0 +1,133 @@
+"""
+Batch backtests over every combination of tickers, strategies and date ranges, i.e. how do CoinFlip, VolatilityLong and VolatilityShort
+each do on TQQQ and SQQQ in 2022, 2023 and 2024.
+
+Each ticker's bars are loaded once (covering all of its date ranges) and copied into a shared memory block; the runs are spread over a
+process pool, each worker attaching to a ticker's block the first time it gets a run on it.  Every run's stats, trade list and equity curve
+go into the results store (see results_store.py), keyed the same way walk-forward runs are, so runs whose strategy code, parameters, Backtest
+settings and bars haven't changed are skipped on later batches and nothing is ever written to a shared file name.  Strategies that flip
+coins without a seed (CoinFlip by default) are the exception, they're run again every time.
+"""
+import os
+import json
+import datetime
+import pandas as pd
+import backtesting
+from concurrent.futures import ProcessPoolExecutor
+from orchestrator import load_data
+from sweep import share_bars, open_bars
+from bar_store import normalize_interval
+from vectorized import run_vectorized, reproduces, BRACKET_STRATEGIES
+from results_store import connect, strategy_fingerprint, data_fingerprint, run_key, is_deterministic, get_run_stats, put_run, to_json, RESULTS_DB, TRADE_COLUMNS
+
+
+# shm name -> (shm, frame), filled lazily in each worker
+_attached = {}
+
+
+def _engine_for(model: backtesting.Strategy, engine: str, backtest_kwargs: dict) -> str:
+    if engine == "vectorized" and not reproduces(backtest_kwargs):
+        raise ValueError(f"The vectorized engine only takes cash, it can't run with {backtest_kwargs}.")
+    if engine != "auto":
+        return engine
+    # the vectorized engine reproduces the event-driven one's trades exactly, but only for the bracket strategies and default settings
+    bracket = any(issubclass(model, s) for s in BRACKET_STRATEGIES)
+    return "vectorized" if bracket and reproduces(backtest_kwargs) else "event"
+
+
+def run_batch_job(shm_name: str, n: int, model: backtesting.Strategy, params: dict, backtest_kwargs: dict, engine: str, bounds: tuple) -> tuple:
+    """
+    Runs one backtest in a worker on bars[bounds[0]:bounds[1]] of a share_bars block, returning (scalar stats, trades, equity curve).
+    """
+    if shm_name not in _attached:
+        _attached[shm_name] = open_bars(shm_name, n)
+    data = _attached[shm_name][1].iloc[bounds[0]:bounds[1]]
+    if engine == "vectorized":
+        stats = run_vectorized(data, model, cash=backtest_kwargs.get("cash", 10_000), **params)
+    else:
+        stats = backtesting.Backtest(data=data, strategy=model, **backtest_kwargs).run(**params)
+    scalars = {k: v for k, v in stats.items() if not k.startswith("_")}
+    return scalars, stats["_trades"][TRADE_COLUMNS].reset_index(drop=True), stats["_equity_curve"]["Equity"]
+
+
+def batch(tickers: list, strategies: list, date_ranges: list, interval: str="1m", loader=None, max_workers: int=None, backtest_kwargs: dict=None,
+          engine: str="auto", results_db: str=RESULTS_DB) -> pd.DataFrame:
+    """
+    Backtests every ticker x strategy x date range combination across a process pool, storing each run in the results store.
+
+    Inputs:
+    ------
+    tickers: tickers to run on
+    strategies: strategy classes, or (strategy class, params dict) pairs to run a strategy with parameters other than its defaults
+    date_ranges: (start_date, end_date) pairs, end exclusive
+    interval: granularity of the bars
+    loader: one of the loaders in data_loaders.py, defaults to load_data_from_store
+    max_workers: size of the process pool, defaults to the number of cores
+    backtest_kwargs: extra keyword arguments for backtesting.Backtest, defaults to exclusive_orders=True
+    engine: "event", "vectorized" or "auto" (vectorized for the bracket strategies unless backtest_kwargs set more than the cash, event-driven
+            for the rest)
+    results_db: path of the results store
+
+    Returns one row per run with its key in the results store (for results_store.read_trades/read_equity), the run's description and its
+    scalar stats.
+    """
+    if loader is None:
+        from data_loaders import load_data_from_store
+        loader = load_data_from_store
+    backtest_kwargs = {"exclusive_orders": True} if backtest_kwargs is None else backtest_kwargs
+    strategies = [s if isinstance(s, tuple) else (s, {}) for s in strategies]
+    conn = connect(results_db)
+    blocks = []
+    rows = []
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            pending = []
+            for ticker in tickers:
+                data = load_data({"loader": loader, "ticker": ticker, "interval": interval,
+                                  "start_date": min(r[0] for r in date_ranges), "end_date": max(r[1] for r in date_ranges)})
+                shm, n = share_bars(data)
+                blocks.append(shm)
+                timestamps = data.index
+                for start_date, end_date in date_ranges:
+                    bounds = (int(timestamps.searchsorted(pd.Timestamp(start_date))), int(timestamps.searchsorted(pd.Timestamp(end_date))))
+                    if bounds[0] == bounds[1]:
+                        print(f"No {interval} bars for {ticker} between {start_date} and {end_date}, skipping.")
+                        continue
+                    data_hash = data_fingerprint(data.iloc[bounds[0]:bounds[1]])
+                    for model, params in strategies:
+                        run_engine = _engine_for(model, engine, backtest_kwargs)
+                        key = run_key(strategy_fingerprint(model), params, data_hash, run_engine, backtest_kwargs)
+                        row = {"key": key, "Ticker": ticker.upper(), "Strategy": model.__name__, "Params": params, "Engine": run_engine,
+                               "Start": start_date, "End": end_date}
+                        # an unseeded random strategy is re-run every time, its last run only replaces the stored one
+                        cached = get_run_stats(conn, key) if is_deterministic(model, params) else None
+                        if cached is not None:
+                            rows.append({**row, **cached})
+                            continue
+                        future = pool.submit(run_batch_job, shm.name, n, model, params, backtest_kwargs, run_engine, bounds)
+                        # keeps its place, so rows come back in ticker x date range x strategy order whatever was cached
+                        rows.append(None)
+                        pending.append((len(rows) - 1, row, future))
+                del data
+            for position, row, future in pending:
+                stats, trades, equity = future.result()
+                put_run(conn, row["key"], row["Ticker"], normalize_interval(interval), row["Strategy"], row["Params"], row["Engine"],
+                        row["Start"], row["End"], stats, trades, equity)
+                # round trip through JSON, so fresh and stored stats look the same
+                rows[position] = {**row, **json.loads(to_json(stats))}
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+        conn.close()
+    print(f"{len(rows) - len(pending)} of {len(rows)} runs read from the results store.")
+    return pd.DataFrame(rows)
+
+
+if __name__=="__main__":
+    from models.CoinFlip import CoinFlip
+    from models.VolatilityLongStrategy import VolatilityLongStrategy
+    from models.VolatilityShortStrategy import VolatilityShortStrategy
+    date_ranges = [(datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)) for year in [2022, 2023]]
+    results = batch(tickers=["TQQQ", "SQQQ"], strategies=[CoinFlip, VolatilityLongStrategy, VolatilityShortStrategy], date_ranges=date_ranges)
+    print(results[["Ticker", "Strategy", "Start", "End", "Return [%]", "# Trades"]])
@@ -1,9 +1,18 @@
-import time
-import requests
 import yfinance as yf
 import pandas as pd
 import datetime
 import os
+import sys
+from bar_store import read_bars, write_bars, is_cached, mark_cached, normalize_bars, normalize_interval
+from fetch_scheduler import ThrottledError, QuotaExhausted, fetch_in_order, get_rate_limiter, get_session
+from market_calendar import get_calendar
+from bar_array import open_bar_array, time_slice, to_frame
+from resample import TIERS, update_tiers, read_resampled
+
+
+# YFinance only serves intraday bars for roughly the last 30 days
+YFINANCE_INTRADAY_LOOKBACK = datetime.timedelta(days=30)
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
 
 
 def _col_rename(c):
@@ -13,95 +22,257 @@ def _col_rename(c):
 
 
 def _find_prior_monday(date_of_interest: datetime.date) -> datetime.date:
-    cursor = date_of_interest
-    while not cursor.weekday() == 0:
-        cursor -= datetime.timedelta(days=1)
-    return cursor
+    return date_of_interest - datetime.timedelta(days=date_of_interest.weekday())
 
 
 def _get_one_week_yfinance(ticker: str, interval: str, start_date: datetime.date, end_date: datetime.date) -> pd.DataFrame:
-    data = yf.download(tickers=ticker, start=start_date, end=end_date, interval=interval)
+    try:
+        # threads=False since the fetch scheduler already runs these on its own pool
+        data = yf.download(tickers=ticker, start=start_date, end=end_date, interval=interval, threads=False, progress=False)
+    except Exception as e:
+        if type(e).__name__ == "YFRateLimitError":
+            raise ThrottledError(str(e))
+        raise
     return pd.DataFrame(data)
 
 
-def load_data_from_yfinance(ticker: str="TQQQ", interval: str="1m", start_date: datetime.date=datetime.date(2024, 1, 1), end_date=datetime.date(2024, 2, 1)) -> pd.DataFrame:
+def _week_slices(start_date: datetime.date, end_date: datetime.date) -> list:
+    """
+    Splits [start_date, end_date) into Monday-aligned weeks, clipped to the range, which is how YFinance gets queried.
+    """
+    slices = []
+    cursor = _find_prior_monday(start_date)
+    while cursor < end_date:
+        slices.append((max(cursor, start_date), min(cursor + datetime.timedelta(days=7), end_date)))
+        cursor += datetime.timedelta(days=7)
+    return slices
+
+
+def _month_slices(start_date: datetime.date, end_date: datetime.date) -> list:
+    """
+    Splits [start_date, end_date) into calendar months, unclipped, since AlphaVantage always serves whole months.
     """
-    Basic loader, takes in a ticker and returns the last month of minute-by-minute data.
+    slices = []
+    cursor = datetime.date(start_date.year, start_date.month, 1)
+    while cursor < end_date:
+        next_month = datetime.date(cursor.year + cursor.month // 12, cursor.month % 12 + 1, 1)
+        slices.append((cursor, next_month))
+        cursor = next_month
+    return slices
+
+
+def _stream_slices(ticker: str, interval: str, slices: list, missing: list, fetch, limiter, normalize, yield_cached: bool, max_workers: int):
     """
-    file_name = "backtest/datasets/" + ticker + "_data.csv"
+    Walks slices in time order, yielding one normalized chunk of bars per slice.  Slices in missing are fetched (concurrently, but handed
+    back in order), normalized, written to the bar store and marked as cached as they arrive.  The others are read back from the store, or
+    passed over entirely when yield_cached is False.
+    """
+    today = datetime.date.today()
+    missing_set = set(missing)
+    fetched = fetch_in_order(missing, fetch, limiter, max_workers=max_workers)
     try:
-        # TODO: More complex flow wanted here, date to check and see if the data is up to date.  If not, update.  or, delete?
-        data = pd.read_csv(file_name, parse_dates=True, index_col="Datetime")
-        print(f"\nSuccessful load of {ticker} from CSV. \n")
-    except:
-        datas = []
-        cursor_start = _find_prior_monday(end_date)
-        datas.append(_get_one_week_yfinance(ticker, interval=interval, start_date=cursor_start, end_date=end_date))
-        cursor_start -= datetime.timedelta(days=7)
-        while cursor_start >= start_date and end_date - cursor_start < datetime.timedelta(days=30):
-            # Fix to deal with intervals longer than a day
-            datas.append(_get_one_week_yfinance(ticker, interval, cursor_start, cursor_start + datetime.timedelta(6)))
-            cursor_start -= datetime.timedelta(days=7)
-        data = pd.concat(datas)
-        data.to_csv(file_name)
-        print(f"\nSuccessful load of {ticker} from YF. \n")
-    return data.sort_index(ascending=False)
-
-
-def _get_one_month_data_from_alpha_vantage(api_key: str, ticker: str, interval: str, month: str) -> pd.DataFrame:
-    """
-    Gets one month of data from AlphaVantage's API.
+        for slice_start, slice_end in slices:
+            if (slice_start, slice_end) in missing_set:
+                _, raw = next(fetched)
+                data = normalize(raw, slice_start)
+                write_bars(data, ticker, interval)
+                # the running slice is only cached up to today, so it gets topped up on the next run
+                mark_cached(ticker, interval, slice_start, min(slice_end, today))
+            elif yield_cached:
+                data = read_bars(ticker, interval, slice_start, slice_end)
+            else:
+                continue
+            if len(data):
+                yield data
+    finally:
+        fetched.close()
+
+
+def iter_bars_from_yfinance(ticker: str="TQQQ", interval: str="1m", start_date: datetime.date=datetime.date(2024, 1, 1), end_date: datetime.date=datetime.date(2024, 2, 1), max_workers: int=4, yield_cached: bool=True):
     """
+    Streams bars from YFinance one week at a time, as typed, time-ordered frames in the bar store's layout.
+
+    Only the weeks missing from the bar store's coverage manifest get downloaded, and weeks are only marked as cached once they're over,
+    so re-running a backtest over the same range costs no downloads.  YFinance can't serve intraday bars older than ~30 days, so those weeks
+    are skipped with a warning instead of being requested.  Missing weeks are downloaded concurrently (see fetch_scheduler.py) and each is
+    written to the store as it arrives, so at most a few weeks are ever held in memory.
+    """
+    today = datetime.date.today()
+    calendar = get_calendar()
+    slices = []
+    missing = []
+    for slice_start, slice_end in _week_slices(start_date, end_date):
+        if slice_start > today:
+            continue
+        slices.append((slice_start, slice_end))
+        if is_cached(ticker, interval, slice_start, slice_end):
+            continue
+        if not len(calendar.sessions_in_range(slice_start, slice_end)):
+            # nothing but weekends and holidays, no point asking
+            mark_cached(ticker, interval, slice_start, min(slice_end, today))
+            continue
+        if interval not in ["1d", "5d", "1wk", "1mo", "3mo"] and slice_end < today - YFINANCE_INTRADAY_LOOKBACK:
+            print(f"Skipping {slice_start} to {slice_end} for {ticker}, YFinance doesn't serve {interval} bars that far back.")
+            continue
+        missing.append((slice_start, slice_end))
+    fetch = lambda week: _get_one_week_yfinance(ticker, interval, week[0], week[1])
+    normalize = lambda raw, slice_start: normalize_bars(raw)
+    yield from _stream_slices(ticker, interval, slices, missing, fetch, get_rate_limiter("yfinance"), normalize, yield_cached, max_workers)
+    print(f"\nSuccessful load of {ticker}, {len(missing)} week(s) fetched from YF. \n")
+
+
+def load_data_from_yfinance(ticker: str="TQQQ", interval: str="1m", start_date: datetime.date=datetime.date(2024, 1, 1), end_date=datetime.date(2024, 2, 1), max_workers: int=4) -> pd.DataFrame:
+    """
+    Basic loader, takes in a ticker and returns minute-by-minute data for the range.  Fetches whatever the bar store is missing (see
+    iter_bars_from_yfinance), then reads the whole range back from the store.
+    """
+    for _ in iter_bars_from_yfinance(ticker, interval, start_date, end_date, max_workers=max_workers, yield_cached=False):
+        pass
+    return read_bars(ticker, interval, start_date, end_date)
+
+
+def _get_one_month_data_from_alpha_vantage(api_key: str, ticker: str, interval: str, month: str, base_url: str=ALPHA_VANTAGE_URL) -> pd.DataFrame:
+    """
+    Gets one month of data from AlphaVantage's API, through the pooled AlphaVantage session.
+
+    Raises ThrottledError when AlphaVantage answers with its rate limit message (it does so with a 200, not a 429), so the fetch scheduler retries it,
+    and QuotaExhausted when the message says the daily limit is reached, which no retry gets past.
+    """
+    params = {"function": "TIME_SERIES_INTRADAY", "symbol": ticker, "interval": interval, "apikey": api_key, "month": month, "outputsize": "full", "extended_hours": "false"}
+    data = None
     try:
-        url = f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY&symbol={ticker}&interval={interval}&apikey={api_key}&month={month}&outputsize=full&extended_hours=false"
-        response = requests.get(url)
+        response = get_session("alpha_vantage").get(base_url, params=params, timeout=60)
+        if response.status_code == 429:
+            raise ThrottledError(f"HTTP 429 for {month}")
         data = response.json()
         key_to_access = f"Time Series ({interval})"
+        if key_to_access not in data and any(k in data for k in ["Note", "Information"]):
+            message = str(data.get("Information", data.get("Note")))
+            if "per day" in message.lower():
+                raise QuotaExhausted(message)
+            raise ThrottledError(message)
         pd_data = pd.DataFrame(data[key_to_access])
         return pd_data
+    except (ThrottledError, QuotaExhausted):
+        raise
     except Exception as e:
-        print(data)
+        print(data if data is not None else e)
         return pd.DataFrame()
 
 
-def load_data_from_alpha_vantage(ticker: str="TQQQ", interval: str="1min", start_date: datetime.date=datetime.date(2015, 1, 1), end_date: datetime.date=datetime.date(2020,1,1)) -> pd.DataFrame:
+def _alpha_vantage_chunk(raw: pd.DataFrame, month_start: datetime.date) -> pd.DataFrame:
+    """
+    Turns one month of AlphaVantage's JSON (one column per timestamp, "1. open"-style keys) into typed bars.
     """
-    Load data from AlphaVantage.  Useful for longer-running dense data.
-    
+    if raw.empty:
+        print(raw)
+        raise Exception(f"AlphaVantage API has failed.  Last call used {month_start.year}-{month_start.month:02d}")
+    data = raw.transpose().rename(_col_rename, axis='columns')
+    data.index.name = "Datetime"
+    return normalize_bars(data)
+
+
+def iter_bars_from_alpha_vantage(ticker: str="TQQQ", interval: str="1min", start_date: datetime.date=datetime.date(2015, 1, 1), end_date: datetime.date=datetime.date(2020,1,1), max_workers: int=4, base_url: str=ALPHA_VANTAGE_URL, yield_cached: bool=True):
+    """
+    Streams bars from AlphaVantage one month at a time, as typed, time-ordered frames in the bar store's layout.
+
+    Months already in the bar store's coverage manifest are never re-requested, so re-running a backtest over the same range makes no API
+    calls.  Missing months are requested concurrently but come back in order, each one normalized and written to the store as it arrives,
+    so only a handful of months are ever in memory however long the range is.
+
     Inputs:
     ticker: from NASDAQ
     interval: MUST BE IN 1min, 5min, 15min, 30min, 60min
     start_date: when to start the data
     end_date: when to end the data
+    max_workers: how many months are requested concurrently, all of them sharing the AlphaVantage rate limiter
+    base_url: the AlphaVantage query endpoint, overridable to point at a local stub server
+    yield_cached: whether months already in the store are read back and yielded too, or only fetched months are
     """
-    api_key = os.environ["ALPHA_VANTAGE_API_KEY"]
     if interval not in ["1min", "5min", "15min", "30min", "60min"]:
         raise ValueError()
-    filename = f"backtest/datasets/{ticker}_data.csv"
-    dfs = []
-    cursor = start_date
-    while not cursor == end_date:
-        if cursor.month < 10:
-            mo = f"0{cursor.month}"
-        else:
-            mo = f"{cursor.month}"
-        month = f"{cursor.year}-{mo}"
-        if cursor.month == 12:
-            cursor = datetime.date(year=cursor.year+1, month=1, day=1)
-        else:
-            cursor = datetime.date(year=cursor.year, month=cursor.month+1, day=1)
-        data = _get_one_month_data_from_alpha_vantage(api_key=api_key, ticker=ticker, interval=interval, month=month)
-        if data.empty:
-            print(data)
-            raise Exception(f"AlphaVantage API has failed.  Last call used {month}")
-        data = data.transpose().rename(_col_rename, axis='columns')
-        data.index.name = "Datetime"
-        dfs.append(data)
-        # Sleep to not be rate limited (75 requests per minute allowed)
-        time.sleep(60/75)
-    df = pd.concat(dfs).sort_index(ascending=False)
-    df.to_csv(filename)
-    return df
+    today = datetime.date.today()
+    slices = [(month_start, month_end) for month_start, month_end in _month_slices(start_date, end_date) if month_start <= today]
+    missing = [(month_start, month_end) for month_start, month_end in slices if not is_cached(ticker, interval, month_start, month_end)]
+    if missing:
+        api_key = os.environ["ALPHA_VANTAGE_API_KEY"]
+    fetch = lambda month: _get_one_month_data_from_alpha_vantage(api_key=api_key, ticker=ticker, interval=interval, month=f"{month[0].year}-{month[0].month:02d}", base_url=base_url)
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    # AlphaVantage serves whole months, only the part inside the range is handed on (the store still gets all of it)
+    for data in _stream_slices(ticker, interval, slices, missing, fetch, get_rate_limiter("alpha_vantage"), _alpha_vantage_chunk, yield_cached, max_workers):
+        data = data[(data.index >= start) & (data.index < end)]
+        if len(data):
+            yield data
+    print(f"\nSuccessful load of {ticker}, {len(missing)} month(s) fetched from AlphaVantage. \n")
+
+
+def load_data_from_alpha_vantage(ticker: str="TQQQ", interval: str="1min", start_date: datetime.date=datetime.date(2015, 1, 1), end_date: datetime.date=datetime.date(2020,1,1), max_workers: int=4, base_url: str=ALPHA_VANTAGE_URL) -> pd.DataFrame:
+    """
+    Load data from AlphaVantage.  Useful for longer-running dense data.  Fetches whatever the bar store is missing (see
+    iter_bars_from_alpha_vantage), then reads the whole range back from the store.
+
+    Coarser intervals cost AlphaVantage the same request per month as 1min does, so only 1min bars are fetched and the others are derived
+    from them (see resample.py): asking for 5min after 1min, or the other way around, doesn't fetch anything twice.
+    """
+    if normalize_interval(interval) in TIERS:
+        for _ in iter_bars_from_alpha_vantage(ticker, "1min", start_date, end_date, max_workers=max_workers, base_url=base_url, yield_cached=False):
+            pass
+        return read_resampled(ticker, interval, start_date, end_date)
+    for _ in iter_bars_from_alpha_vantage(ticker, interval, start_date, end_date, max_workers=max_workers, base_url=base_url, yield_cached=False):
+        pass
+    return read_bars(ticker, interval, start_date, end_date)
+
+
+def iter_bars_from_store(ticker: str="TQQQ", interval: str="1m", start_date: datetime.date=datetime.date(2024, 1, 1), end_date: datetime.date=datetime.date(2024, 2, 1)):
+    """
+    Streams already stored bars one month at a time, for backtests over more history than fits in memory as one frame.  Intervals
+    resample.py can derive are brought up to date with the stored 1m bars first, like load_data_from_store does.
+    """
+    if normalize_interval(interval) in TIERS:
+        update_tiers(ticker, [interval], start_date, end_date)
+    for month_start, month_end in _month_slices(start_date, end_date):
+        data = read_resampled(ticker, interval, max(month_start, start_date), min(month_end, end_date), update=False)
+        if len(data):
+            yield data
+
+
+def load_data_from_store(ticker: str="TQQQ", interval: str="1m", start_date: datetime.date=datetime.date(2024, 1, 1), end_date: datetime.date=datetime.date(2024, 2, 1)) -> pd.DataFrame:
+    """
+    Loads bars straight from the bar store without touching any provider, for when the data has already been fetched by one of the other loaders.
+    Intervals resample.py can derive are brought up to date with the stored 1m bars first.
+    """
+    data = read_resampled(ticker, interval, start_date, end_date)
+    if data.empty:
+        raise ValueError(f"No {interval} bars stored for {ticker} between {start_date} and {end_date}.")
+    return data
+
+
+def load_data_from_bar_array(ticker: str="TQQQ", interval: str="1m", start_date: datetime.date=datetime.date(2024, 1, 1), end_date: datetime.date=datetime.date(2024, 2, 1)) -> pd.DataFrame:
+    """
+    Loads bars from the ticker/interval's memory-mapped bar array (see bar_array.py).  The range is found by bisection and the frame's
+    columns are views onto the mapped file, so nothing outside the range is read and the OHLCV data isn't copied.
+    """
+    bars = time_slice(open_bar_array(ticker, interval), start_date, end_date)
+    if not len(bars):
+        raise ValueError(f"No {interval} bars in the bar array for {ticker} between {start_date} and {end_date}.")
+    return to_frame(bars)
+
+
+def load_data_from_sqlite(ticker: str="TQQQ", interval: str="1m", start_date: datetime.date=datetime.date(2024, 1, 1), end_date: datetime.date=datetime.date(2024, 2, 1), db_path: str="trading_data.sqlite") -> pd.DataFrame:
+    """
+    Loads bars from the trading database the live runs append to (see src/storage/database.py), so backtests can run on the same history.
+    """
+    # backtests run with backtest/ on the path, the storage module lives in src/ one level up
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.storage.database import connect, read_bars as read_db_bars
+    conn = connect(db_path)
+    try:
+        data = read_db_bars(conn, ticker, interval, start_date, end_date)
+    finally:
+        conn.close()
+    if data.empty:
+        raise ValueError(f"No {interval} bars in {db_path} for {ticker} between {start_date} and {end_date}.")
+    return data
 
 
 if __name__=="__main__":
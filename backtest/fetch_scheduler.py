@@ -0,0 +1,212 @@
+"""
+Concurrent fetch engine for the data loaders.  Requests for slices (weeks/months) are spread over a thread pool, every request first takes a
+token from the provider's rate limiter, throttled requests are retried with exponential backoff, and results are handed back in the order the
+slices were asked for no matter what order they finish in.  Daily quotas are counted across processes (see USAGE_PATH), and a provider
+saying its daily limit is reached stops the fetch with QuotaExhausted rather than being retried.
+"""
+import os
+import json
+import time
+import random
+import datetime
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+
+def _daily_quota(variable: str, default: int) -> int:
+    """
+    A daily quota overridden by the environment variable, where "none" lifts it (i.e. for a premium key).
+    """
+    value = os.environ.get(variable)
+    if value is None:
+        return default
+    return None if value.strip().lower() in ["", "none", "0"] else int(value)
+
+
+# per-minute and daily request quotas for each provider, None meaning unlimited.  AlphaVantage's free tier allows 25 requests a day, stopping
+# there raises QuotaExhausted instead of retrying requests it would refuse anyway (ALPHA_VANTAGE_DAILY_QUOTA overrides it)
+PROVIDER_LIMITS = {
+    "alpha_vantage": {"per_minute": 75, "per_day": _daily_quota("ALPHA_VANTAGE_DAILY_QUOTA", 25)},
+    "yfinance": {"per_minute": 60, "per_day": _daily_quota("YFINANCE_DAILY_QUOTA", None)},
+}
+# requests sent per provider and day, shared by every process so a second run on the same day picks up where the first left off
+USAGE_PATH = os.path.join("backtest", "datasets", "store", "_requests.json")
+
+
+class ThrottledError(Exception):
+    """
+    Raised by a fetch function when the provider says to slow down, which tells the scheduler to back off and retry.
+    """
+
+
+class QuotaExhausted(Exception):
+    """
+    Raised when a provider's daily quota has been used up, there's no point retrying until tomorrow.
+    """
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket that hands out at most per_minute requests in any rolling minute, and at most per_day requests per calendar day.
+
+    Inputs:
+    ------
+    per_minute: requests allowed per minute
+    per_day: requests allowed per calendar day, None for no limit
+    provider: name the day's count is kept under in usage_path
+    usage_path: JSON file the day's count is read from and written back to on every request, so the daily quota holds across processes;
+                None keeps the count in memory only
+    """
+    def __init__(self, per_minute: float, per_day: int=None, provider: str=None, usage_path: str=None):
+        self.rate = per_minute / 60
+        self.per_day = per_day
+        self.provider = provider
+        self.usage_path = usage_path if provider is not None and per_day is not None else None
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.day = datetime.date.today()
+        self.used_today = 0
+        self.lock = threading.Lock()
+
+
+    def _read_usage(self) -> dict:
+        if self.usage_path is None or not os.path.exists(self.usage_path):
+            return {}
+        with open(self.usage_path) as f:
+            return json.load(f)
+
+
+    def _sync_usage(self, used: int=None) -> None:
+        """
+        Takes on the day's count other processes have written, then writes back used if given (the larger of the two wins).  Called with
+        the lock held.
+        """
+        if self.usage_path is None:
+            return
+        usage = self._read_usage()
+        stored = usage.get(self.provider, {})
+        if stored.get("day") == self.day.isoformat():
+            self.used_today = max(self.used_today, stored["used"])
+        if used is None:
+            return
+        self.used_today = max(self.used_today, used)
+        usage[self.provider] = {"day": self.day.isoformat(), "used": self.used_today}
+        os.makedirs(os.path.dirname(self.usage_path) or ".", exist_ok=True)
+        temporary = f"{self.usage_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(usage, f, indent=1)
+        os.replace(temporary, self.usage_path)
+
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request may be sent.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # capacity of one token, so the bucket never allows a burst above the per-minute rate
+                self.tokens = min(1.0, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.day != datetime.date.today():
+                    self.day = datetime.date.today()
+                    self.used_today = 0
+                self._sync_usage()
+                if self.per_day is not None and self.used_today >= self.per_day:
+                    raise QuotaExhausted(f"Daily quota of {self.per_day} requests used up.")
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.used_today += 1
+                    self._sync_usage(self.used_today)
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+    def exhaust(self) -> None:
+        """
+        Marks the day's quota as used up, for when the provider says so before the count does (i.e. requests made from elsewhere).
+        """
+        with self.lock:
+            if self.per_day is not None:
+                self._sync_usage(self.per_day)
+                self.used_today = max(self.used_today, self.per_day)
+
+
+_limiters = {}
+_sessions = {}
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """
+    Returns the process-wide limiter for a provider, so every loader call in the process shares one quota.
+    """
+    with _registry_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(**PROVIDER_LIMITS[provider], provider=provider, usage_path=USAGE_PATH)
+        return _limiters[provider]
+
+
+def get_session(provider: str, pool_size: int=8) -> requests.Session:
+    """
+    Returns the process-wide keep-alive session for a provider, with a connection pool big enough for the fetch workers.
+    """
+    with _registry_lock:
+        if provider not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return _sessions[provider]
+
+
+def _fetch_with_retries(fetch, job, limiter: RateLimiter, retries: int, backoff: float):
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return fetch(job)
+        except QuotaExhausted:
+            # the provider refused for the rest of the day, so later runs don't try again either
+            limiter.exhaust()
+            raise
+        except ThrottledError:
+            if attempt == retries:
+                raise
+            # exponential backoff with jitter, so the workers don't all come back at the same instant
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+
+def fetch_in_order(jobs: list, fetch, limiter: RateLimiter, max_workers: int=4, retries: int=4, backoff: float=2.0, max_pending: int=None):
+    """
+    Runs fetch(job) for every job on a thread pool and yields (job, result) pairs in the order of jobs.  Results that finish early are held
+    back until everything before them is done, so callers see a time-ordered stream even though requests complete out of order.
+
+    Only max_pending jobs past the one being waited on are ever submitted, so however many jobs there are, at most that many results are
+    held in memory, and a consumer that's slower than the provider holds the fetching back instead of piling results up.
+
+    Inputs:
+    ------
+    jobs: the slices to fetch, in the order they should come back
+    fetch: function taking a job and returning its data, should raise ThrottledError when the provider rate limits it
+    limiter: rate limiter every request has to go through
+    max_workers: number of requests in flight at once
+    retries: how many times a throttled request is retried before giving up
+    backoff: base delay in seconds between retries, doubled every attempt
+    max_pending: how many jobs can be submitted or finished ahead of the consumer, defaults to twice max_workers
+    """
+    max_pending = 2 * max_workers if max_pending is None else max(max_pending, 1)
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {}
+        submitted = 0
+        for next_index in range(len(jobs)):
+            while submitted < len(jobs) and submitted < next_index + max_pending:
+                futures[submitted] = pool.submit(_fetch_with_retries, fetch, jobs[submitted], limiter, retries, backoff)
+                submitted += 1
+            yield jobs[next_index], futures.pop(next_index).result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
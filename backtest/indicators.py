@@ -0,0 +1,304 @@
+"""
+Indicators for the strategies, each in two forms that give the same numbers:
+
+- batch: a vectorized function over whole columns, for init() in a backtest (sma, ema, atr, overnight_gap)
+- streaming: a class updated one bar at a time in O(1), for live runs where there's no history to vectorize over (SMAStream, EMAStream,
+  ATRStream, GapStream)
+
+Batch results go through IndicatorCache, keyed by a hash of the input columns (timestamps included), the indicator and its parameters, and
+kept both in memory and as .npy files under backtest/datasets/indicators.  Sweep and batch workers share the disk cache, so a 500 run sweep
+computes each distinct series once no matter how many runs or processes ask for it.
+
+    class MyStrategy(backtesting.Strategy):
+        def init(self):
+            self.sma = self.I(indicator, "sma", self.data, n=20, name="SMA(20)")
+            self.atr = self.I(indicator, "atr", self.data, n=14, name="ATR(14)")
+
+Every series starts with NaN until its window is full (an EMA or ATR after n bars), like backtesting.py's own indicators.
+"""
+import os
+import json
+import math
+import hashlib
+import collections
+import numpy as np
+import pandas as pd
+from market_calendar import NS_PER_DAY
+
+
+CACHE_ROOT = os.path.join("backtest", "datasets", "indicators")
+# bump when an implementation changes, so series cached by the old one aren't served anymore
+CACHE_VERSION = 1
+
+
+def sma(close: np.ndarray, n: int=20) -> np.ndarray:
+    """
+    Simple moving average of the last n closes.
+    """
+    # pandas' rolling mean keeps a compensated running sum, which is what SMAStream does too
+    return pd.Series(close, dtype=np.float64).rolling(n).mean().to_numpy()
+
+
+def ema(close: np.ndarray, n: int=20) -> np.ndarray:
+    """
+    Exponential moving average with alpha = 2 / (n + 1), seeded with the first close.
+    """
+    return pd.Series(close, dtype=np.float64).ewm(span=n, adjust=False, min_periods=n).mean().to_numpy()
+
+
+def _true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    high, low, close = (np.asarray(c, dtype=np.float64) for c in (high, low, close))
+    true_range = high - low
+    if len(close) > 1:
+        previous = close[:-1]
+        true_range[1:] = np.maximum(true_range[1:], np.maximum(np.abs(high[1:] - previous), np.abs(low[1:] - previous)))
+    return true_range
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int=14) -> np.ndarray:
+    """
+    Average true range, smoothed Wilder's way (alpha = 1 / n) and seeded with the first bar's high - low.
+    """
+    return pd.Series(_true_range(high, low, close)).ewm(alpha=1 / n, adjust=False, min_periods=n).mean().to_numpy()
+
+
+def overnight_gap(ts: np.ndarray, open_: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    For every bar, the gap its session opened with: the session's first open over the previous session's last close, minus 1.  NaN
+    throughout the first session.
+
+    Sessions are told apart by their day, which works for minute bars as well as daily ones.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    open_, close = np.asarray(open_, dtype=np.float64), np.asarray(close, dtype=np.float64)
+    gap = np.full(len(ts), np.nan)
+    if not len(ts):
+        return gap
+    day = ts // NS_PER_DAY
+    starts = np.r_[0, np.flatnonzero(day[1:] != day[:-1]) + 1]
+    session_gap = np.full(len(starts), np.nan)
+    session_gap[1:] = open_[starts[1:]] / close[starts[1:] - 1] - 1
+    return np.repeat(session_gap, np.diff(np.r_[starts, len(ts)]))
+
+
+class SMAStream:
+    """
+    sma one bar at a time.
+    """
+    def __init__(self, n: int=20):
+        self.n = n
+        self._window = collections.deque(maxlen=n)
+        self._sum = 0.0
+        self._compensation = 0.0
+        self.value = math.nan
+
+
+    def _add(self, x: float) -> None:
+        # Kahan summation, so the running sum doesn't drift away from a fresh sum over a long run
+        y = x - self._compensation
+        total = self._sum + y
+        self._compensation = (total - self._sum) - y
+        self._sum = total
+
+
+    def update(self, close: float) -> float:
+        if len(self._window) == self.n:
+            self._add(-self._window[0])
+        self._window.append(close)
+        self._add(close)
+        self.value = self._sum / self.n if len(self._window) == self.n else math.nan
+        return self.value
+
+
+class EMAStream:
+    """
+    ema one bar at a time.
+    """
+    def __init__(self, n: int=20, alpha: float=None):
+        self.n = n
+        self.alpha = 2 / (n + 1) if alpha is None else alpha
+        self._average = None
+        self._count = 0
+        self.value = math.nan
+
+
+    def update(self, x: float) -> float:
+        self._average = x if self._average is None else (1 - self.alpha) * self._average + self.alpha * x
+        self._count += 1
+        self.value = self._average if self._count >= self.n else math.nan
+        return self.value
+
+
+class ATRStream:
+    """
+    atr one bar at a time.
+    """
+    def __init__(self, n: int=14):
+        self._smoothing = EMAStream(n, alpha=1 / n)
+        self._previous_close = None
+        self.value = math.nan
+
+
+    def update(self, high: float, low: float, close: float) -> float:
+        true_range = high - low
+        if self._previous_close is not None:
+            true_range = max(true_range, abs(high - self._previous_close), abs(low - self._previous_close))
+        self._previous_close = close
+        self.value = self._smoothing.update(true_range)
+        return self.value
+
+
+class GapStream:
+    """
+    overnight_gap one bar at a time, ts being int64 nanoseconds like the bar store's index.
+    """
+    def __init__(self):
+        self._day = None
+        self._previous_close = None
+        self.value = math.nan
+
+
+    def update(self, ts: int, open_: float, close: float) -> float:
+        day = ts // NS_PER_DAY
+        if day != self._day:
+            self.value = math.nan if self._previous_close is None else open_ / self._previous_close - 1
+            self._day = day
+        self._previous_close = close
+        return self.value
+
+
+# name -> (batch function, streaming class, input columns), "ts" being the index as int64 nanoseconds
+INDICATORS = {
+    "sma": (sma, SMAStream, ["Close"]),
+    "ema": (ema, EMAStream, ["Close"]),
+    "atr": (atr, ATRStream, ["High", "Low", "Close"]),
+    "overnight_gap": (overnight_gap, GapStream, ["ts", "Open", "Close"]),
+}
+
+
+def _inputs(data, columns: list) -> list:
+    """
+    The columns an indicator needs out of a DataFrame, a backtesting.py strategy's data, a RingBarData or a dict of arrays.
+    """
+    inputs = []
+    for column in columns:
+        if column == "ts" and not isinstance(data, dict):
+            inputs.append(np.asarray(data.index.values.astype("datetime64[ns]").view(np.int64)))
+        else:
+            inputs.append(np.asarray(data[column], dtype=np.int64 if column == "ts" else np.float64))
+    return inputs
+
+
+def indicator_key(name: str, inputs: list, params: dict) -> str:
+    """
+    Cache key of one series: the indicator, its parameters, and the exact input columns (values and length).
+    """
+    digest = hashlib.sha256(f"{CACHE_VERSION}|{name}|{json.dumps(params, sort_keys=True, default=str)}".encode())
+    for values in inputs:
+        digest.update(f"|{values.dtype.str}{values.shape}|".encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+class IndicatorCache:
+    """
+    Memory and disk cache of batch indicator series.
+
+    Inputs:
+    ------
+    root: directory the .npy files go in (one sub-directory per indicator), None to only cache in memory
+    max_items: series kept in memory, least recently used ones are dropped first
+    """
+    def __init__(self, root: str=CACHE_ROOT, max_items: int=256):
+        self.root = root
+        self.max_items = max_items
+        self._memory = collections.OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "computed": 0}
+
+
+    def _path(self, name: str, key: str) -> str:
+        return os.path.join(self.root, name, f"{key}.npy")
+
+
+    def _remember(self, key: str, series: np.ndarray) -> np.ndarray:
+        # every caller gets the same array, so it's made read-only rather than copied
+        series.flags.writeable = False
+        self._memory[key] = series
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+        return series
+
+
+    def get(self, name: str, data, **params) -> np.ndarray:
+        """
+        The batch indicator name over data with params, computed only if neither the memory nor the disk cache has it.
+        """
+        function, _, columns = INDICATORS[name]
+        inputs = _inputs(data, columns)
+        key = indicator_key(name, inputs, params)
+        if key in self._memory:
+            self.stats["memory_hits"] += 1
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        path = self._path(name, key) if self.root else None
+        if path and os.path.exists(path):
+            self.stats["disk_hits"] += 1
+            return self._remember(key, np.load(path))
+        series = np.asarray(function(*inputs, **params), dtype=np.float64)
+        self.stats["computed"] += 1
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written under a name of its own and moved into place, so a worker reading it never sees half a file
+            temporary = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+            np.save(temporary, series)
+            os.replace(temporary, path)
+        return self._remember(key, series)
+
+
+    def clear(self, disk: bool=False) -> None:
+        """
+        Empties the memory cache, and the disk cache too if disk=True.
+        """
+        self._memory.clear()
+        if disk and self.root and os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for file in files:
+                    if file.endswith(".npy"):
+                        os.remove(os.path.join(directory, file))
+
+
+_default_cache = None
+
+
+def get_cache() -> IndicatorCache:
+    """
+    The process' shared cache, created on first use.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = IndicatorCache()
+    return _default_cache
+
+
+def indicator(name: str, data, cache: IndicatorCache=None, **params) -> np.ndarray:
+    """
+    A batch indicator over data, going through cache (the process' shared one by default).  Meant for Strategy.I in init():
+
+        self.sma = self.I(indicator, "sma", self.data, n=20)
+
+    Inputs:
+    ------
+    name: one of INDICATORS
+    data: a DataFrame, a strategy's self.data, or a dict of arrays holding the columns the indicator needs ("ts" for the timestamps)
+    cache: the cache to go through
+    params: the indicator's parameters, i.e. n=20
+    """
+    return (cache or get_cache()).get(name, data, **params)
+
+
+def stream(name: str, **params):
+    """
+    A fresh streaming instance of the indicator name, i.e. stream("atr", n=14).update(high, low, close) on each new bar.
+    """
+    return INDICATORS[name][1](**params)
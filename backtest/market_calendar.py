@@ -0,0 +1,9 @@
+"""
+The trading calendar lives in src/market_calendar (the live scripts use it too), this makes it importable with backtest/'s flat imports.
+"""
+import os
+import sys
+
+# backtests run with backtest/ on the path, src/ is one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.market_calendar.nyse import TradingCalendar, get_calendar, bars_at_times, NS_PER_DAY, MARKET_TZ
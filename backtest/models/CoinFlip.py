@@ -1,17 +1,22 @@
 import backtesting
-import random
+import numpy as np
 
 
 class CoinFlip(backtesting.Strategy):
     """
     Flips a coin.  If it's heads, we buy.  If not, we sell.
     """
+    # class level so a run can be repeated exactly, i.e. Backtest.run(seed=7), robustness.py replicates it thousands of times this way
+    seed = None
+
     def init(self):
         print("CoinFlipped.")
+        # every flip of the run drawn up front from its own generator, so the same seed always makes the same trades
+        self.flips = np.random.default_rng(self.seed).random(len(self.data))
 
 
     def next(self):
-        if random.random() < 0.5:
+        if self.flips[len(self.data) - 1] < 0.5:
             self.buy()
         else:
-            self.sell
\ No newline at end of file
+            self.sell()
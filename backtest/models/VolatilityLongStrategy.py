@@ -1,5 +1,7 @@
 import backtesting
 import datetime
+import numpy as np
+from market_calendar import bars_at_times
 
 
 BUY_TIMES = ["9:30"]#, "10:30", "11:30", "12:30", "13:30", "14:30"]
@@ -21,15 +23,22 @@ class VolatilityLongStrategy(backtesting.Strategy):
     Basically implements a stop-loss and limit order.
     """
     buy_price = 0
+    # class level so backtesting.py (and sweep.py) can override them per run, i.e. Backtest.run(profit_capture_percent=0.02)
+    buy_times = BUY_TIMES
+    sell_times = SELL_TIMES
+    profit_capture_percent = PROFIT_CAPTURE_PERCENT
+    loss_aversion_percent = LOSS_AVERSION_PERCENT
 
     def init(self):
         # self.price = self.I(self.data.Close)
-        # self.time = self.I(self.data.index.time())
-        pass
+        # entry and exit bars are found once over the whole index, rather than building and comparing a datetime.time on every bar
+        timestamps = self.data.index.values.astype("datetime64[ns]").view(np.int64)
+        self.is_buy_time = bars_at_times(timestamps, self.buy_times)
+        self.is_sell_time = bars_at_times(timestamps, self.sell_times)
 
 
     def next(self):
-        self.current_time = self.data.index[-1].time()
+        self.bar = len(self.data) - 1
         self.current_price = self.data.Close[-1]
         # if self.position.size != 0:
         #     print(self.position.size)
@@ -37,18 +46,18 @@ class VolatilityLongStrategy(backtesting.Strategy):
 
     
     def buy_or_sell_stock(self) -> None:
-        if self.current_time in BUY_TIMES and self.data.Close[-1] < self.data.Close[-2]:
+        if self.is_buy_time[self.bar] and self.data.Close[-1] < self.data.Close[-2]:
             self.buy_price = self.current_price
             # print(f"Buy Triggered {self.data.index[-1]}")
             self.buy()
-        elif self.position.size > 0 and self.current_price < (1 - LOSS_AVERSION_PERCENT) * self.buy_price:
+        elif self.position.size > 0 and self.current_price < (1 - self.loss_aversion_percent) * self.buy_price:
             # Mitigates loss
             # print(f"Sell Triggered to mitigate loss at {self.data.index[-1]}")
-            self.sell()
-        elif self.position.size > 0 and  self.current_price >= (1 + PROFIT_CAPTURE_PERCENT) * self.buy_price:
+            self.position.close()
+        elif self.position.size > 0 and  self.current_price >= (1 + self.profit_capture_percent) * self.buy_price:
             # Captures some profit
             # print(f"Sell Triggered to capture profit at {self.data.index[-1]}")
-            self.sell()
-        elif self.position.size > 0 and  self.current_time in SELL_TIMES: #== datetime.time(hour=15, minute=55, second=0):
+            self.position.close()
+        elif self.position.size > 0 and  self.is_sell_time[self.bar]: #== datetime.time(hour=15, minute=55, second=0):
             # print(f"Sell Triggered {self.data.index[-1]}")
-            self.sell()
\ No newline at end of file
+            self.position.close()
\ No newline at end of file
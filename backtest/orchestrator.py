@@ -3,12 +3,35 @@ import backtesting
 import pandas as pd
 from data_loaders import load_data_from_yfinance
 from data_loaders import load_data_from_alpha_vantage
+from bar_store import SCHEMA
+from profiling import Profiler, maybe_phase
+from report import report_stats
 from models.CoinFlip import CoinFlip
 
-SCHEMA = {"Open": float, "High": float, "Low": float, "Close": float, "Volume": float}
+
+def load_data(data_specs: dict, profiler: Profiler=None) -> pd.DataFrame:
+    """
+    Loads the bars described by data_specs (see orchestrate) into a typed, Datetime indexed frame ready for backtesting.Backtest.  Loading and
+    dtype coercion are timed as separate phases when a profiler is given.
+    """
+    with maybe_phase(profiler, "load"):
+        try:
+            loader = data_specs["loader"]
+            datas = loader(ticker=data_specs["ticker"], interval=data_specs["interval"], start_date=data_specs["start_date"], end_date=data_specs["end_date"])
+        except KeyError as ke:
+            print(f"Loading from YFinance because we encountered {ke}")
+            datas = load_data_from_yfinance()
+    with maybe_phase(profiler, "coerce"):
+        # loaders hand back typed bars, so this is only a safety net for frames built elsewhere.  Any numeric dtype passes, otherwise a bar
+        # array's float32 prices or uint32 volume would get the whole history copied here
+        if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in datas.dtypes):
+            datas = datas.astype(dtype=SCHEMA)
+        if not isinstance(datas.index, pd.DatetimeIndex):
+            datas.index = pd.to_datetime(datas.index)
+    return datas
 
 
-def orchestrate(data_specs: dict, model: backtesting.Strategy, results_directory: str="./backtest/results/") -> None:
+def orchestrate(data_specs: dict, model: backtesting.Strategy, results_directory: str="./backtest/results/", profile=False, report: bool=False) -> None:
     """
     Create a new backtesting flow.  Flow should go:
     1. Load data -> provide flexibitility to user, data is then passed off to specified data loader
@@ -17,25 +40,40 @@ def orchestrate(data_specs: dict, model: backtesting.Strategy, results_directory
 
     Inputs:
     ------
-    data_specs: has the keys "loader" (function, specify one of the loaders implemented in data_loaders.py) "ticker" (str), "interval" (str, refers to desired granularity of data), "start_date" (datetime.date), and "end_date" (datetime.date)
+    data_specs: has the keys "loader" (function, specify one of the loaders implemented in data_loaders.py, load_data_from_store reads already fetched bars without hitting a provider) "ticker" (str), "interval" (str, refers to desired granularity of data), "start_date" (datetime.date), and "end_date" (datetime.date)
     model: extends the backtesting.Strategy class, this is what's being tested, must have __init__() and next()
-    results_directory: where you'd like the results to be stored for a given test.  Recommended to extend path from default if executing multiple backtests in parallel.
+    results_directory: where you'd like the results to be stored for a given test.  File names include the model, ticker, interval and dates, for many runs at once see batch.py.
+    profile: False, or True to also write a {name}_profile.json report of phase timings, next() calls and memory peaks next to the results
+             (see profiling.py), or "cprofile" / "pyinstrument" to profile the run with that tool as well
+    report: also write a {name}_report.html of the price, equity and trades, downsampled so it stays small on any history (see report.py)
     """
+    profiler = None
+    if profile:
+        profiler = Profiler(None if profile is True else profile)
+        profiler.start()
+        model = profiler.instrument(model)
     try:
-        loader = data_specs["loader"]
-        datas = loader(ticker=data_specs["ticker"], interval=data_specs["interval"], start_date=data_specs["start_date"], end_date=data_specs["end_date"])
-    except KeyError as ke:
-        print(f"Loading from YFinance because we encountered {ke}")
-        datas = load_data_from_yfinance()
+        datas = load_data(data_specs, profiler)
+        with maybe_phase(profiler, "init_backtest"):
+            bt = backtesting.Backtest(data=datas, strategy=model, exclusive_orders=True)
+        with maybe_phase(profiler, "run"):
+            stats = bt.run()
+        # one set of files per model, ticker, interval and range, so different backtests don't overwrite each other's results
+        name = "_".join(str(part) for part in [model.__name__, data_specs.get("ticker"), data_specs.get("interval"), data_specs.get("start_date"), data_specs.get("end_date")])
+        with maybe_phase(profiler, "stats_output"):
+            stats.to_csv(f"{results_directory}{name}_results.csv")
+            stats["_trades"].to_csv(f"{results_directory}{name}_trades.csv")
     finally:
-        datas = datas.astype(dtype=SCHEMA)
-        datas.index = pd.to_datetime(datas.index)
-        bt = backtesting.Backtest(data=datas, strategy=model, exclusive_orders=True)
-        stats = bt.run()
-        stats.to_csv(f"{results_directory}{model.__name__}_results.csv")
-        stats.to_csv(f"{results_directory}{model.__name__}_trades.csv")
-        # bt.plot(filename=f"{results_directory}{model.__name__}_graphs.html", open_browser=False)
-        print("Backtesting has concluded.")
+        # stopped on failures too, or tracemalloc and the profiler would keep slowing down everything else the process runs
+        if profiler is not None:
+            profiler.stop()
+    if profiler is not None:
+        specs = {k: getattr(v, "__name__", str(v)) for k, v in data_specs.items()}
+        profiler.write(f"{results_directory}{name}_profile.json", model=model.__name__, data_specs=specs, bars=len(datas))
+    # bt.plot() draws every bar, which on minute data makes huge, slow HTML, report.py draws the same run decimated
+    if report:
+        report_stats(stats, datas, f"{results_directory}{name}_report.html", title=name)
+    print("Backtesting has concluded.")
 
 
 
@@ -0,0 +1,200 @@
+"""
+Vectorized portfolio engine for running the daily bracket strategies on several tickers at once out of one pool of cash, i.e. the long/short
+volatility pairs the strategies were written for (VolatilityLongStrategy on TQQQ alongside VolatilityShortStrategy on SQQQ).
+
+backtesting.py (and so orchestrate()) only ever holds one instrument, so each leg used to be tested on its own with all of the cash.  Here
+every ticker's minute bars are aligned on one shared index and held as (tickers, bars) arrays, each leg's entry signals are found with
+masks over its whole row and its exits with vectorized.py's first-touch search, and cash is only touched at trade events.  The Python work
+grows with the number of trades, never with bars x tickers, so dozens of leveraged ETFs over years of minute data stay cheap.
+
+Sizing and fills follow vectorized.py (market orders fill at the next bar's open, whole units, no commission), except that a leg's order
+is sized off its weight of the portfolio's equity at the fill, and never for more than the cash not already tied up in other positions
+(shorts tie up their notional too).  A portfolio of one leg with weight 1 makes exactly run_vectorized's trades.
+
+    legs = [Leg("TQQQ", VolatilityLongStrategy, 0.5), Leg("SQQQ", VolatilityShortStrategy, 0.5, {"profit_capture_percent": 0.02})]
+    stats = run_portfolio({"TQQQ": tqqq_bars, "SQQQ": sqqq_bars}, legs, cash=100_000)
+"""
+import heapq
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from market_calendar import get_calendar, bars_at_times
+from vectorized import FULL_EQUITY, _direction, _first_exit, _summary
+
+
+BRACKET_PARAMS = ["buy_times", "sell_times", "profit_capture_percent", "loss_aversion_percent"]
+# events at the same bar: exits settle before new entries are sized, as backtesting.py closes trades before opening new ones
+_EXIT, _ENTRY = 0, 1
+
+
+class Leg(NamedTuple):
+    """
+    One ticker traded by one of the bracket strategies.
+
+    Inputs:
+    ------
+    ticker: key of its bars in the data handed to run_portfolio
+    model: VolatilityLongStrategy, VolatilityShortStrategy or a subclass, giving the direction and the default parameters
+    weight: share of the portfolio's equity each entry is sized with
+    params: overrides of the model's class-level parameters, like Backtest.run(**params)
+    """
+    ticker: str
+    model: type
+    weight: float = 1.0
+    params: dict = None
+
+
+def align_bars(data: dict) -> tuple:
+    """
+    Lines every ticker's bars up on the union of their timestamps.
+
+    Returns (timestamps, open_, close, close_raw, present): int64 nanoseconds of the shared index, then (tickers, bars) arrays in data's
+    order.  A ticker without a bar at some timestamp gets its last close as both open and close there (so it can still be marked and
+    closed) and False in present, while close_raw keeps NaN there so no stop or target can trigger on a stale price.
+    """
+    frames = list(data.values())
+    timestamps = np.unique(np.concatenate([f.index.values.astype("datetime64[ns]").view(np.int64) for f in frames]))
+    shape = (len(frames), len(timestamps))
+    open_, close_raw = np.full(shape, np.nan), np.full(shape, np.nan)
+    for row, frame in enumerate(frames):
+        positions = np.searchsorted(timestamps, frame.index.values.astype("datetime64[ns]").view(np.int64))
+        open_[row, positions] = frame["Open"].to_numpy(dtype=np.float64)
+        close_raw[row, positions] = frame["Close"].to_numpy(dtype=np.float64)
+    present = ~np.isnan(close_raw)
+    # forward fill along each row: every bar points back at the last bar the ticker actually had
+    last = np.maximum.accumulate(np.where(present, np.arange(shape[1]), 0), axis=1)
+    close = np.take_along_axis(close_raw, last, axis=1)
+    open_ = np.where(present, open_, close)
+    return timestamps, open_, close, close_raw, present
+
+
+def _leg_signals(timestamps: np.ndarray, close: np.ndarray, present: np.ndarray, direction: int, buy_times: list, sell_times: list) -> tuple:
+    """
+    One leg's entry signals and exit times over the shared index, the same masks vectorized._simulate builds for a single ticker.
+    """
+    moved = np.zeros(len(close), dtype=bool)
+    moved[1:] = (close[1:] < close[:-1]) if direction > 0 else (close[1:] > close[:-1])
+    entry_signal = bars_at_times(timestamps, buy_times) & moved & present
+    entry_signal[0] = False
+    return entry_signal, np.flatnonzero(entry_signal), bars_at_times(timestamps, sell_times)
+
+
+def run_portfolio(data: dict, legs: list, cash: float=100_000) -> pd.Series:
+    """
+    Runs every leg's bracket strategy over its ticker's bars, sharing one pool of cash.
+
+    Inputs:
+    ------
+    data: ticker -> Datetime indexed OHLC frame (the bar store's layout)
+    legs: the Legs traded, at most one per ticker
+    cash: starting cash of the whole portfolio
+
+    Returns a stats Series like run_vectorized's (the headline numbers over the combined equity), plus "Exposure Time [%]", "Avg. Gross
+    Exposure [%]" and "Max. Gross Exposure [%]", and:
+    - _equity_curve: Equity, Drawdown, and gross/net exposure (as a fraction of equity) at every bar of the shared index
+    - _trades: every trade with its Ticker, laid out like run_vectorized's
+    - _legs: trades, P&L, win rate and orders skipped for lack of cash, per leg
+    """
+    tickers = [leg.ticker for leg in legs]
+    if len(set(tickers)) != len(tickers):
+        raise ValueError("Each ticker can only be traded by one leg.")
+    timestamps, open_, close, close_raw, present = align_bars({t: data[t] for t in tickers})
+    n = len(timestamps)
+    index = pd.DatetimeIndex(timestamps.view("datetime64[ns]"), name="Datetime")
+    _, session_end = get_calendar().session_bounds(timestamps)
+
+    directions, settings, signals = [], [], []
+    for row, leg in enumerate(legs):
+        directions.append(_direction(leg.model))
+        settings.append({k: (leg.params or {}).get(k, getattr(leg.model, k)) for k in BRACKET_PARAMS})
+        signals.append(_leg_signals(timestamps, close[row], present[row], directions[row], settings[row]["buy_times"], settings[row]["sell_times"]))
+
+    def next_signal(row: int, after: int) -> int:
+        entry_bars = signals[row][1]
+        nxt = np.searchsorted(entry_bars, after, side="right")
+        return entry_bars[nxt] if nxt < len(entry_bars) else n
+
+    # (bar, kind, row, signal bar): exits of open trades and each leg's next entry, handled in time order
+    events = []
+    for row in range(len(legs)):
+        first = signals[row][1][0] if len(signals[row][1]) else n
+        if first < n - 1:
+            heapq.heappush(events, (first + 1, _ENTRY, row, first))
+
+    balance = float(cash)           # cash plus realized P&L
+    positions = {}                  # row -> (size, entry price, fill bar)
+    trades, skipped = [], np.zeros(len(legs), dtype=int)
+    cash_change = np.zeros(n)
+    unrealized, gross, net = np.zeros(n), np.zeros(n), np.zeros(n)
+    while events:
+        bar, kind, row, signal = heapq.heappop(events)
+        if kind == _EXIT:
+            size, entry_price, fill = positions.pop(row)
+            exit_price = open_[row, bar]
+            pnl = size * (exit_price - entry_price)
+            balance += pnl
+            cash_change[bar] += pnl
+            trades.append({"Ticker": legs[row].ticker, "Size": size, "EntryBar": fill, "ExitBar": bar, "EntryPrice": entry_price,
+                           "ExitPrice": exit_price, "PnL": pnl, "ReturnPct": directions[row] * (exit_price / entry_price - 1)})
+            # signal holds the bar the exit was triggered at, which re-enters straight away if it's an entry signal itself
+            following = signal if signals[row][0][signal] else next_signal(row, signal)
+            if following < n - 1:
+                heapq.heappush(events, (following + 1, _ENTRY, row, following))
+            continue
+
+        entry_price = open_[row, bar]
+        equity = balance + sum(s * (open_[r, bar] - p) for r, (s, p, _) in positions.items())
+        free = equity - sum(abs(s) * p for s, p, _ in positions.values())
+        size = directions[row] * int((min(legs[row].weight * equity, free) * FULL_EQUITY) // entry_price)
+        if size == 0:
+            # the broker cancels orders it can't afford a single unit of
+            skipped[row] += 1
+            following = next_signal(row, signal)
+            if following < n - 1:
+                heapq.heappush(events, (following + 1, _ENTRY, row, following))
+            continue
+        direction, levels = directions[row], settings[row]
+        reference = close[row, signal]
+        if direction > 0:
+            stop_level, take_level = (1 - levels["loss_aversion_percent"]) * reference, (1 + levels["profit_capture_percent"]) * reference
+        else:
+            stop_level, take_level = (1 + levels["loss_aversion_percent"]) * reference, (1 - levels["profit_capture_percent"]) * reference
+        entry_signal, _, is_exit_time = signals[row]
+        exit_signal = _first_exit(close_raw[row], is_exit_time, entry_signal, session_end, bar, direction, stop_level, take_level)
+        held_until = n if exit_signal is None or exit_signal == n - 1 else exit_signal + 1
+        held = slice(bar, held_until)
+        unrealized[held] += size * (close[row, held] - entry_price)
+        gross[held] += abs(size) * close[row, held]
+        net[held] += size * close[row, held]
+        if held_until < n:
+            positions[row] = (size, entry_price, bar)
+            heapq.heappush(events, (held_until, _EXIT, row, exit_signal))
+        # a trade still open when the data runs out is left out of the trades, like run_vectorized does
+
+    equity = cash + np.cumsum(cash_change) + unrealized
+    if n > 1:
+        # no equity is logged for the first bar, backtesting.py back-fills it from the second
+        equity[0] = equity[1]
+    peak = np.maximum.accumulate(equity) if n else equity
+    drawdown = equity / peak - 1 if n else equity
+    trades = pd.DataFrame(trades, columns=["Ticker", "Size", "EntryBar", "ExitBar", "EntryPrice", "ExitPrice", "PnL", "ReturnPct"])
+    trades = trades.sort_values(["EntryBar", "Ticker"], kind="stable").reset_index(drop=True)
+    trades["EntryTime"] = index[trades["EntryBar"].to_numpy(dtype=int)]
+    trades["ExitTime"] = index[trades["ExitBar"].to_numpy(dtype=int)]
+
+    stats = _summary(trades, index[0] if n else None, index[-1] if n else None, equity[-1] if n else cash, peak.max() if n else cash,
+                     drawdown.min() if n else 0.0, cash)
+    exposure = np.divide(gross, equity, out=np.zeros(n), where=equity != 0)
+    stats["Exposure Time [%]"] = (gross > 0).mean() * 100 if n else 0.0
+    stats["Avg. Gross Exposure [%]"] = exposure.mean() * 100 if n else 0.0
+    stats["Max. Gross Exposure [%]"] = exposure.max() * 100 if n else 0.0
+    stats["_equity_curve"] = pd.DataFrame({"Equity": equity, "Drawdown": drawdown, "GrossExposure": exposure,
+                                           "NetExposure": np.divide(net, equity, out=np.zeros(n), where=equity != 0)}, index=index)
+    stats["_trades"] = trades
+    by_leg = trades.groupby("Ticker")
+    stats["_legs"] = pd.DataFrame({"Strategy": [leg.model.__name__ for leg in legs], "Weight": [leg.weight for leg in legs],
+                                   "# Trades": by_leg.size().reindex(tickers, fill_value=0).to_numpy(),
+                                   "PnL": by_leg["PnL"].sum().reindex(tickers, fill_value=0.0).to_numpy(),
+                                   "Win Rate [%]": (by_leg["ReturnPct"].apply(lambda r: (r > 0).mean() * 100)).reindex(tickers).to_numpy(),
+                                   "Skipped": skipped}, index=pd.Index(tickers, name="Ticker"))
+    return stats
@@ -0,0 +1,182 @@
+"""
+Opt-in instrumentation for backtests: where the time goes (loading, dtype coercion, setting up the backtest, Backtest.run, stats output),
+how many times the strategy's next() ran and how long each call took, the memory high-water mark, and optionally a cProfile or pyinstrument
+profile of the whole run.
+
+Used through orchestrate(..., profile=True) (or profile="cprofile" / "pyinstrument"), which writes a JSON report next to the stats.  Two
+reports can be lined up with compare_reports() to spot a regression after changing the data or execution layers.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import tracemalloc
+import contextlib
+import pandas as pd
+import backtesting
+
+
+PROFILERS = [None, "cprofile", "pyinstrument"]
+
+
+class Profiler:
+    """
+    Collects phase timings and next() counts for one run.
+
+    Inputs:
+    ------
+    profiler: None, "cprofile" or "pyinstrument" (which has to be installed) to also profile everything between start() and stop()
+    trace_memory: whether to follow Python allocations with tracemalloc for per-phase peaks, which slows the run down noticeably
+    """
+    def __init__(self, profiler: str=None, trace_memory: bool=True):
+        if profiler not in PROFILERS:
+            raise ValueError(f"profiler should be one of {PROFILERS}, not {profiler!r}.")
+        self.profiler = profiler
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self.next_calls = 0
+        self.next_ns = 0
+        self.next_max_ns = 0
+        self._profile = None
+        self._started = None
+
+
+    def start(self) -> None:
+        if self.profiler == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.profiler == "pyinstrument":
+            try:
+                import pyinstrument
+            except ImportError:
+                raise ImportError("profile='pyinstrument' needs pyinstrument installed (pip install pyinstrument).")
+            self._profile = pyinstrument.Profiler()
+            self._profile.start()
+        # last, so a profiler failing to start doesn't leave tracemalloc running
+        if self.trace_memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+
+
+    def stop(self) -> None:
+        self.total_seconds = time.perf_counter() - self._started
+        if self.profiler == "cprofile":
+            self._profile.disable()
+        elif self.profiler == "pyinstrument":
+            self._profile.stop()
+        if self.trace_memory:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """
+        Times the block as the named phase (a phase entered more than once adds up), along with its allocation peak.
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.phases.setdefault(name, {"seconds": 0.0})
+            entry["seconds"] += time.perf_counter() - start
+            if self.trace_memory:
+                entry["peak_bytes"] = max(entry.get("peak_bytes", 0), tracemalloc.get_traced_memory()[1])
+
+
+    def instrument(self, model: backtesting.Strategy) -> backtesting.Strategy:
+        """
+        Subclass of model whose next() is counted and timed.  Everything else about the strategy (parameters, name) stays the same.
+        """
+        profiler = self
+
+        def timed_next(strategy):
+            start = time.perf_counter_ns()
+            model.next(strategy)
+            elapsed = time.perf_counter_ns() - start
+            profiler.next_calls += 1
+            profiler.next_ns += elapsed
+            profiler.next_max_ns = max(profiler.next_max_ns, elapsed)
+
+        return type(model.__name__, (model,), {"next": timed_next, "__module__": model.__module__, "__qualname__": model.__qualname__})
+
+
+    def report(self, **context) -> dict:
+        """
+        The collected numbers as a JSON-able dictionary, with any keyword arguments added as context (model, data specs, number of bars...).
+        """
+        report = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                  "backtesting": backtesting.__version__, **context}
+        report["total_seconds"] = getattr(self, "total_seconds", None)
+        report["phases"] = self.phases
+        report["next"] = {"calls": self.next_calls, "total_seconds": self.next_ns / 1e9,
+                          "mean_us": self.next_ns / self.next_calls / 1e3 if self.next_calls else None, "max_us": self.next_max_ns / 1e3}
+        report["memory"] = {"traced_peak_bytes": getattr(self, "peak_bytes", None), "max_rss_bytes": _max_rss_bytes()}
+        return report
+
+
+    def write(self, path: str, **context) -> dict:
+        """
+        Writes the report as JSON to path.  With a profiler, its output goes alongside: path with .prof (cProfile's binary stats, for
+        snakeviz or pstats) or .html (pyinstrument), and the 25 functions with the most cumulative time are included in the report.
+        """
+        report = self.report(**context)
+        base = os.path.splitext(path)[0]
+        if self.profiler == "cprofile":
+            import pstats
+            self._profile.dump_stats(f"{base}.prof")
+            stats = pstats.Stats(self._profile)
+            top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:25]
+            report["profile"] = {"tool": "cprofile", "file": f"{base}.prof", "top": [
+                {"function": f"{file}:{line}({name})", "calls": calls, "tottime": tottime, "cumtime": cumtime}
+                for (file, line, name), (_, calls, tottime, cumtime, _) in top]}
+        elif self.profiler == "pyinstrument":
+            with open(f"{base}.html", "w") as f:
+                f.write(self._profile.output_html())
+            report["profile"] = {"tool": "pyinstrument", "file": f"{base}.html"}
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        return report
+
+
+def _max_rss_bytes() -> int:
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def maybe_phase(profiler: Profiler, name: str):
+    """
+    profiler.phase(name), or a no-op when profiling is off, so instrumented code reads the same either way.
+    """
+    return contextlib.nullcontext() if profiler is None else profiler.phase(name)
+
+
+def compare_reports(before: str, after: str) -> pd.DataFrame:
+    """
+    Lines up the phase times (plus total time, next() time and peak memory) of two reports, with the change in percent.
+    """
+    reports = []
+    for path in [before, after]:
+        with open(path) as f:
+            report = json.load(f)
+        row = {f"{name} [s]": phase["seconds"] for name, phase in report["phases"].items()}
+        row["total [s]"] = report["total_seconds"]
+        row["next() calls"] = report["next"]["calls"]
+        row["next() mean [us]"] = report["next"]["mean_us"]
+        row["traced peak [MB]"] = (report["memory"]["traced_peak_bytes"] or 0) / 2**20
+        row["max RSS [MB]"] = (report["memory"]["max_rss_bytes"] or 0) / 2**20
+        reports.append(row)
+    comparison = pd.DataFrame(reports, index=["before", "after"]).transpose()
+    comparison["change [%]"] = (comparison["after"] / comparison["before"] - 1) * 100
+    return comparison
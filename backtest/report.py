@@ -0,0 +1,246 @@
+"""
+HTML reports of backtests that stay small and quick to open however long the history, standing in for bt.plot(), which draws every bar and
+makes hundreds of megabytes of HTML out of a few years of minute data.
+
+The plot data is precomputed once per run into zoom levels, each about POINTS points across the whole history and twice as detailed as the
+one before, until the next level would take the run over MAX_POINTS (or reach full resolution).  Price is decimated with min/max buckets,
+so no high or low that could have touched a stop goes missing, and equity with Largest-Triangle-Three-Buckets (LTTB), which keeps its shape
+with fewer points.  In the page, zooming swaps in the coarsest level that still has about POINTS points in view.  Trades are drawn on top as
+entry to exit segments, green for winners and red for losers.
+
+Nothing is re-run: report_run draws a run kept in the results store (batch.py) from its stored trades and equity and the bar store's bars,
+and caches its plot data next to the report, while report_stats draws the stats of a run still in memory (orchestrate(..., report=True)).
+
+    report_run(key)                                   # -> backtest/results/reports/{key}.html
+    report_stats(stats, bars, "results/report.html")
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+REPORTS_ROOT = os.path.join("backtest", "results", "reports")
+# points drawn per series at any zoom, about a screen's width worth
+POINTS = 2000
+# all levels of a series together, which is what bounds the report's size
+MAX_POINTS = 100_000
+# beyond this, only the trades with the largest P&L are drawn
+MAX_TRADES = 5000
+SERIES = {"price": "minmax", "equity": "lttb"}
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Positions of the lowest and the highest value in each of buckets equal runs of y, plus the first and last, in order.
+    """
+    n = len(y)
+    if 2 * buckets >= n:
+        return np.arange(n)
+    size = -(-n // buckets)
+    rows = -(-n // size)
+    padded = np.full(rows * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(rows, size)
+    offsets = np.arange(rows) * size
+    picked = np.concatenate([[0, n - 1], offsets + np.nanargmin(padded, axis=1), offsets + np.nanargmax(padded, axis=1)])
+    return np.unique(picked)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Positions of the threshold points Largest-Triangle-Three-Buckets keeps: the first and the last, and from every bucket in between the
+    point making the largest triangle with the point kept before it and the average of the next bucket.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    kept = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        mean_x, mean_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        area = np.abs((x[kept] - mean_x) * (y[start:stop] - y[kept]) - (x[kept] - x[start:stop]) * (mean_y - y[kept]))
+        kept = start + int(np.argmax(area))
+        picked[i + 1] = kept
+    return picked
+
+
+def zoom_levels(ts: np.ndarray, y: np.ndarray, method: str="minmax", points: int=POINTS, max_points: int=MAX_POINTS) -> list:
+    """
+    The (ts, y) pairs of every zoom level of a series, coarsest first.
+    """
+    levels, total, target = [], 0, points
+    while True:
+        if target >= len(y):
+            picked = np.arange(len(y))
+        elif method == "minmax":
+            picked = minmax_indices(y, target // 2)
+        else:
+            picked = lttb_indices(ts, y, target)
+        if levels and total + len(picked) > max_points:
+            break
+        levels.append((ts[picked], y[picked]))
+        total += len(picked)
+        if len(picked) == len(y):
+            break
+        target *= 2
+    return levels
+
+
+def precompute(bars: pd.DataFrame, equity: pd.Series, trades: pd.DataFrame, points: int=POINTS, max_points: int=MAX_POINTS,
+               max_trades: int=MAX_TRADES) -> dict:
+    """
+    Everything a report draws, as flat arrays: "{series}_{level}_ts" and "{series}_{level}_y" for every zoom level of price (bars' Close,
+    left out when there are no bars) and equity, and the trades' entry and exit times and prices and P&L.
+    """
+    data = {}
+    series = {"equity": equity}
+    if bars is not None and len(bars):
+        series["price"] = bars["Close"]
+    for name, values in series.items():
+        ts = values.index.values.astype("datetime64[ns]").view(np.int64)
+        for level, (level_ts, level_y) in enumerate(zoom_levels(ts, values.to_numpy(dtype=np.float64), SERIES[name], points, max_points)):
+            data[f"{name}_{level}_ts"] = level_ts
+            data[f"{name}_{level}_y"] = level_y.astype(np.float32)
+    if len(trades) > max_trades:
+        trades = trades.loc[trades["PnL"].abs().nlargest(max_trades).index].sort_index()
+    for column, key in [("EntryTime", "entry_ts"), ("ExitTime", "exit_ts")]:
+        data[f"trades_{key}"] = pd.to_datetime(trades[column]).values.astype("datetime64[ns]").view(np.int64)
+    for column in ["EntryPrice", "ExitPrice", "PnL", "ReturnPct", "Size"]:
+        data[f"trades_{column}"] = trades[column].to_numpy(dtype=np.float64)
+    return data
+
+
+def _levels(data: dict, name: str) -> list:
+    count = sum(1 for key in data if key.startswith(f"{name}_") and key.endswith("_ts"))
+    return [(data[f"{name}_{level}_ts"], data[f"{name}_{level}_y"]) for level in range(count)]
+
+
+def _stats_table(stats: dict) -> str:
+    rows = "".join(f"<tr><th style='text-align:left'>{k}</th><td>{v:.2f}</td></tr>" if isinstance(v, float) else
+                   f"<tr><th style='text-align:left'>{k}</th><td>{v}</td></tr>" for k, v in stats.items())
+    return f"<table style='font-family:sans-serif;font-size:12px'>{rows}</table>"
+
+
+def render(data: dict, filename: str, title: str="Backtest", stats: dict=None, points: int=POINTS, inline: bool=False) -> str:
+    """
+    Writes the report of precomputed plot data to filename and returns the path.
+
+    Inputs:
+    ------
+    data: from precompute
+    filename: where the HTML goes
+    title: page and chart title
+    stats: headline numbers shown above the charts, i.e. the scalar part of a stats Series
+    points: points in view the zoom levels are switched at, same as precompute's
+    inline: embeds BokehJS in the page (about 1 MB more) so it opens offline, otherwise it's loaded from Bokeh's CDN
+    """
+    from bokeh.io import save
+    from bokeh.layouts import column
+    from bokeh.models import ColumnDataSource, CustomJS, Div, HoverTool
+    from bokeh.plotting import figure
+    from bokeh.resources import CDN, INLINE
+
+    tools = "xpan,xwheel_zoom,box_zoom,reset,save"
+    charts, renderers = [], []
+    x_range = None
+    for name, label, height in [("price", "Price", 320), ("equity", "Equity", 200)]:
+        levels = _levels(data, name)
+        if not levels:
+            continue
+        chart = figure(title=title if not charts else None, x_axis_type="datetime", height=height, sizing_mode="stretch_width", tools=tools,
+                       active_scroll="xwheel_zoom", y_axis_label=label, **({"x_range": x_range} if x_range is not None else {}))
+        x_range = chart.x_range
+        lines = []
+        for level, (ts, y) in enumerate(levels):
+            # Bokeh's datetime axis counts milliseconds
+            source = ColumnDataSource({"x": ts / 1e6, "y": y})
+            lines.append(chart.line("x", "y", source=source, line_width=1, color="#1f77b4" if name == "price" else "#333333", visible=level == 0))
+        renderers.append({"lines": lines, "sizes": [len(ts) for ts, _ in levels], "span": float(levels[0][0][-1] - levels[0][0][0]) / 1e6 or 1.0})
+        if name == "price" and len(data["trades_entry_ts"]):
+            won = data["trades_PnL"] > 0
+            trades = ColumnDataSource({"x0": data["trades_entry_ts"] / 1e6, "x1": data["trades_exit_ts"] / 1e6, "y0": data["trades_EntryPrice"],
+                                       "y1": data["trades_ExitPrice"], "pnl": data["trades_PnL"], "ret": data["trades_ReturnPct"] * 100,
+                                       "size": data["trades_Size"], "color": np.where(won, "#2ca02c", "#d62728")})
+            chart.segment("x0", "y0", "x1", "y1", source=trades, color="color", line_width=3, alpha=0.8)
+            entries = chart.scatter("x0", "y0", source=trades, marker="triangle", size=7, color="color")
+            chart.add_tools(HoverTool(renderers=[entries], tooltips=[("Size", "@size{0,0}"), ("P&L", "@pnl{0,0.00}"), ("Return", "@ret{0.00}%")]))
+        charts.append(chart)
+    if x_range is not None:
+        # picks, for every series, the coarsest level that still has about points points between the ends of the view
+        swap = CustomJS(args={"series": renderers, "x_range": x_range, "points": points}, code="""
+            const view = Math.max(x_range.end - x_range.start, 1);
+            for (const s of series) {
+                let pick = s.lines.length - 1;
+                for (let i = 0; i < s.lines.length; i++) {
+                    if (s.sizes[i] * view / s.span >= points) { pick = i; break; }
+                }
+                s.lines.forEach((line, i) => { line.visible = i === pick; });
+            }
+        """)
+        x_range.js_on_change("start", swap)
+        x_range.js_on_change("end", swap)
+    layout = column(([Div(text=_stats_table(stats))] if stats else []) + charts, sizing_mode="stretch_width")
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    save(layout, filename=filename, resources=INLINE if inline else CDN, title=title)
+    return filename
+
+
+def _scalar_stats(stats) -> dict:
+    return {k: v for k, v in dict(stats).items() if not k.startswith("_") and isinstance(v, (int, float, str, np.generic, pd.Timestamp, pd.Timedelta))}
+
+
+def report_stats(stats: pd.Series, bars: pd.DataFrame, filename: str, title: str="Backtest", **kwargs) -> str:
+    """
+    The report of a run still in memory: a stats Series from backtesting.py, run_vectorized or run_portfolio, and the bars it ran on.
+    kwargs go to precompute and render.
+    """
+    equity = stats["_equity_curve"]["Equity"]
+    points, max_points, max_trades = kwargs.pop("points", POINTS), kwargs.pop("max_points", MAX_POINTS), kwargs.pop("max_trades", MAX_TRADES)
+    data = precompute(bars, equity, stats["_trades"], points, max_points, max_trades)
+    return render(data, filename, title=title, stats=_scalar_stats(stats), points=points, **kwargs)
+
+
+def report_run(key: str, results_db: str=None, store_root: str=None, directory: str=REPORTS_ROOT, refresh: bool=False, **kwargs) -> str:
+    """
+    The report of a run kept in the results store, drawn from its stored trades and equity and the bar store's bars without running
+    anything again.  The plot data is kept as {directory}/{key}.npz, so only the first report of a run reads and decimates its history.
+
+    Inputs:
+    ------
+    key: the run's key, i.e. from batch() or results_store.read_runs
+    results_db: path of the results store, defaults to results_store's
+    store_root: where the bar store lives, defaults to bar_store's
+    directory: where the report (and its cached plot data) go
+    refresh: recomputes the plot data even if it's cached
+    kwargs: go to precompute (points, max_points, max_trades) and render (inline)
+    """
+    import results_store
+    from bar_store import STORE_ROOT
+    from resample import read_resampled
+    conn = results_store.connect(results_db or results_store.RESULTS_DB)
+    try:
+        run = conn.execute("SELECT ticker, interval, strategy, params, start, end, stats FROM runs WHERE key = ?", (key,)).fetchone()
+        if run is None:
+            raise KeyError(f"No run {key} in the results store.")
+        ticker, interval, strategy, params, start, end, stats = run
+        cache = os.path.join(directory, f"{key}.npz")
+        points, max_points, max_trades = kwargs.pop("points", POINTS), kwargs.pop("max_points", MAX_POINTS), kwargs.pop("max_trades", MAX_TRADES)
+        if os.path.exists(cache) and not refresh:
+            with np.load(cache) as stored:
+                data = dict(stored)
+        else:
+            # the run's bars may be derived from minute bars rather than fetched, read_resampled serves both
+            bars = read_resampled(ticker, interval, pd.Timestamp(start).date(), pd.Timestamp(end).date(), columns=["Close"], root=store_root or STORE_ROOT)
+            data = precompute(bars, results_store.read_equity(conn, key), results_store.read_trades(conn, key), points, max_points, max_trades)
+            os.makedirs(directory, exist_ok=True)
+            np.savez(cache, **data)
+    finally:
+        conn.close()
+    title = f"{strategy} {params} on {ticker} {interval}, {start} to {end}"
+    return render(data, os.path.join(directory, f"{key}.html"), title=title, stats=json.loads(stats), points=points, **kwargs)
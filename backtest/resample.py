@@ -0,0 +1,194 @@
+"""
+Coarser bars derived from the stored minute bars, instead of asking a provider for every interval separately.
+
+Only the finest granularity (1m) has to be fetched.  resample_bars aggregates it into 5m, 15m, 30m, 1h or 1d bars in one vectorized pass:
+buckets are aligned to each session's open from the trading calendar (so hourly bars run 9:30-10:30 like the providers', and a half-day's
+last bucket ends at its 13:00 close), bars outside regular hours are left out, and every bar is labelled with the start of its bucket.
+
+Derived tiers are materialized as a bar store of their own under the store's _derived directory (backtest/datasets/store/_derived/TICKER/5m/...),
+apart from the intervals fetched from providers, which they never overwrite.  Only months whose minute bars were fetched in full (per the 1m
+coverage manifest) are derived, so a month of half the minute bars never stands in for it.  Each tier keeps a _derived.json recording which
+version of every minute partition it was built from, and update_tiers only rebuilds the months whose minute partition has changed since, so
+topping up the minute bars costs a month's rebuild, not a history's.  read_resampled does that for the months asked for and reads them back
+together with any fetched bars of the interval, which is what load_data_from_store and load_data_from_alpha_vantage do for these intervals.
+
+    update_tiers("TQQQ")                                     # every tier, for every stored month
+    hourly = read_resampled("TQQQ", "1h", datetime.date(2024,1,1), datetime.date(2024,7,1))
+"""
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+from bar_store import STORE_ROOT, COLUMNS, normalize_interval, normalize_bars, read_bars, write_bars, stored_months, is_cached, _partition_dir, _months_between
+from market_calendar import get_calendar, NS_PER_DAY
+
+
+SOURCE_INTERVAL = "1m"
+# derivable interval -> bucket length in minutes, None being one bar per session
+TIERS = {"5m": 5, "15m": 15, "30m": 30, "1h": 60, "1d": None}
+NS_PER_MINUTE = 60 * 10**9
+
+
+def resample_bars(bars: pd.DataFrame, interval: str, regular_hours: bool=True) -> pd.DataFrame:
+    """
+    Aggregates minute bars (the bar store's layout, ascending) into interval bars: first Open, highest High, lowest Low, last Close and
+    summed Volume of every bucket, labelled with the bucket's start (daily bars with their session's date).
+
+    Inputs:
+    ------
+    bars: the minute bars
+    interval: one of TIERS, provider specific names are fine (i.e. "60min")
+    regular_hours: leaves out bars outside their session's open and close, and bars on days that aren't sessions
+    """
+    interval = normalize_interval(interval)
+    if interval not in TIERS:
+        raise ValueError(f"Can't derive {interval} bars, should be one of {list(TIERS)}.")
+    bars = normalize_bars(bars)
+    ts = bars.index.values.astype("datetime64[ns]").view(np.int64)
+    calendar = get_calendar()
+    session = calendar.session_of_bars(ts)
+    day = ts // NS_PER_DAY * NS_PER_DAY
+    on_calendar = session >= 0
+    opens = np.where(on_calendar, calendar.open_ns[np.maximum(session, 0)], day)
+    keep = on_calendar & (ts >= opens) & (ts < calendar.close_ns[np.maximum(session, 0)]) if regular_hours else np.ones(len(ts), dtype=bool)
+    if not keep.all():
+        bars, ts, day, opens = bars[keep], ts[keep], day[keep], opens[keep]
+    if not len(ts):
+        return normalize_bars(pd.DataFrame())
+    minutes = TIERS[interval]
+    if minutes is None:
+        label = day
+    else:
+        width = minutes * NS_PER_MINUTE
+        label = opens + (ts - opens) // width * width
+    starts = np.r_[0, np.flatnonzero(label[1:] != label[:-1]) + 1]
+    ends = np.r_[starts[1:], len(ts)] - 1
+    columns = {c: bars[c].to_numpy() for c in COLUMNS}
+    return pd.DataFrame({"Open": columns["Open"][starts], "High": np.maximum.reduceat(columns["High"], starts),
+                         "Low": np.minimum.reduceat(columns["Low"], starts), "Close": columns["Close"][ends],
+                         "Volume": np.add.reduceat(columns["Volume"], starts)},
+                        index=pd.DatetimeIndex(label[starts].view("datetime64[ns]"), name="Datetime"))
+
+
+def derived_root(root: str=STORE_ROOT) -> str:
+    """
+    Where the tiers derived from root's minute bars are kept, laid out like a bar store itself.
+    """
+    return os.path.join(root, "_derived")
+
+
+def _derived_path(ticker: str, interval: str, root: str) -> str:
+    return os.path.join(_partition_dir(ticker, interval, derived_root(root)), "_derived.json")
+
+
+def _month_bounds(month: str) -> tuple:
+    year, number = map(int, month.split("-"))
+    return datetime.date(year, number, 1), datetime.date(year + number // 12, number % 12 + 1, 1)
+
+
+def _source_versions(ticker: str, months: list, root: str) -> dict:
+    """
+    What each minute partition currently is, by modification time and size (partitions are always replaced whole, so a write changes both).
+    """
+    source_dir = _partition_dir(ticker, SOURCE_INTERVAL, root)
+    versions = {}
+    for month in months:
+        stat = os.stat(os.path.join(source_dir, f"{month}.parquet"))
+        versions[month] = [stat.st_mtime_ns, stat.st_size]
+    return versions
+
+
+def update_tiers(ticker: str, tiers: list=None, start_date: datetime.date=None, end_date: datetime.date=None, root: str=STORE_ROOT) -> dict:
+    """
+    Brings the derived tiers up to date with the stored minute bars, rebuilding only the months whose minute partition changed since the
+    tier was last built.  Months whose minute bars aren't fully fetched yet (up to today for the running month) are left out.
+
+    Inputs:
+    ------
+    ticker: the ticker whose tiers are updated
+    tiers: intervals to update, all of TIERS by default
+    start_date: first day whose month is updated, from the start of the stored minute bars by default
+    end_date: first day not updated, up to the end of the stored minute bars by default
+    root: where the store lives
+
+    Returns the months rebuilt per tier.
+    """
+    tiers = [normalize_interval(t) for t in (tiers or TIERS)]
+    months = stored_months(ticker, SOURCE_INTERVAL, root)
+    if start_date is not None and end_date is not None:
+        wanted = set(_months_between(start_date, end_date))
+        months = [m for m in months if m in wanted]
+    today = datetime.date.today()
+    months = [m for m in months if is_cached(ticker, SOURCE_INTERVAL, _month_bounds(m)[0], min(_month_bounds(m)[1], today), root=root)]
+    versions = _source_versions(ticker, months, root)
+    stale = {}
+    for tier in tiers:
+        path = _derived_path(ticker, tier, root)
+        built = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                built = json.load(f)["months"]
+        stale[tier] = [m for m in months if built.get(m) != versions[m]]
+    rebuilt = {tier: [] for tier in tiers}
+    for month in sorted(set().union(*stale.values())):
+        minute_bars = read_bars(ticker, SOURCE_INTERVAL, *_month_bounds(month), root=root)
+        for tier in tiers:
+            if month in stale[tier]:
+                # replaced rather than merged into, so buckets that aren't in the minute bars anymore go too (only derived bars live here)
+                path = os.path.join(_partition_dir(ticker, tier, derived_root(root)), f"{month}.parquet")
+                if os.path.exists(path):
+                    os.remove(path)
+                write_bars(resample_bars(minute_bars, tier), ticker, tier, root=derived_root(root))
+                rebuilt[tier].append(month)
+    for tier in tiers:
+        if not rebuilt[tier]:
+            continue
+        path = _derived_path(ticker, tier, root)
+        built = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                built = json.load(f)["months"]
+        built.update({m: versions[m] for m in rebuilt[tier]})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"source": SOURCE_INTERVAL, "months": dict(sorted(built.items()))}, f, indent=1)
+        os.replace(path + ".tmp", path)
+    return rebuilt
+
+
+def resampled_months(ticker: str, interval: str, root: str=STORE_ROOT) -> list:
+    """
+    The month keys read_resampled has bars for, fetched or derived (as of the last update_tiers).
+    """
+    interval = normalize_interval(interval)
+    months = set(stored_months(ticker, interval, root))
+    if interval in TIERS:
+        months.update(stored_months(ticker, interval, derived_root(root)))
+    return sorted(months)
+
+
+def read_resampled(ticker: str, interval: str, start_date: datetime.date=None, end_date: datetime.date=None, columns: list=None, root: str=STORE_ROOT,
+                   update: bool=True) -> pd.DataFrame:
+    """
+    interval bars for [start_date, end_date) out of the store: the bars fetched at that interval, filled in with the ones derived from the
+    minute bars wherever none were fetched.  Fetched bars win where both have a bar.  Takes the same arguments as bar_store.read_bars,
+    plus update, which brings the derived tier up to date for the range first (callers reading month by month can do it once up front).
+    """
+    interval = normalize_interval(interval)
+    fetched = read_bars(ticker, interval, start_date, end_date, columns=columns, root=root)
+    if interval not in TIERS:
+        return fetched
+    if update:
+        update_tiers(ticker, [interval], start_date, end_date, root=root)
+    derived = read_bars(ticker, interval, start_date, end_date, columns=columns, root=derived_root(root))
+    if derived.empty or fetched.empty:
+        return fetched if derived.empty else derived
+    data = pd.concat([derived, fetched])
+    return data[~data.index.duplicated(keep="last")].sort_index()
+
+
+if __name__=="__main__":
+    for tier, months in update_tiers("TQQQ").items():
+        print(f"{tier}: {len(months)} month(s) rebuilt")
+    print(read_resampled("TQQQ", "1h", datetime.date(2024,1,1), datetime.date(2024,2,1)))
@@ -0,0 +1,228 @@
+"""
+SQLite store for backtest results, living at backtest/results/results.sqlite.
+
+Results are keyed by a hash of the strategy's code, its parameters, the exact bars it ran on, the engine (and its code or version) and the
+Backtest settings, so a run whose inputs haven't changed can be looked up instead of recomputed.
+
+Tables:
+- window_stats: scalar stats of the walk-forward runs
+- runs: one row per batch run (ticker, interval, strategy, parameters, engine, dates and scalar stats), indexed by ticker and strategy
+- trades: every trade of every run
+- equity: the bar by bar equity curve of every run
+"""
+import os
+import sys
+import json
+import sqlite3
+import inspect
+import hashlib
+import functools
+import numpy as np
+import pandas as pd
+from bar_store import COLUMNS
+
+
+RESULTS_DB = os.path.join("backtest", "results", "results.sqlite")
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS window_stats (
+    key TEXT PRIMARY KEY,
+    strategy TEXT NOT NULL,
+    params TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    stats TEXT NOT NULL,
+    created TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    params TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    stats TEXT NOT NULL,
+    created TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_runs_ticker_strategy ON runs (ticker, strategy, start);
+
+CREATE TABLE IF NOT EXISTS trades (
+    key TEXT NOT NULL,
+    trade INTEGER NOT NULL,
+    size REAL,
+    entry_bar INTEGER,
+    exit_bar INTEGER,
+    entry_price REAL,
+    exit_price REAL,
+    pnl REAL,
+    return_pct REAL,
+    entry_time TEXT,
+    exit_time TEXT,
+    PRIMARY KEY (key, trade)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS equity (
+    key TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    equity REAL NOT NULL,
+    PRIMARY KEY (key, ts)
+) WITHOUT ROWID;
+"""
+TRADE_COLUMNS = ["Size", "EntryBar", "ExitBar", "EntryPrice", "ExitPrice", "PnL", "ReturnPct", "EntryTime", "ExitTime"]
+
+
+def connect(path: str=RESULTS_DB) -> sqlite3.Connection:
+    """
+    Opens (creating if needed) the results database.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def to_json(value) -> str:
+    """
+    Deterministic JSON for params and stats, used both for hashing and for storage.
+    """
+    # Timestamps, Timedeltas, datetime.time and numpy scalars all fall back to their string form
+    return json.dumps(value, sort_keys=True, default=lambda v: v.item() if isinstance(v, np.generic) else str(v))
+
+
+def strategy_fingerprint(model) -> str:
+    """
+    Hash of the whole module the strategy is defined in, so edits to module level constants or helpers also invalidate its results.
+    """
+    source = inspect.getsource(sys.modules[model.__module__])
+    return hashlib.sha256(f"{model.__qualname__}\n{source}".encode()).hexdigest()
+
+
+def data_fingerprint(data: pd.DataFrame) -> str:
+    """
+    Hash of the bars' timestamps and OHLCV values.
+    """
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(data.index.values.astype("datetime64[ns]").view(np.int64)).tobytes())
+    for column in COLUMNS:
+        digest.update(np.ascontiguousarray(data[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def is_deterministic(model, params: dict) -> bool:
+    """
+    Whether running model with params twice gives the same result, so its stored result can stand in for a new run.  Strategies drawing
+    random numbers say so with a class level seed (like CoinFlip), and are only deterministic when one is set.
+    """
+    return params.get("seed", getattr(model, "seed", 0)) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def engine_fingerprint(engine: str) -> str:
+    """
+    Hash of what runs the strategies under engine: the installed backtesting.py version, and for the vectorized engine its whole module too.
+    """
+    import backtesting
+    parts = [engine, backtesting.__version__]
+    if engine == "vectorized":
+        import vectorized
+        parts.append(inspect.getsource(vectorized))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def run_key(strategy_hash: str, params: dict, data_hash: str, engine: str="event", backtest_kwargs: dict=None) -> str:
+    """
+    Cache key of one run.  Upgrading backtesting.py or editing the vectorized engine changes every key of the runs it made.
+    """
+    key = f"{strategy_hash}|{to_json(params)}|{data_hash}|{engine_fingerprint(engine)}|{to_json(backtest_kwargs or {})}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_window_stats(conn: sqlite3.Connection, key: str) -> dict:
+    """
+    The stats stored under key, or None if that run hasn't been done yet.
+    """
+    row = conn.execute("SELECT stats FROM window_stats WHERE key = ?", (key,)).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def put_window_stats(conn: sqlite3.Connection, key: str, strategy: str, params: dict, start, end, stats: dict) -> None:
+    """
+    Stores (or replaces) the scalar stats of one run.
+    """
+    conn.execute("INSERT OR REPLACE INTO window_stats (key, strategy, params, start, end, stats) VALUES (?, ?, ?, ?, ?, ?)",
+                 (key, strategy, to_json(params), str(start), str(end), to_json(stats)))
+    conn.commit()
+
+
+def get_run_stats(conn: sqlite3.Connection, key: str) -> dict:
+    """
+    The stats of a stored run, or None if that run hasn't been done yet.
+    """
+    row = conn.execute("SELECT stats FROM runs WHERE key = ?", (key,)).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def put_run(conn: sqlite3.Connection, key: str, ticker: str, interval: str, strategy: str, params: dict, engine: str, start, end, stats: dict,
+            trades: pd.DataFrame, equity: pd.Series) -> None:
+    """
+    Stores (or replaces) a whole run: its scalar stats in runs, every trade in trades and the bar by bar equity curve in equity.
+    """
+    trade_rows = zip([key] * len(trades), range(len(trades)), *[trades[c].tolist() for c in TRADE_COLUMNS[:7]],
+                     trades["EntryTime"].astype(str).tolist(), trades["ExitTime"].astype(str).tolist())
+    ts = equity.index.values.astype("datetime64[ns]").view(np.int64)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO runs (key, ticker, interval, strategy, params, engine, start, end, stats) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (key, ticker, interval, strategy, to_json(params), engine, str(start), str(end), to_json(stats)))
+        conn.execute("DELETE FROM trades WHERE key = ?", (key,))
+        conn.execute("DELETE FROM equity WHERE key = ?", (key,))
+        conn.executemany("""
+            INSERT INTO trades (key, trade, size, entry_bar, exit_bar, entry_price, exit_price, pnl, return_pct, entry_time, exit_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", trade_rows)
+        conn.executemany("INSERT INTO equity (key, ts, equity) VALUES (?, ?, ?)", zip([key] * len(ts), ts.tolist(), equity.tolist()))
+
+
+def read_runs(conn: sqlite3.Connection, ticker: str=None, strategy: str=None) -> pd.DataFrame:
+    """
+    Stored runs, optionally only those of one ticker and/or strategy, with their stats expanded into columns.
+    """
+    query = "SELECT key, ticker, interval, strategy, params, engine, start, end, stats, created FROM runs WHERE 1 = 1"
+    args = []
+    if ticker is not None:
+        query += " AND ticker = ?"
+        args.append(ticker.upper())
+    if strategy is not None:
+        query += " AND strategy = ?"
+        args.append(strategy)
+    rows = []
+    for key, ticker, interval, strategy, params, engine, start, end, stats, created in conn.execute(query + " ORDER BY ticker, strategy, start", args):
+        row = {"key": key, "Ticker": ticker, "Interval": interval, "Strategy": strategy, "Params": json.loads(params), "Engine": engine,
+               "Start": start, "End": end, "Created": created}
+        row.update(json.loads(stats))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def read_trades(conn: sqlite3.Connection, key: str) -> pd.DataFrame:
+    """
+    The trades of a stored run, laid out like backtesting.py's _trades.
+    """
+    rows = conn.execute("""
+        SELECT size, entry_bar, exit_bar, entry_price, exit_price, pnl, return_pct, entry_time, exit_time FROM trades WHERE key = ? ORDER BY trade""",
+        (key,)).fetchall()
+    trades = pd.DataFrame(rows, columns=TRADE_COLUMNS)
+    trades["EntryTime"] = pd.to_datetime(trades["EntryTime"])
+    trades["ExitTime"] = pd.to_datetime(trades["ExitTime"])
+    return trades
+
+
+def read_equity(conn: sqlite3.Connection, key: str) -> pd.Series:
+    """
+    The equity curve of a stored run.
+    """
+    rows = conn.execute("SELECT ts, equity FROM equity WHERE key = ? ORDER BY ts", (key,)).fetchall()
+    ts, equity = zip(*rows) if rows else ((), ())
+    return pd.Series(np.array(equity, dtype=np.float64), index=pd.DatetimeIndex(np.array(ts, dtype=np.int64).view("datetime64[ns]"), name="Datetime"), name="Equity")
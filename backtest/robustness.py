@@ -0,0 +1,210 @@
+"""
+Robustness checks, for telling a strategy's result apart from luck.  One backtest is one draw: CoinFlip has come out at +2500% on one run
+and -99% on the next, and a real strategy's single equity curve is no different.  This gives the distribution instead:
+
+- coin_flip_replications: thousands of seeded CoinFlip runs over the same bars, i.e. what pure chance makes of that stretch of history
+- bootstrap_trades: a moving block bootstrap of the daily returns of an existing trade list (a backtest's _trades, results_store.read_trades
+  or a portfolio's), resampling whole blocks of days so streaks and volatility clusters survive
+- confidence_intervals: mean, median and the confidence interval of return, Sharpe ratio (daily) and max drawdown over the replications
+
+Replications are computed as NumPy batches (a chunk of replications x bars at a time, never a loop over bars) spread over a process pool.
+Every replication gets its own seed from np.random.SeedSequence(seed), so results don't depend on the chunk size or the number of workers,
+and replication i's seed reproduces it on its own (for a coin flip run, CoinFlip with that seed in backtesting.py).
+
+    replications = coin_flip_replications(bars, replications=5000, seed=42)
+    print(confidence_intervals(replications))
+"""
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from market_calendar import get_calendar, NS_PER_DAY
+from sweep import share_bars, open_bars
+
+
+TRADING_DAYS = 252
+# the Sharpe ratio is mean / std of the daily returns times sqrt(252), not backtesting.py's "Sharpe Ratio" (annualized return over annualized
+# volatility, geometric), so it's named apart and the two shouldn't be compared with each other
+METRICS = ["Return [%]", "Sharpe Ratio (daily, 252)", "Max. Drawdown [%]"]
+
+# set in each worker by _attach_bars: the bar to bar open returns and where each day starts in them
+_worker_shm = None
+_worker_returns = None
+_worker_day_starts = None
+
+
+def replication_seeds(seed: int, replications: int) -> np.ndarray:
+    """
+    One independent seed per replication, the same ones every time for the same seed.
+    """
+    return np.random.SeedSequence(seed).generate_state(replications).astype(np.int64)
+
+
+def _metrics(log_returns: np.ndarray, day_starts: np.ndarray) -> np.ndarray:
+    """
+    Return [%], Sharpe ratio of the daily returns (mean / std x sqrt(252), no risk-free rate) and max drawdown [%] of each row of a
+    (replications, steps) array of log returns, day_starts being where each day begins along the rows.
+    """
+    path = np.cumsum(log_returns, axis=1)
+    drawdown = np.expm1(path - np.maximum(np.maximum.accumulate(path, axis=1), 0)).min(axis=1)
+    daily = np.expm1(np.add.reduceat(log_returns, day_starts, axis=1)) if len(day_starts) else np.zeros((len(log_returns), 0))
+    std = daily.std(axis=1, ddof=1) if daily.shape[1] > 1 else np.full(len(daily), np.nan)
+    sharpe = np.divide(daily.mean(axis=1), std, out=np.full(len(daily), np.nan), where=std > 0) * np.sqrt(TRADING_DAYS)
+    return np.column_stack([np.expm1(path[:, -1]) * 100, sharpe, np.minimum(drawdown, 0) * 100])
+
+
+def _open_returns(data: pd.DataFrame) -> tuple:
+    """
+    What the position CoinFlip takes at bar t earns: it fills at bar t + 1's open and is closed or flipped at bar t + 2's (with
+    exclusive_orders=True every flip re-enters), and next() first runs at bar 1, so these are the open to open returns from bar 2 on.  Also
+    returns where each day starts in them.
+    """
+    open_ = data["Open"].to_numpy(dtype=np.float64)
+    returns = open_[3:] / open_[2:-1] - 1
+    day = data.index.values.astype("datetime64[ns]").view(np.int64)[2:-1] // NS_PER_DAY
+    day_starts = np.r_[0, np.flatnonzero(day[1:] != day[:-1]) + 1] if len(day) else np.empty(0, dtype=int)
+    return returns, day_starts
+
+
+def _attach_bars(shm_name: str, n: int) -> None:
+    """
+    Process pool initializer: attaches to the bars shared with sweep.share_bars and works out their open to open returns once per worker.
+    """
+    global _worker_shm, _worker_returns, _worker_day_starts
+    _worker_shm, data = open_bars(shm_name, n)
+    _worker_returns, _worker_day_starts = _open_returns(data)
+
+
+def _coin_flip_chunk(seeds: np.ndarray, returns: np.ndarray=None, day_starts: np.ndarray=None) -> np.ndarray:
+    """
+    METRICS of the CoinFlip runs with the given seeds, all at once.  Positions are fractional (the whole equity, long or short), where
+    backtesting.py buys whole units, so the two differ by the rounding only.
+    """
+    returns = _worker_returns if returns is None else returns
+    day_starts = _worker_day_starts if day_starts is None else day_starts
+    # the same draws CoinFlip.init makes, of which next() reads one per bar from bar 1 on
+    flips = np.stack([np.random.default_rng(s).random(len(returns) + 3)[1:len(returns) + 1] for s in seeds])
+    positions = np.where(flips < 0.5, 1.0, -1.0)
+    return _metrics(np.log1p(positions * returns), day_starts)
+
+
+def _run_chunks(function, seeds: np.ndarray, chunk_size: int, max_workers: int, initializer=None, initargs: tuple=(), args: tuple=()) -> np.ndarray:
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    if max_workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return np.vstack([function(chunk, *args) for chunk in chunks])
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=initializer, initargs=initargs) as pool:
+        return np.vstack(list(pool.map(function, chunks, *([a] * len(chunks) for a in args))))
+
+
+def coin_flip_replications(data: pd.DataFrame, replications: int=1000, seed: int=0, chunk_size: int=32, max_workers: int=None) -> pd.DataFrame:
+    """
+    METRICS of replications seeded CoinFlip runs over the same bars.
+
+    Inputs:
+    ------
+    data: Datetime indexed OHLC bars, the same as a backtest would get
+    replications: number of runs
+    seed: seeds every run's own seed (see replication_seeds)
+    chunk_size: runs computed together as one (runs, bars) batch, smaller uses less memory on long histories
+    max_workers: size of the process pool, defaults to the number of cores, 1 runs everything in this process
+
+    Returns one row per run with its Seed, best first.
+    """
+    seeds = replication_seeds(seed, replications)
+    if len(data) < 4:
+        raise ValueError("CoinFlip needs at least 4 bars to close a trade.")
+    if max_workers == 1:
+        returns, day_starts = _open_returns(data)
+        metrics = _run_chunks(_coin_flip_chunk, seeds, chunk_size, 1, args=(returns, day_starts))
+    else:
+        shm, n = share_bars(data)
+        try:
+            metrics = _run_chunks(_coin_flip_chunk, seeds, chunk_size, max_workers, initializer=_attach_bars, initargs=(shm.name, n))
+        finally:
+            shm.close()
+            shm.unlink()
+    return _replication_frame(seeds, metrics)
+
+
+def daily_returns(trades: pd.DataFrame, cash: float=10_000) -> pd.Series:
+    """
+    Daily returns of a trade list, every session from the first entry to the last exit included (days without exits return 0).  Each day's
+    P&L (by exit) is taken against the equity at the start of that day, so overlapping trades (i.e. a portfolio's) are handled too.
+    """
+    if trades.empty:
+        return pd.Series(dtype=float)
+    exit_day = pd.to_datetime(trades["ExitTime"]).dt.normalize()
+    pnl = trades["PnL"].groupby(exit_day.to_numpy()).sum()
+    sessions = pd.DatetimeIndex(get_calendar().sessions_in_range(pd.to_datetime(trades["EntryTime"]).min(), exit_day.max() + pd.Timedelta(days=1)))
+    pnl = pnl.reindex(sessions.union(pnl.index), fill_value=0.0)
+    start_equity = cash + pnl.cumsum().shift(fill_value=0.0)
+    return pnl / start_equity
+
+
+def _bootstrap_chunk(seeds: np.ndarray, returns: np.ndarray, block_days: int) -> np.ndarray:
+    """
+    METRICS of one moving block bootstrap of returns per seed: blocks of block_days consecutive days (wrapping around the end) starting at
+    random days, strung together up to the original length.
+    """
+    n = len(returns)
+    blocks = -(-n // block_days)
+    starts = np.stack([np.random.default_rng(s).integers(0, n, blocks) for s in seeds])
+    days = ((starts[:, :, None] + np.arange(block_days)) % n).reshape(len(seeds), -1)[:, :n]
+    # every step is a day here, so each day starts its own group
+    return _metrics(np.log1p(returns[days]), np.arange(n))
+
+
+def bootstrap_trades(trades: pd.DataFrame, replications: int=1000, block_days: int=5, seed: int=0, cash: float=10_000, chunk_size: int=256,
+                     max_workers: int=None) -> pd.DataFrame:
+    """
+    METRICS of replications block bootstraps of a trade list's daily returns.
+
+    Inputs:
+    ------
+    trades: with EntryTime, ExitTime and PnL, i.e. stats["_trades"] of a backtest, run_vectorized or run_portfolio, or results_store.read_trades
+    replications: number of resampled histories
+    block_days: length of the resampled blocks in sessions, longer keeps more of the returns' autocorrelation
+    seed: seeds every replication's own seed (see replication_seeds)
+    cash: the equity the trades started from
+    chunk_size: replications computed together as one batch
+    max_workers: size of the process pool, defaults to the number of cores, 1 runs everything in this process
+
+    Returns one row per replication with its Seed, best first.
+    """
+    returns = daily_returns(trades, cash).to_numpy()
+    if len(returns) < 2:
+        raise ValueError("The trades span fewer than 2 sessions, there's nothing to resample.")
+    seeds = replication_seeds(seed, replications)
+    return _replication_frame(seeds, _run_chunks(_bootstrap_chunk, seeds, chunk_size, max_workers, args=(returns, min(block_days, len(returns)))))
+
+
+def _replication_frame(seeds: np.ndarray, metrics: np.ndarray) -> pd.DataFrame:
+    frame = pd.DataFrame(metrics, columns=METRICS)
+    frame.insert(0, "Seed", seeds)
+    frame = frame.sort_values("Return [%]", ascending=False).reset_index(drop=True)
+    frame.index.name = "Rank"
+    return frame
+
+
+def confidence_intervals(replications: pd.DataFrame, confidence: float=0.95) -> pd.DataFrame:
+    """
+    Mean, median and the central confidence interval (percentiles) of each metric over the replications.
+    """
+    lower, upper = (1 - confidence) / 2, (1 + confidence) / 2
+    metrics = replications[METRICS]
+    return pd.DataFrame({"Mean": metrics.mean(), "Median": metrics.median(), f"Lower ({lower:.1%})": metrics.quantile(lower),
+                         f"Upper ({upper:.1%})": metrics.quantile(upper)})
+
+
+if __name__=="__main__":
+    from data_loaders import load_data_from_store
+    from vectorized import run_vectorized
+    from models.VolatilityLongStrategy import VolatilityLongStrategy
+    bars = load_data_from_store("TQQQ", "1min", datetime.date(2024,1,1), datetime.date(2024,10,1))
+    print("CoinFlip over the same bars:")
+    print(confidence_intervals(coin_flip_replications(bars, replications=2000, seed=42)))
+    print("VolatilityLongStrategy's trades, block bootstrapped:")
+    print(confidence_intervals(bootstrap_trades(run_vectorized(bars, VolatilityLongStrategy)["_trades"], replications=5000, seed=42)))
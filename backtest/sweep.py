@@ -0,0 +1,148 @@
+"""
+Parameter sweeps on top of the orchestrator.  Instead of hand-editing PROFIT_CAPTURE_PERCENT and friends and re-running, hand a strategy class
+and a grid (or random search space) over its class-level parameters to sweep(), which spreads the runs over a process pool.
+
+The bars are loaded once and copied into a shared memory block, workers attach to it once when they start, so each task only ships its
+parameter dict instead of a pickled copy of years of minute data.
+"""
+import os
+import random
+import datetime
+import itertools
+import numpy as np
+import pandas as pd
+import backtesting
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from orchestrator import load_data
+from vectorized import run_vectorized, reproduces
+from bar_store import COLUMNS
+
+
+# set in each worker by attach_bars, so every task run by that worker reuses the same frame
+_worker_data = None
+_worker_shm = None
+
+
+def grid(param_grid: dict) -> list:
+    """
+    Every combination of the given parameter values, i.e. {"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}].
+    """
+    keys = list(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def random_search(space: dict, n_iter: int, seed: int=None) -> list:
+    """
+    n_iter random draws from the space.  A list value is sampled from uniformly, a (low, high) tuple is sampled as a uniform float in between.
+    """
+    rng = random.Random(seed)
+    draws = []
+    for _ in range(n_iter):
+        draw = {}
+        for key, values in space.items():
+            if isinstance(values, tuple):
+                draw[key] = rng.uniform(values[0], values[1])
+            else:
+                draw[key] = rng.choice(values)
+        draws.append(draw)
+    return draws
+
+
+def share_bars(data: pd.DataFrame) -> tuple:
+    """
+    Copies the index (as int64 ns) and the OHLCV columns (as float64) into one shared memory block laid out as a (6, n) array.
+    The caller owns the block and has to close() and unlink() it once the pool is done.
+    """
+    n = len(data)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 6 * n * 8))
+    block = np.ndarray((6, n), dtype=np.float64, buffer=shm.buf)
+    block[0].view(np.int64)[:] = data.index.values.astype("datetime64[ns]").view(np.int64)
+    for row, column in enumerate(COLUMNS, start=1):
+        block[row] = data[column].to_numpy(dtype=np.float64)
+    del block
+    return shm, n
+
+
+def open_bars(shm_name: str, n: int) -> tuple:
+    """
+    Attaches to a block made by share_bars, returning (shm, frame).  The shm has to stay referenced for as long as the frame is used.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray((6, n), dtype=np.float64, buffer=shm.buf)
+    index = pd.DatetimeIndex(block[0].view(np.int64).view("datetime64[ns]"), name="Datetime")
+    # the frame's columns are views onto the shared block rather than copies
+    return shm, pd.DataFrame({column: block[row] for row, column in enumerate(COLUMNS, start=1)}, index=index, copy=False)
+
+
+def attach_bars(shm_name: str, n: int) -> None:
+    """
+    Process pool initializer attaching the worker to a block made by share_bars.
+    """
+    global _worker_data, _worker_shm
+    _worker_shm, _worker_data = open_bars(shm_name, n)
+
+
+def _summarize(stats: pd.Series, params: dict) -> dict:
+    row = {k: v for k, v in params.items()}
+    for key, value in stats.items():
+        if not key.startswith("_"):
+            row[key] = value
+    return row
+
+
+def run_shared(model: backtesting.Strategy, params: dict, backtest_kwargs: dict, engine: str="event", bounds: tuple=None) -> dict:
+    """
+    Runs one backtest in a worker on the attached bars, or on bars[bounds[0]:bounds[1]] when bounds are given, and returns its summary row.
+    """
+    data = _worker_data if bounds is None else _worker_data.iloc[bounds[0]:bounds[1]]
+    if engine == "vectorized":
+        return _summarize(run_vectorized(data, model, cash=backtest_kwargs.get("cash", 10_000), **params), params)
+    bt = backtesting.Backtest(data=data, strategy=model, **backtest_kwargs)
+    return _summarize(bt.run(**params), params)
+
+
+def sweep(data_specs: dict, model: backtesting.Strategy, params: list, rank_by: str="Return [%]", ascending: bool=False, max_workers: int=None, backtest_kwargs: dict=None, engine: str="event") -> pd.DataFrame:
+    """
+    Backtests model once per entry of params across a process pool and ranks the runs.
+
+    Inputs:
+    ------
+    data_specs: same as for orchestrator.orchestrate, the bars are loaded once for the whole sweep
+    model: extends the backtesting.Strategy class, every key in params must be a class attribute of it
+    params: list of parameter dicts, usually from grid() or random_search()
+    rank_by: the backtesting.py stat to rank by, i.e. "Return [%]", "Sharpe Ratio", "Max. Drawdown [%]"
+    ascending: whether smaller values of rank_by rank higher
+    max_workers: size of the process pool, defaults to the number of cores
+    backtest_kwargs: extra keyword arguments for backtesting.Backtest, defaults to the orchestrator's exclusive_orders=True
+    engine: "event" runs backtesting.py, "vectorized" runs the daily bracket engine in vectorized.py (bracket strategies only, much faster)
+
+    Returns one row per run, holding the parameters and the scalar stats of the run, best run first.
+    """
+    backtest_kwargs = {"exclusive_orders": True} if backtest_kwargs is None else backtest_kwargs
+    if engine == "vectorized" and not reproduces(backtest_kwargs):
+        raise ValueError(f"The vectorized engine only takes cash, it can't run with {backtest_kwargs}.")
+    data = load_data(data_specs)
+    shm, n = share_bars(data)
+    del data
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=attach_bars, initargs=(shm.name, n)) as pool:
+            futures = [pool.submit(run_shared, model, p, backtest_kwargs, engine) for p in params]
+            rows = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+    results = pd.DataFrame(rows)
+    results = results.sort_values(rank_by, ascending=ascending, na_position="last").reset_index(drop=True)
+    results.index.name = "Rank"
+    return results
+
+
+if __name__=="__main__":
+    from data_loaders import load_data_from_store
+    from models.VolatilityLongStrategy import VolatilityLongStrategy
+    data_specs = {"loader": load_data_from_store, "ticker": "TQQQ", "interval": "1min", "start_date": datetime.date(2024,1,1), "end_date": datetime.date(2024,10,1)}
+    param_grid = {"profit_capture_percent": [0.005, 0.01, 0.02, 0.03], "loss_aversion_percent": [0.005, 0.01, 0.02]}
+    results = sweep(data_specs=data_specs, model=VolatilityLongStrategy, params=grid(param_grid), engine="vectorized")
+    results.to_csv("./backtest/results/VolatilityLongStrategy_sweep.csv")
+    print(results.head(10))
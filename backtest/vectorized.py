@@ -0,0 +1,290 @@
+"""
+Vectorized engine for the daily bracket strategies (VolatilityLongStrategy and VolatilityShortStrategy).
+
+Those strategies are really one bracket per session: enter at a fixed time if the last bar moved the right way, then get out at the first bar
+that closes past the take-profit or stop-loss level, or at the exit time.  Rather than calling next() on every minute bar, this finds the entry
+bars with a boolean mask and, for each trade, the first-touch bar of the exit conditions with an argmax over that session's bars, which makes
+years of minute data a matter of milliseconds.
+
+Fills follow backtesting.py's defaults exactly (market orders fill at the next bar's open, sizes are whole units of the full equity, no
+commission, trades still open at the end are left out of the trade list), so cross_check() can hold the two engines to the same trades.
+"""
+import sys
+import numpy as np
+import pandas as pd
+import backtesting
+from models.VolatilityLongStrategy import VolatilityLongStrategy
+from models.VolatilityShortStrategy import VolatilityShortStrategy
+from market_calendar import get_calendar, bars_at_times
+
+
+# backtesting.py's default order size, i.e. all of the available equity
+FULL_EQUITY = 1 - sys.float_info.epsilon
+# strategy class -> trade direction, subclasses included
+BRACKET_STRATEGIES = {VolatilityLongStrategy: 1, VolatilityShortStrategy: -1}
+# the backtesting.Backtest settings the engine assumes, cash aside (which it takes): any other value needs the event-driven engine
+EVENT_DEFAULTS = {"exclusive_orders": True, "commission": 0, "spread": 0, "margin": 1, "trade_on_close": False, "hedging": False}
+
+
+def _first_exit(close: np.ndarray, is_exit_time: np.ndarray, entry_signal: np.ndarray, session_end: np.ndarray, start: int, direction: int,
+                stop_level: float, take_level: float) -> int:
+    """
+    The first bar from start on that closes past the stop or take-profit level, is an exit time, or carries a new entry signal, or None if
+    the data runs out first.  Scans one session at a time.
+    """
+    n = len(close)
+    while start < n:
+        stop = session_end[start]
+        window = close[start:stop]
+        if direction > 0:
+            touched = (window < stop_level) | (window >= take_level)
+        else:
+            touched = (window > stop_level) | (window <= take_level)
+        # a fresh entry signal while holding closes the trade and re-opens it (exclusive_orders=True)
+        touched |= is_exit_time[start:stop] | entry_signal[start:stop]
+        if touched.any():
+            return start + int(np.argmax(touched))
+        start = stop
+    return None
+
+
+def _simulate(timestamps: np.ndarray, open_: np.ndarray, close: np.ndarray, direction: int, buy_times: list, sell_times: list,
+              profit_capture_percent: float, loss_aversion_percent: float, cash: float) -> tuple:
+    """
+    run_bracket's simulation, also returning the position size held at every bar (which the streaming engine needs).
+    """
+    n = len(close)
+    equity = np.full(n, float(cash))
+    if n < 2:
+        return [], equity, np.zeros(n)
+    is_entry_time = bars_at_times(timestamps, buy_times)
+    is_exit_time = bars_at_times(timestamps, sell_times)
+    moved = np.zeros(n, dtype=bool)
+    moved[1:] = (close[1:] < close[:-1]) if direction > 0 else (close[1:] > close[:-1])
+    entry_signal = is_entry_time & moved
+    entry_signal[0] = False  # backtesting.py never calls next() on the first bar
+    entry_bars = np.flatnonzero(entry_signal)
+    # end (exclusive) of the session each bar belongs to, so the exit search only scans one session at a time
+    _, session_end = get_calendar().session_bounds(timestamps)
+
+    trades = []
+    size_held = np.zeros(n)
+    entry_held = np.zeros(n)
+    cash_change = np.zeros(n)
+    signal = entry_bars[0] if len(entry_bars) else n
+    while signal < n - 1:
+        fill = signal + 1
+        entry_price = open_[fill]
+        size = direction * int((cash * FULL_EQUITY) // entry_price)
+        if size == 0:
+            # broker cancels orders it can't afford a single unit of
+            nxt = np.searchsorted(entry_bars, signal, side="right")
+            signal = entry_bars[nxt] if nxt < len(entry_bars) else n
+            continue
+        reference = close[signal]
+        if direction > 0:
+            stop_level, take_level = (1 - loss_aversion_percent) * reference, (1 + profit_capture_percent) * reference
+        else:
+            stop_level, take_level = (1 + loss_aversion_percent) * reference, (1 - profit_capture_percent) * reference
+        exit_signal = _first_exit(close, is_exit_time, entry_signal, session_end, fill, direction, stop_level, take_level)
+        held_until = n if exit_signal is None or exit_signal == n - 1 else exit_signal + 1
+        size_held[fill:held_until] = size
+        entry_held[fill:held_until] = entry_price
+        if held_until == n:
+            # still open when the data runs out, left out of the trades like backtesting.py does
+            break
+        exit_price = open_[held_until]
+        pnl = size * (exit_price - entry_price)
+        cash += pnl
+        cash_change[held_until] += pnl
+        trades.append({"Size": size, "EntryBar": fill, "ExitBar": held_until, "EntryPrice": entry_price, "ExitPrice": exit_price,
+                       "PnL": pnl, "ReturnPct": direction * (exit_price / entry_price - 1)})
+        if entry_signal[exit_signal]:
+            signal = exit_signal
+        else:
+            nxt = np.searchsorted(entry_bars, exit_signal, side="right")
+            signal = entry_bars[nxt] if nxt < len(entry_bars) else n
+    equity = equity + np.cumsum(cash_change) + size_held * (close - entry_held)
+    # no equity is logged for the first bar, backtesting.py back-fills it from the second
+    equity[0] = equity[1]
+    return trades, equity, size_held
+
+
+def run_bracket(timestamps: np.ndarray, open_: np.ndarray, close: np.ndarray, direction: int, buy_times: list, sell_times: list,
+                profit_capture_percent: float, loss_aversion_percent: float, cash: float=10_000) -> tuple:
+    """
+    Simulates the daily bracket on raw arrays.
+
+    Inputs:
+    ------
+    timestamps: int64 nanoseconds since epoch of US/Eastern wall-clock time, ascending (what the bar store hands back)
+    open_: bar opens
+    close: bar closes
+    direction: 1 to go long on a down bar at the entry time, -1 to go short on an up bar
+    buy_times: datetime.time entries, same meaning as the strategies' buy_times
+    sell_times: datetime.time exits, same meaning as the strategies' sell_times
+    profit_capture_percent: take-profit distance from the entry bar's close
+    loss_aversion_percent: stop-loss distance from the entry bar's close
+    cash: starting cash
+
+    Returns (trades, equity): a list of per-trade dicts and the per-bar equity array.
+    """
+    trades, equity, _ = _simulate(timestamps, open_, close, direction, buy_times, sell_times, profit_capture_percent, loss_aversion_percent, cash)
+    return trades, equity
+
+
+def _summary(trades: pd.DataFrame, start, end, final: float, peak: float, max_drawdown: float, cash: float) -> pd.Series:
+    returns = trades["ReturnPct"] if len(trades) else pd.Series(dtype=float)
+    return pd.Series({
+        "Start": start,
+        "End": end,
+        "Equity Final [$]": final,
+        "Equity Peak [$]": peak,
+        "Return [%]": (final / cash - 1) * 100,
+        "Max. Drawdown [%]": max_drawdown * 100,
+        "# Trades": len(trades),
+        "Win Rate [%]": (returns > 0).mean() * 100 if len(returns) else np.nan,
+        "Avg. Trade [%]": returns.mean() * 100 if len(returns) else np.nan,
+        "Best Trade [%]": returns.max() * 100 if len(returns) else np.nan,
+        "Worst Trade [%]": returns.min() * 100 if len(returns) else np.nan,
+    })
+
+
+def _stats(trades: pd.DataFrame, equity: pd.Series, cash: float) -> pd.Series:
+    peak = np.maximum.accumulate(equity.to_numpy())
+    drawdown = equity.to_numpy() / peak - 1
+    stats = _summary(trades, equity.index[0] if len(equity) else None, equity.index[-1] if len(equity) else None,
+                     equity.iloc[-1] if len(equity) else cash, peak.max() if len(peak) else cash, drawdown.min() if len(drawdown) else 0.0, cash)
+    stats["_equity_curve"] = equity.to_frame("Equity")
+    stats["_trades"] = trades
+    return stats
+
+
+def _direction(model) -> int:
+    for strategy, direction in BRACKET_STRATEGIES.items():
+        if issubclass(model, strategy):
+            return direction
+    raise ValueError(f"{model.__name__} isn't a daily bracket strategy, the vectorized engine can't run it.")
+
+
+def reproduces(backtest_kwargs: dict) -> bool:
+    """
+    Whether run_vectorized makes the same run as backtesting.Backtest(**backtest_kwargs), i.e. nothing but the cash differs from EVENT_DEFAULTS.
+    """
+    return all(k == "cash" or (k in EVENT_DEFAULTS and v == EVENT_DEFAULTS[k]) for k, v in backtest_kwargs.items())
+
+
+def run_vectorized(data: pd.DataFrame, model: backtesting.Strategy, cash: float=10_000, **params) -> pd.Series:
+    """
+    Vectorized stand-in for backtesting.Backtest(data, model, exclusive_orders=True).run(**params), for the strategies in BRACKET_STRATEGIES.
+
+    data can also be a bar array (see bar_array.py).  Parameters not given fall back to the strategy's class attributes, same as with Backtest.run.  Returns a stats Series with the headline
+    numbers, plus _trades and _equity_curve laid out like backtesting.py's.
+    """
+    direction = _direction(model)
+    settings = {k: params.get(k, getattr(model, k)) for k in ["buy_times", "sell_times", "profit_capture_percent", "loss_aversion_percent"]}
+    if isinstance(data, np.ndarray):
+        # a bar array (see bar_array.py), whose fields are used in place
+        timestamps, open_, close = data["ts"], data["Open"], data["Close"]
+        index = pd.DatetimeIndex(timestamps.view("datetime64[ns]"), name="Datetime")
+    else:
+        timestamps = data.index.values.astype("datetime64[ns]").view(np.int64)
+        open_, close = data["Open"].to_numpy(dtype=np.float64), data["Close"].to_numpy(dtype=np.float64)
+        index = data.index
+    trades, equity = run_bracket(timestamps, open_, close, direction=direction, cash=cash, **settings)
+    trades = pd.DataFrame(trades, columns=["Size", "EntryBar", "ExitBar", "EntryPrice", "ExitPrice", "PnL", "ReturnPct"])
+    trades["EntryTime"] = index[trades["EntryBar"].to_numpy(dtype=int)]
+    trades["ExitTime"] = index[trades["ExitBar"].to_numpy(dtype=int)]
+    return _stats(trades, pd.Series(equity, index=index), cash)
+
+
+def cross_check(data: pd.DataFrame, model: backtesting.Strategy, cash: float=10_000, rtol: float=1e-9, **params) -> pd.Series:
+    """
+    Runs both the event-driven backtest and the vectorized engine on the same data and parameters, and raises an AssertionError pointing
+    at the first disagreement in the trades or the equity curve.  Returns the vectorized stats when they agree.
+    """
+    event_stats = backtesting.Backtest(data=data, strategy=model, cash=cash, exclusive_orders=True).run(**params)
+    vector_stats = run_vectorized(data, model, cash=cash, **params)
+    event_trades = event_stats["_trades"].reset_index(drop=True)
+    vector_trades = vector_stats["_trades"]
+    # raised explicitly rather than asserted, so the check still runs under python -O
+    if len(event_trades) != len(vector_trades):
+        raise AssertionError(f"Event-driven engine made {len(event_trades)} trades, vectorized made {len(vector_trades)}.")
+    for column in ["Size", "EntryBar", "ExitBar", "EntryPrice", "ExitPrice"]:
+        mismatched = np.flatnonzero(~np.isclose(event_trades[column].to_numpy(dtype=float), vector_trades[column].to_numpy(dtype=float), rtol=rtol))
+        if len(mismatched):
+            raise AssertionError(f"Trade {mismatched[0]} differs in {column}:\n{event_trades.iloc[mismatched[0]]}\nvs\n{vector_trades.iloc[mismatched[0]]}")
+    event_equity = event_stats["_equity_curve"]["Equity"].to_numpy()
+    vector_equity = vector_stats["_equity_curve"]["Equity"].to_numpy()
+    mismatched = np.flatnonzero(~np.isclose(event_equity, vector_equity, rtol=rtol))
+    if len(mismatched):
+        raise AssertionError(f"Equity curves first differ at bar {mismatched[0]}: {event_equity[mismatched[0]]} vs {vector_equity[mismatched[0]]}")
+    return vector_stats
+
+
+def run_vectorized_stream(chunks, model: backtesting.Strategy, cash: float=10_000, keep_equity: bool=False, **params) -> pd.Series:
+    """
+    run_vectorized over a stream of time-ordered bar frames (i.e. data_loaders.iter_bars_from_store or iter_bars_from_alpha_vantage), so
+    a backtest can run over more history than fits in memory and start before the last chunk has even been downloaded.
+
+    Bars are simulated a chunk at a time.  Whatever comes after the last bar the strategy was flat at (an open trade, or a signal still
+    waiting for its fill) is carried over and simulated again with the next chunk, along with the bar before it for the entry condition,
+    so the trades and stats come out exactly as run_vectorized's on the whole history would.  Drawdown and peak are tracked as the equity
+    goes by, so memory only grows with the number of trades, unless keep_equity asks for the whole equity curve back as _equity_curve.
+    """
+    direction = _direction(model)
+    settings = {k: params.get(k, getattr(model, k)) for k in ["buy_times", "sell_times", "profit_capture_percent", "loss_aversion_percent"]}
+    held = None             # (timestamps, opens, closes) still to be settled, the first being the context bar once there is one
+    has_context = False
+    offset = 0              # position in the whole stream of held's first bar
+    balance = float(cash)
+    trades, times, curves = [], [], []
+    start, end, final, peak, max_drawdown = None, None, float(cash), -np.inf, 0.0
+
+    def settle(timestamps, equity, settled_trades, stop):
+        nonlocal balance, start, end, final, peak, max_drawdown
+        first = 1 if has_context else 0
+        for trade in settled_trades:
+            balance += trade["PnL"]
+            times.append((timestamps[trade["EntryBar"]], timestamps[trade["ExitBar"]]))
+            trades.append({**trade, "EntryBar": trade["EntryBar"] + offset, "ExitBar": trade["ExitBar"] + offset})
+        part = equity[first:stop]
+        if not len(part):
+            return
+        running = np.maximum.accumulate(np.r_[peak, part])[1:]
+        max_drawdown = min(max_drawdown, float((part / running - 1).min()))
+        peak, final = float(running[-1]), float(part[-1])
+        start = timestamps[first] if start is None else start
+        end = timestamps[stop - 1]
+        if keep_equity:
+            curves.append(pd.Series(part, index=pd.DatetimeIndex(timestamps[first:stop].view("datetime64[ns]"), name="Datetime")))
+
+    for chunk in chunks:
+        arrays = (chunk.index.values.astype("datetime64[ns]").view(np.int64), chunk["Open"].to_numpy(dtype=np.float64),
+                  chunk["Close"].to_numpy(dtype=np.float64))
+        buffer = arrays if held is None else tuple(np.concatenate([h, a]) for h, a in zip(held, arrays))
+        bar_trades, equity, size_held = _simulate(*buffer, direction=direction, cash=balance, **settings)
+        flat = np.flatnonzero(size_held[1:] == 0) + 1
+        if not len(flat):
+            held = buffer
+            continue
+        # everything before the last flat bar is final, that bar is re-simulated with the next chunk, behind its predecessor for context
+        stop = int(flat[-1])
+        settle(buffer[0], equity, [t for t in bar_trades if t["ExitBar"] <= stop], stop)
+        held = tuple(b[stop - 1:] for b in buffer)
+        offset += stop - 1
+        has_context = True
+    if held is not None:
+        # the stream is over, so whatever was carried is settled as is (a trade still open is left out, like run_vectorized does)
+        bar_trades, equity, _ = _simulate(*held, direction=direction, cash=balance, **settings)
+        settle(held[0], equity, bar_trades, len(held[0]))
+
+    trades = pd.DataFrame(trades, columns=["Size", "EntryBar", "ExitBar", "EntryPrice", "ExitPrice", "PnL", "ReturnPct"])
+    trades["EntryTime"] = pd.to_datetime([t[0] for t in times])
+    trades["ExitTime"] = pd.to_datetime([t[1] for t in times])
+    stats = _summary(trades, None if start is None else pd.Timestamp(start), None if end is None else pd.Timestamp(end), final,
+                     cash if peak == -np.inf else peak, max_drawdown, cash)
+    if keep_equity:
+        stats["_equity_curve"] = (pd.concat(curves) if curves else pd.Series(dtype=float)).to_frame("Equity")
+    stats["_trades"] = trades
+    return stats
@@ -0,0 +1,138 @@
+"""
+Walk-forward backtesting.  The stored bar history is cut into rolling windows of train_sessions followed by test_sessions; in each window
+every parameter set is backtested on the train part, the best one is picked, and only that one is run on the unseen test part.  Looking at
+the test results across windows is what would have caught the one-month 2500% vs. multi-year -99% surprise early.
+
+All runs go across a process pool (sharing the bars the same way sweep.py does), and every run's stats are saved in the results store
+keyed by strategy code, parameters, data slice, engine and Backtest settings, so windows that haven't changed are read back instead of
+recomputed on later runs.
+"""
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+import backtesting
+from concurrent.futures import ProcessPoolExecutor
+from orchestrator import load_data
+from sweep import share_bars, attach_bars, run_shared
+from vectorized import reproduces
+from results_store import connect, strategy_fingerprint, data_fingerprint, run_key, is_deterministic, get_window_stats, put_window_stats, to_json, RESULTS_DB
+
+
+def windows(index: pd.DatetimeIndex, train_sessions: int, test_sessions: int, step_sessions: int=None) -> list:
+    """
+    Splits a bar index into rolling walk-forward windows, counted in trading sessions (days with bars) rather than calendar days.
+
+    Returns a list of ((train_start, train_stop), (test_start, test_stop)) bar positions, stops exclusive.  Windows step forward by
+    test_sessions unless step_sessions says otherwise, so by default the test parts tile the history without overlapping.
+    """
+    step_sessions = test_sessions if step_sessions is None else step_sessions
+    day = index.values.astype("datetime64[D]")
+    session_starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    bounds = np.r_[session_starts, len(index)]
+    cuts = []
+    first = 0
+    while first + train_sessions + test_sessions <= len(session_starts):
+        train = (int(bounds[first]), int(bounds[first + train_sessions]))
+        test = (train[1], int(bounds[first + train_sessions + test_sessions]))
+        cuts.append((train, test))
+        first += step_sessions
+    return cuts
+
+
+def _run_cached(pool: ProcessPoolExecutor, conn, data: pd.DataFrame, model: backtesting.Strategy, jobs: list, backtest_kwargs: dict, engine: str) -> list:
+    """
+    Runs (params, bounds) jobs, skipping any whose key is already in the results store, and returns their stats in job order.
+    """
+    strategy_hash = strategy_fingerprint(model)
+    slice_hashes = {}
+    results = [None] * len(jobs)
+    pending = {}
+    for i, (params, bounds) in enumerate(jobs):
+        if bounds not in slice_hashes:
+            slice_hashes[bounds] = data_fingerprint(data.iloc[bounds[0]:bounds[1]])
+        key = run_key(strategy_hash, params, slice_hashes[bounds], engine, backtest_kwargs)
+        # an unseeded random strategy is re-run every time, its last run only replaces the stored one
+        cached = get_window_stats(conn, key) if is_deterministic(model, params) else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending[i] = (key, pool.submit(run_shared, model, params, backtest_kwargs, engine, bounds))
+    for i, (key, future) in pending.items():
+        params, bounds = jobs[i]
+        stats = {k: v for k, v in future.result().items() if k not in params}
+        put_window_stats(conn, key, model.__name__, params, data.index[bounds[0]], data.index[bounds[1] - 1], stats)
+        # round trip through JSON, so fresh and cached stats look the same
+        results[i] = json.loads(to_json(stats))
+    print(f"{len(jobs) - len(pending)} of {len(jobs)} runs read from the results store.")
+    return results
+
+
+def walk_forward(data_specs: dict, model: backtesting.Strategy, params: list, train_sessions: int=60, test_sessions: int=20, step_sessions: int=None,
+                 rank_by: str="Return [%]", ascending: bool=False, max_workers: int=None, backtest_kwargs: dict=None, engine: str="event",
+                 results_db: str=RESULTS_DB) -> pd.DataFrame:
+    """
+    Walk-forward test of model over the bars described by data_specs.
+
+    Inputs:
+    ------
+    data_specs: same as for orchestrator.orchestrate, should cover the whole history to walk over
+    model: extends the backtesting.Strategy class
+    params: list of parameter dicts to pick from in every train window (see sweep.grid), a single entry just evaluates every window
+    train_sessions: length of each train part, in trading sessions
+    test_sessions: length of each test part, in trading sessions
+    step_sessions: how far windows move forward, defaults to test_sessions
+    rank_by: the stat the best train run is picked by
+    ascending: whether smaller values of rank_by are better
+    max_workers: size of the process pool, defaults to the number of cores
+    backtest_kwargs: extra keyword arguments for backtesting.Backtest, defaults to exclusive_orders=True
+    engine: "event" or "vectorized", see sweep.sweep
+    results_db: path of the results store
+
+    Returns one row per window with its dates, the chosen parameters, the train score and the test stats (prefixed "Test ").
+    """
+    backtest_kwargs = {"exclusive_orders": True} if backtest_kwargs is None else backtest_kwargs
+    if engine == "vectorized" and not reproduces(backtest_kwargs):
+        raise ValueError(f"The vectorized engine only takes cash, it can't run with {backtest_kwargs}.")
+    data = load_data(data_specs)
+    cuts = windows(data.index, train_sessions, test_sessions, step_sessions)
+    if not cuts:
+        raise ValueError(f"Not enough sessions for a {train_sessions}+{test_sessions} session window.")
+    conn = connect(results_db)
+    shm, n = share_bars(data)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=attach_bars, initargs=(shm.name, n)) as pool:
+            train_jobs = [(p, train) for train, _ in cuts for p in params]
+            train_stats = _run_cached(pool, conn, data, model, train_jobs, backtest_kwargs, engine)
+            best = []
+            for w in range(len(cuts)):
+                scores = [s.get(rank_by) for s in train_stats[w * len(params):(w + 1) * len(params)]]
+                scores = [np.nan if s is None else float(s) for s in scores]
+                ranked = np.argsort(scores) if ascending else np.argsort([-s for s in scores])
+                best.append((int(ranked[0]), scores[int(ranked[0])]))
+            test_jobs = [(params[b], test) for (b, _), (_, test) in zip(best, cuts)]
+            test_stats = _run_cached(pool, conn, data, model, test_jobs, backtest_kwargs, engine)
+    finally:
+        shm.close()
+        shm.unlink()
+        conn.close()
+    rows = []
+    for ((train, test), (b, score), stats) in zip(cuts, best, test_stats):
+        row = {"Train Start": data.index[train[0]], "Train End": data.index[train[1] - 1],
+               "Test Start": data.index[test[0]], "Test End": data.index[test[1] - 1],
+               "Params": params[b], f"Train {rank_by}": score}
+        row.update({f"Test {k}": v for k, v in stats.items()})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__=="__main__":
+    from sweep import grid
+    from data_loaders import load_data_from_store
+    from models.VolatilityLongStrategy import VolatilityLongStrategy
+    data_specs = {"loader": load_data_from_store, "ticker": "TQQQ", "interval": "1min", "start_date": datetime.date(2020,1,1), "end_date": datetime.date(2024,10,1)}
+    param_grid = {"profit_capture_percent": [0.005, 0.01, 0.02, 0.03], "loss_aversion_percent": [0.005, 0.01, 0.02]}
+    results = walk_forward(data_specs=data_specs, model=VolatilityLongStrategy, params=grid(param_grid), engine="vectorized")
+    results.to_csv("./backtest/results/VolatilityLongStrategy_walk_forward.csv")
+    print(results[["Test Start", "Test End", "Params", "Test Return [%]"]])
@@ -0,0 +1,161 @@
+"""
+Recorded provider responses for the benchmarks, and a local AlphaVantage stand-in that replays them.
+
+record_alpha_vantage saves AlphaVantage's raw JSON for a ticker/interval/month under benchmarks/fixtures, exactly as it came over the wire.
+ReplayAlphaVantageServer answers the loaders' TIME_SERIES_INTRADAY queries from those files, and for months nobody has recorded it renders
+synthetic bars (see synthetic.py) in the same JSON layout, so the loader benchmarks run the real parsing and storing code offline.
+
+    python -m benchmarks.fixtures TQQQ 1min 2024-01 2024-02
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.synthetic import synthetic_bars, add_months
+
+
+FIXTURE_ROOT = os.path.join("benchmarks", "fixtures")
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+
+def _fixture_path(ticker: str, interval: str, month: str, root: str) -> str:
+    return os.path.join(root, "alpha_vantage", ticker.upper(), interval, f"{month}.json")
+
+
+def record_alpha_vantage(ticker: str, interval: str, month: str, api_key: str=None, root: str=FIXTURE_ROOT) -> str:
+    """
+    Downloads one month of intraday bars from AlphaVantage and saves the response body as a fixture.  Returns the fixture's path.
+    """
+    import requests
+    params = {"function": "TIME_SERIES_INTRADAY", "symbol": ticker, "interval": interval, "apikey": api_key or os.environ["ALPHA_VANTAGE_API_KEY"],
+              "month": month, "outputsize": "full", "extended_hours": "false"}
+    response = requests.get(ALPHA_VANTAGE_URL, params=params, timeout=60)
+    response.raise_for_status()
+    if f"Time Series ({interval})" not in response.json():
+        raise ValueError(f"AlphaVantage didn't send bars for {ticker} {month}: {response.text[:200]}")
+    path = _fixture_path(ticker, interval, month, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(response.content)
+    return path
+
+
+def alpha_vantage_payload(ticker: str, interval: str, month: str, seed: int=0) -> dict:
+    """
+    A month of synthetic bars laid out like AlphaVantage's TIME_SERIES_INTRADAY JSON (newest first, values as strings).
+    """
+    start = datetime.date.fromisoformat(f"{month}-01")
+    bars = synthetic_bars(start, add_months(start, 1), minutes=int(interval.removesuffix("min")), seed=seed)
+    series = {}
+    for timestamp, row in zip(bars.index[::-1].strftime("%Y-%m-%d %H:%M:%S"), bars.iloc[::-1].itertuples(index=False)):
+        series[timestamp] = {"1. open": f"{row.Open:.4f}", "2. high": f"{row.High:.4f}", "3. low": f"{row.Low:.4f}",
+                             "4. close": f"{row.Close:.4f}", "5. volume": str(row.Volume)}
+    meta = {"1. Information": f"Intraday ({interval}) open, high, low, close prices and volume", "2. Symbol": ticker, "4. Interval": interval,
+            "5. Output Size": "Full size", "6. Time Zone": "US/Eastern"}
+    return {"Meta Data": meta, f"Time Series ({interval})": series}
+
+
+def load_alpha_vantage_fixture(ticker: str, interval: str, month: str, root: str=FIXTURE_ROOT) -> bytes:
+    """
+    Body of the recorded response for a month, or of a synthetic one when none was recorded.
+    """
+    path = _fixture_path(ticker, interval, month, root)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    return json.dumps(alpha_vantage_payload(ticker, interval, month)).encode()
+
+
+class ReplayAlphaVantageServer:
+    """
+    Threaded HTTP server answering AlphaVantage intraday queries from fixtures.  Use as a context manager and pass its url as base_url to
+    the AlphaVantage loaders.
+
+    Inputs:
+    ------
+    root: where the recorded fixtures live
+    latency: seconds every response is delayed by
+    """
+    def __init__(self, root: str=FIXTURE_ROOT, latency: float=0.0):
+        self.root = root
+        self.latency = latency
+        self.requests = []
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = None
+
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/query"
+
+
+    def start(self) -> "ReplayAlphaVantageServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def body(self, ticker: str, interval: str, month: str) -> bytes:
+        """
+        The response body for a month, built once and kept, so repeated runs time the loader rather than the fixture rendering.
+        """
+        key = (ticker.upper(), interval, month)
+        with self._lock:
+            if key not in self._bodies:
+                self._bodies[key] = load_alpha_vantage_fixture(ticker, interval, month, self.root)
+            return self._bodies[key]
+
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                server.requests.append((query.get("symbol"), query.get("month"), time.perf_counter()))
+                if query.get("function") == "TIME_SERIES_INTRADAY" and {"symbol", "interval", "month"} <= query.keys():
+                    code, payload = 200, server.body(query["symbol"], query["interval"], query["month"])
+                else:
+                    code, payload = 400, json.dumps({"Error Message": f"{self.path} isn't replayed."}).encode()
+                time.sleep(server.latency)
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__=="__main__":
+    ticker, interval, first, last = sys.argv[1:5]
+    month = datetime.date.fromisoformat(f"{first}-01")
+    while month <= datetime.date.fromisoformat(f"{last}-01"):
+        print(record_alpha_vantage(ticker, interval, month.strftime("%Y-%m")))
+        month = add_months(month, 1)
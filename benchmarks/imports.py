@@ -0,0 +1,91 @@
+"""
+Import-time tracking for the trading scripts, since on a cold Actions runner the imports ahead of the 9:30 order can take longer than the
+trade itself.
+
+The order path (what morning_trade.py and afternoon_trade.py import) should only need requests on top of the standard library, which is
+all requirements-trade.txt installs.  profile_imports runs a fresh interpreter under python -X importtime for each group of modules and
+reports the cumulative import time, the slowest modules, and any heavy package (pandas, NumPy, yfinance...) that got pulled in.
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports --check    # exits with an error if the order path imports a heavy package
+"""
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+
+# what the trading scripts import, kept in step with trading_scripts/morning_trade.py and afternoon_trade.py
+ORDER_PATH = ["src.schwab.client", "src.schwab.pipeline", "src.logger.logger", "src.storage.database"]
+GROUPS = {
+    "order_path": ORDER_PATH,
+    "daemon": ["src.live.daemon"],
+    "quotes": ["src.stock_data.quotes"],
+}
+HEAVY = ["pandas", "numpy", "yfinance", "pytz", "scipy", "matplotlib", "bokeh"]
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def _import_once(modules: list, python: str) -> list:
+    """
+    One fresh interpreter importing modules, as (self µs, cumulative µs, depth, name) for every module it imported.
+    """
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {', '.join(modules)}"], capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"Importing {modules} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            entries.append((int(match[1]), int(match[2]), len(match[3]) // 2, match[4]))
+    return entries
+
+
+def profile_imports(modules: list, repeats: int=5, python: str=sys.executable, top: int=10) -> dict:
+    """
+    Import times of modules in a fresh interpreter, excluding the interpreter's own start-up (site and what it imports).
+
+    Inputs:
+    ------
+    modules: module names imported together, as a script would
+    repeats: fresh interpreters run, the reported times are medians
+    python: the interpreter to run
+    top: how many of the slowest top-level imports to list
+    """
+    runs = [_import_once(modules, python) for _ in range(repeats)]
+    totals, slowest = [], {}
+    for entries in runs:
+        # the interpreter's start-up ends with site, and of what follows only top-level entries count, as their cumulative times already
+        # include everything they imported
+        start = next((i + 1 for i, (_, _, depth, name) in enumerate(entries) if depth == 0 and name == "site"), 0)
+        roots = [(cumulative, name) for _, cumulative, depth, name in entries[start:] if depth == 0]
+        totals.append(sum(cumulative for cumulative, _ in roots))
+        for cumulative, name in roots:
+            slowest.setdefault(name, []).append(cumulative)
+    imported = {name for _, _, _, name in runs[-1]}
+    heavy = sorted(package for package in HEAVY if package in imported)
+    slowest = sorted(((name, statistics.median(times) / 1000) for name, times in slowest.items()), key=lambda item: -item[1])
+    return {"modules": modules, "total_ms": statistics.median(totals) / 1000, "modules_imported": len(imported), "heavy": heavy,
+            "slowest_ms": dict(slowest[:top]), "repeats": repeats}
+
+
+def bench_imports(repeats: int=5) -> dict:
+    """
+    profile_imports for each group in GROUPS.
+    """
+    return {name: profile_imports(modules, repeats) for name, modules in GROUPS.items()}
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters run per group")
+    parser.add_argument("--check", action="store_true", help="only profile the order path, and fail if it imports a heavy package")
+    args = parser.parse_args()
+    results = {"order_path": profile_imports(ORDER_PATH, args.repeats)} if args.check else bench_imports(args.repeats)
+    for name, result in results.items():
+        print(f"{name}: {result['total_ms']:.1f}ms, {result['modules_imported']} modules, heavy: {', '.join(result['heavy']) or 'none'}")
+        for module, ms in result["slowest_ms"].items():
+            print(f"    {module:<40}{ms:8.1f}ms")
+    if args.check and results["order_path"]["heavy"]:
+        sys.exit(f"The order path imports {', '.join(results['order_path']['heavy'])}, which requirements-trade.txt doesn't install.")
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark of the quote providers in src/stock_data/quotes.py, along with the old yfinance .info lookup they replace.
+
+Schwab is benchmarked against the local mock server (with latency seconds of simulated network delay), the yfinance providers hit Yahoo
+for real and are reported as failed when there's no connection.
+
+    python -m benchmarks.quote_providers
+"""
+import os
+import time
+import argparse
+import statistics
+
+from src.schwab.client import SchwabClient
+from src.schwab.mock_server import MockSchwabServer
+from src.stock_data.quotes import QuoteProvider, YFinanceQuoteProvider, SchwabQuoteProvider, CachedQuoteProvider
+
+
+class YFinanceInfoProvider(QuoteProvider):
+    """
+    The lookup get_current_price used to do, kept here as the baseline.
+    """
+    name = "yfinance .info"
+
+    def last_price(self, ticker: str="TQQQ") -> float:
+        import yfinance as yf
+        return float(yf.Ticker(ticker).info["currentPrice"])
+
+
+def time_provider(provider: QuoteProvider, ticker: str, runs: int) -> dict:
+    """
+    Median, 95th percentile and min milliseconds per last_price call.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        provider.last_price(ticker)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"median_ms": round(statistics.median(times), 3), "p95_ms": round(times[int(0.95 * (len(times) - 1))], 3),
+            "min_ms": round(times[0], 3)}
+
+
+def benchmark(ticker: str="TQQQ", runs: int=20, latency: float=0.02, include_yfinance: bool=True) -> dict:
+    os.environ.setdefault("SCHWAB_APP_KEY", "mock")
+    os.environ.setdefault("SCHWAB_APP_SECRET", "mock")
+    os.environ.setdefault("SCHWAB_REFRESH_TOKEN", "mock")
+    results = {}
+    with MockSchwabServer(prices={ticker: 75.0}, latency=latency) as server:
+        client = SchwabClient(**server.client_kwargs())
+        client.refresh_access_token()
+        providers = [SchwabQuoteProvider(client), CachedQuoteProvider(SchwabQuoteProvider(client), ttl=60)]
+        if include_yfinance:
+            providers = [YFinanceInfoProvider(), YFinanceQuoteProvider(), CachedQuoteProvider(YFinanceQuoteProvider(), ttl=60)] + providers
+        for provider in providers:
+            try:
+                results[provider.name] = time_provider(provider, ticker, runs)
+            except Exception as e:
+                results[provider.name] = {"error": repr(e)}
+        client.close()
+    return results
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticker", default="TQQQ")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated network delay of the mock Schwab server, in seconds")
+    parser.add_argument("--no-yfinance", action="store_true", help="skip the providers that need a connection to Yahoo")
+    args = parser.parse_args()
+    for name, result in benchmark(args.ticker, args.runs, args.latency, not args.no_yfinance).items():
+        print(f"{name:>20}: {result}")
@@ -0,0 +1,229 @@
+"""
+Repeatable benchmark suite for the data, execution and order layers, run entirely offline on synthetic bars (synthetic.py), replayed
+provider responses (fixtures.py) and the mock Schwab server.
+
+- loaders: reading a year of minute bars from the old per-ticker CSV, the Parquet bar store and a memory-mapped bar array, parsing an
+  AlphaVantage month, and loading through the AlphaVantage loader cold (fetch, parse, store) and warm (store only)
+- engines: backtesting.py's event-driven engine against vectorized.run_vectorized on 1 month, 1 year and 10 years of minute bars
+- order_path: the morning entry pipeline and the quote providers end to end against the mock Schwab server
+- imports: import times of the trading scripts' modules in a fresh interpreter (imports.py)
+
+Every run writes a JSON file to benchmarks/results (with the commit and library versions it ran on), and --compare lines up two of them
+to show what a change to the data or execution layers did.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only engines --sizes 1M 1Y
+    python -m benchmarks.suite --compare benchmarks/results/BEFORE.json benchmarks/results/AFTER.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import tempfile
+import contextlib
+import statistics
+import subprocess
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_bars, add_months
+from benchmarks.fixtures import ReplayAlphaVantageServer
+from benchmarks.imports import bench_imports
+
+# the backtest modules import each other with backtest/ on the path, same as when they're run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backtest"))
+
+
+RESULTS_ROOT = os.path.join("benchmarks", "results")
+SIZES = {"1M": 1, "1Y": 12, "10Y": 120}
+START = datetime.date(2014, 1, 1)
+BENCHMARKS = ["loaders", "engines", "order_path", "imports"]
+
+
+def _timed(function, repeats: int) -> dict:
+    """
+    Calls function repeats times, returning the median and fastest wall time in seconds.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(times), "min_s": min(times), "repeats": repeats}
+
+
+@contextlib.contextmanager
+def _working_directory(path: str):
+    # the loaders keep their store under a relative path, so running them from a scratch directory keeps the real store untouched
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def bench_loaders(months: int=12, repeats: int=5, fetch_months: int=2) -> dict:
+    """
+    Load times of months of synthetic minute bars from each on-disk format, plus the AlphaVantage loader against replayed responses.
+
+    The cold AlphaVantage load includes the loader's own rate limiting (75 requests a minute), which is why it only covers fetch_months.
+    """
+    from bar_store import SCHEMA, write_bars, read_bars
+    from bar_array import write_bar_array, open_bar_array, time_slice, to_frame
+    from data_loaders import load_data_from_alpha_vantage, _alpha_vantage_chunk
+    end = add_months(START, months)
+    bars = synthetic_bars(START, end)
+    results = {"bars": len(bars), "months": months}
+    with tempfile.TemporaryDirectory() as scratch:
+        csv_path = os.path.join(scratch, "SYN_data.csv")
+        bars.to_csv(csv_path)
+
+        def read_csv():
+            # what the loaders and orchestrator did before the bar store
+            data = pd.read_csv(csv_path, parse_dates=True, index_col="Datetime").astype(dtype=SCHEMA)
+            data.index = pd.to_datetime(data.index)
+            return data
+
+        store_root, array_root = os.path.join(scratch, "store"), os.path.join(scratch, "arrays")
+        write_bars(bars, "SYN", "1m", root=store_root)
+        array_path = write_bar_array(bars, "SYN", "1m", root=array_root)
+        results["csv"] = {**_timed(read_csv, repeats), "mb": os.path.getsize(csv_path) / 2**20}
+        store_mb = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(store_root) for f in files) / 2**20
+        results["store"] = {**_timed(lambda: read_bars("SYN", "1m", START, end, root=store_root), repeats), "mb": store_mb}
+        # to_frame copies the index, so this is a real load rather than just mapping the file
+        results["bar_array"] = {**_timed(lambda: to_frame(time_slice(open_bar_array("SYN", "1m", root=array_root), START, end)), repeats),
+                                "mb": os.path.getsize(array_path) / 2**20}
+
+        os.environ.setdefault("ALPHA_VANTAGE_API_KEY", "benchmark")
+        fetch_end = add_months(START, fetch_months)
+        with ReplayAlphaVantageServer() as server:
+            raw = json.loads(server.body("SYN", "1min", START.strftime("%Y-%m")))["Time Series (1min)"]
+            results["alpha_vantage_parse_month"] = _timed(lambda: _alpha_vantage_chunk(pd.DataFrame(raw), START), repeats)
+            with _working_directory(scratch):
+                results["alpha_vantage_cold"] = {**_timed(lambda: load_data_from_alpha_vantage("SYN", "1min", START, fetch_end, base_url=server.url), 1),
+                                                 "months": fetch_months}
+                results["alpha_vantage_warm"] = {**_timed(lambda: load_data_from_alpha_vantage("SYN", "1min", START, fetch_end, base_url=server.url), repeats),
+                                                 "months": fetch_months}
+    return results
+
+
+def bench_engines(sizes: list=None, repeats: int=3) -> dict:
+    """
+    Event-driven against vectorized backtests of VolatilityLongStrategy on each size of synthetic minute history ("1M", "1Y", "10Y").
+    """
+    import backtesting
+    from vectorized import run_vectorized
+    from models.VolatilityLongStrategy import VolatilityLongStrategy
+    results = {}
+    for size in sizes or list(SIZES):
+        bars = synthetic_bars(START, add_months(START, SIZES[size]))
+        stats = {}
+
+        def event():
+            stats["event"] = backtesting.Backtest(data=bars, strategy=VolatilityLongStrategy, exclusive_orders=True).run()
+
+        def vectorized():
+            stats["vectorized"] = run_vectorized(bars, VolatilityLongStrategy)
+
+        entry = {"bars": len(bars)}
+        for engine, function in [("vectorized", vectorized), ("event", event)]:
+            timing = _timed(function, repeats)
+            entry[engine] = {**timing, "bars_per_s": len(bars) / timing["min_s"], "trades": int(stats[engine]["# Trades"]),
+                             "return_pct": float(stats[engine]["Return [%]"])}
+        entry["speedup"] = entry["event"]["min_s"] / entry["vectorized"]["min_s"]
+        # a speedup only counts if both engines still make the same trades
+        entry["same_trades"] = bool(entry["event"]["trades"] == entry["vectorized"]["trades"]
+                                   and np.isclose(entry["event"]["return_pct"], entry["vectorized"]["return_pct"]))
+        results[size] = entry
+        print(f"{size}: {len(bars)} bars, event {entry['event']['min_s']:.2f}s, vectorized {entry['vectorized']['min_s']:.4f}s")
+    return results
+
+
+def bench_order_path(runs: int=20, latency: float=0.02, fill_delay: float=0.05) -> dict:
+    """
+    Milliseconds to each stage of the morning entry against the mock Schwab server, and the quote providers' latencies against it.
+    """
+    from src.schwab.mock_server import benchmark_entry_pipeline
+    from benchmarks.quote_providers import benchmark as benchmark_quotes
+    pipeline = {f"{stage}_ms": ms for stage, ms in benchmark_entry_pipeline(runs, latency, fill_delay).items()}
+    quotes = benchmark_quotes(runs=runs, latency=latency, include_yfinance=False)
+    return {"latency_ms": latency * 1000, "fill_delay_ms": fill_delay * 1000, "runs": runs, "entry_pipeline": pipeline, "quotes": quotes}
+
+
+def _environment() -> dict:
+    import backtesting
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"created": datetime.datetime.now().isoformat(timespec="seconds"), "commit": commit, "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "numpy": np.__version__, "pandas": pd.__version__,
+            "backtesting": backtesting.__version__}
+
+
+def run_suite(only: list=None, sizes: list=None, repeats: int=5, order_runs: int=20, results_root: str=RESULTS_ROOT) -> str:
+    """
+    Runs the chosen benchmarks (all of them by default) and writes the results as JSON.  Returns the file's path.
+    """
+    results = {"environment": _environment()}
+    for name in only or BENCHMARKS:
+        print(f"Running {name}...")
+        if name == "loaders":
+            results[name] = bench_loaders(repeats=repeats)
+        elif name == "engines":
+            results[name] = bench_engines(sizes, repeats=repeats)
+        elif name == "order_path":
+            results[name] = bench_order_path(runs=order_runs)
+        elif name == "imports":
+            results[name] = bench_imports(repeats=repeats)
+        else:
+            raise ValueError(f"Unknown benchmark {name!r}, should be one of {BENCHMARKS}.")
+    os.makedirs(results_root, exist_ok=True)
+    path = os.path.join(results_root, f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{results['environment']['commit'] or 'nogit'}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def _flatten(results: dict, prefix: str="") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare_results(before: str, after: str) -> pd.DataFrame:
+    """
+    Every number two result files have in common side by side, with the change in percent.
+    """
+    flats = []
+    for path in [before, after]:
+        with open(path) as f:
+            results = json.load(f)
+        results.pop("environment", None)
+        flats.append(_flatten(results))
+    comparison = pd.DataFrame(flats, index=["before", "after"]).transpose().dropna()
+    comparison["change [%]"] = (comparison["after"] / comparison["before"] - 1) * 100
+    return comparison
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="benchmarks to run, all of them by default")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), help="history lengths for the engine benchmark, all of them by default")
+    parser.add_argument("--repeats", type=int, default=5, help="timed repeats of each load and backtest")
+    parser.add_argument("--order-runs", type=int, default=20, help="runs of the entry pipeline and of each quote provider")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files instead of running anything")
+    args = parser.parse_args()
+    if args.compare:
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(compare_results(*args.compare))
+    else:
+        print(f"Results written to {run_suite(args.only, args.sizes, args.repeats, args.order_runs)}")
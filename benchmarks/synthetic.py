@@ -0,0 +1,72 @@
+"""
+Synthetic minute bars for the benchmarks: a seeded random walk laid out over real NYSE sessions (regular hours only, half-days closing at
+13:00), so any length of history can be generated offline and the same seed always gives the same bars.
+
+    python -m benchmarks.synthetic 2024-01-01 2025-01-01
+"""
+import sys
+import datetime
+import numpy as np
+import pandas as pd
+
+from src.market_calendar.nyse import get_calendar
+
+
+SCHEMA = {"Open": "float64", "High": "float64", "Low": "float64", "Close": "float64", "Volume": "int64"}
+
+
+def session_timestamps(start_date: datetime.date, end_date: datetime.date, minutes: int=1) -> np.ndarray:
+    """
+    Nanosecond timestamps (US/Eastern wall-clock time, like the bar store's index) of every minutes-wide bar of the sessions in [start_date, end_date).
+    """
+    calendar = get_calendar()
+    first, last = np.searchsorted(calendar.dates, [np.datetime64(start_date, "D"), np.datetime64(end_date, "D")])
+    opens, closes = calendar.open_ns[first:last], calendar.close_ns[first:last]
+    step = minutes * 60 * 10**9
+    counts = (closes - opens) // step
+    # position of each bar within its session
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(opens, counts) + offsets * step
+
+
+def synthetic_bars(start_date: datetime.date, end_date: datetime.date, minutes: int=1, start_price: float=50.0, daily_volatility: float=0.03,
+                   seed: int=0) -> pd.DataFrame:
+    """
+    Bars in the bar store's layout (Datetime index, typed OHLCV columns) for every session in [start_date, end_date).
+
+    Closes follow a geometric random walk scaled so a session moves by about daily_volatility, each bar opens at the previous close (with an
+    overnight gap on the first bar of a session), and highs/lows poke out past the body by a fraction of a bar's move.
+    """
+    timestamps = session_timestamps(start_date, end_date, minutes)
+    rng = np.random.default_rng(seed)
+    n = len(timestamps)
+    bar_volatility = daily_volatility / np.sqrt(390 / minutes)
+    moves = rng.standard_normal(n) * bar_volatility
+    new_session = np.ones(n, dtype=bool)
+    new_session[1:] = (timestamps[1:] - timestamps[:-1]) > minutes * 60 * 10**9
+    gaps = np.where(new_session, rng.standard_normal(n) * daily_volatility / 3, 0.0)
+    close = start_price * np.exp(np.cumsum(moves + gaps))
+    open_ = np.empty(n)
+    open_[0] = start_price
+    open_[1:] = close[:-1] * np.exp(gaps[1:])
+    wicks = np.abs(rng.standard_normal((2, n))) * bar_volatility / 2
+    high = np.maximum(open_, close) * (1 + wicks[0])
+    low = np.minimum(open_, close) * (1 - wicks[1])
+    volume = rng.integers(1_000, 100_000, n)
+    index = pd.DatetimeIndex(timestamps.view("datetime64[ns]"), name="Datetime")
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index).astype(SCHEMA)
+
+
+def add_months(date: datetime.date, months: int) -> datetime.date:
+    """
+    First day of the month months after date's month, for building 1 month / 1 year / 10 year ranges.
+    """
+    month = date.month - 1 + months
+    return datetime.date(date.year + month // 12, month % 12 + 1, 1)
+
+
+if __name__=="__main__":
+    start, end = (datetime.date.fromisoformat(d) for d in sys.argv[1:3])
+    bars = synthetic_bars(start, end)
+    print(bars)
+    print(f"{len(bars)} bars, {bars.memory_usage(index=True).sum() / 2**20:.1f} MB")
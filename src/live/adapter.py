@@ -0,0 +1,351 @@
+"""
+Runs a backtesting.Strategy subclass live, unchanged: the same class that goes through backtesting.Backtest (or vectorized.py) offline gets
+its init() and next() called here on bars built from a quote source, and its buy()/sell()/position.close() calls become Schwab orders.
+
+- RingBarData (data.py) stands in for the strategy's data, so every bar costs O(1) however long the session runs
+- LiveBroker stands in for backtesting.py's broker: a buy() becomes a market order through the SchwabClient (order.py's order bodies over
+  its warm session), a buy(sl=..., tp=...) is bracketed with an OCO order around the actual fill like the morning pipeline does, and
+  position.close() cancels the bracket and sells at market
+- LiveRunner drives one session on a single asyncio event loop: wait for a bar, next(), send whatever orders next() made, repeat
+
+Strategies can only go long (order.py only knows BUY and SELL), market entries only, and self.I() indicators aren't supported (they'd
+only ever see the warm-up bars, streaming indicators updated in next() work instead); anything else raises as soon as the strategy tries it.
+
+    asyncio.run(run_session(VolatilityLongStrategy, client, "TQQQ"))
+"""
+import time
+import asyncio
+import logging
+import datetime
+import numpy as np
+import pandas as pd
+
+from src.live.data import RingBarData
+from src.schwab.client import SchwabClient
+from src.schwab.pipeline import order_id_from_response, wait_for_fill
+from src.market_calendar.nyse import get_calendar, market_now
+from src.stock_data.quotes import QuoteProvider, SchwabQuoteProvider, previous_close
+
+
+logger = logging.getLogger(__name__)
+
+class LivePosition:
+    """
+    The account's position in the runner's ticker, with the parts of backtesting.Position strategies use.
+    """
+    def __init__(self, broker: "LiveBroker"):
+        self._broker = broker
+
+    def __bool__(self):
+        return self.size != 0
+
+    @property
+    def size(self) -> float:
+        return self._broker.position_size
+
+    @property
+    def pl(self) -> float:
+        if not self.size:
+            return 0.0
+        return self.size * (self._broker.data.Close[-1] - self._broker.entry_price)
+
+    @property
+    def pl_pct(self) -> float:
+        if not self.size:
+            return 0.0
+        return (self._broker.data.Close[-1] / self._broker.entry_price - 1) * 100 * np.sign(self.size)
+
+    @property
+    def is_long(self) -> bool:
+        return self.size > 0
+
+    @property
+    def is_short(self) -> bool:
+        return self.size < 0
+
+    def close(self, portion: float=1.) -> None:
+        self._broker.close_position(portion)
+
+    def __repr__(self):
+        return f"<LivePosition: {self.size}>"
+
+
+class LiveBroker:
+    """
+    What a strategy's orders go through when it runs live.  next() only queues orders, execute() sends them once next() has returned.
+
+    Inputs:
+    ------
+    client: the SchwabClient to trade through
+    ticker: what the strategy trades
+    data: the run's RingBarData, for the last price
+    exclusive_orders: like Backtest(exclusive_orders=True), a new entry closes the open position first
+    stop_limit_offset: how far below an sl the OCO's stop leg sells at the lowest
+    fill_timeout: seconds to wait for a market order to fill
+    poll_interval: seconds between fill checks
+    """
+    def __init__(self, client: SchwabClient, ticker: str, data: RingBarData, exclusive_orders: bool=True, stop_limit_offset: float=0.01,
+                 fill_timeout: float=5.0, poll_interval: float=0.1):
+        self.client = client
+        self.ticker = ticker
+        self.data = data
+        self.exclusive_orders = exclusive_orders
+        self.stop_limit_offset = stop_limit_offset
+        self.fill_timeout = fill_timeout
+        self.poll_interval = poll_interval
+        self.cash = 0.0
+        self.position_size = 0.0
+        self.entry_price = None
+        self.bracket_id = None
+        self.orders = []
+        self.trades = []
+        self.closed_trades = []
+        self.fills = []
+        self.position = LivePosition(self)
+
+
+    @property
+    def equity(self) -> float:
+        return self.cash + self.position_size * (self.data.Close[-1] if len(self.data) else self.entry_price or 0)
+
+
+    def new_order(self, size: float, limit: float=None, stop: float=None, sl: float=None, tp: float=None, tag=None, *, trade=None) -> dict:
+        """
+        Called by Strategy.buy()/sell().  size is a fraction of equity below 1, otherwise a number of shares, negative for sell().
+        """
+        if size < 0:
+            raise NotImplementedError("Opening short positions isn't supported live, order.py only places BUY and SELL orders.  Close longs with position.close().")
+        if limit is not None or stop is not None:
+            raise NotImplementedError("Only market entries are supported live.")
+        if (sl is None) != (tp is None):
+            raise NotImplementedError("Live brackets are OCO orders, so sl and tp have to be given together.")
+        order = {"kind": "entry", "size": size, "sl": sl, "tp": tp, "tag": tag}
+        self.orders.append(order)
+        return order
+
+
+    def close_position(self, portion: float=1.) -> None:
+        self.orders.append({"kind": "close", "portion": portion})
+
+
+    async def sync(self) -> None:
+        """
+        Reads cash and the position back from the account, which is how exits made by an OCO bracket at Schwab show up.
+        """
+        acct = await asyncio.to_thread(self.client.get_account_positions)
+        self.cash = acct["liquidity"]
+        size = acct["positions"].get(self.ticker, {}).get("quantity", 0)
+        if self.position_size and not size:
+            logger.info("Position in %s was closed at Schwab.", self.ticker)
+            self._settle(exit_price=None)
+            self.bracket_id = None
+        self.position_size = size
+
+
+    async def _market(self, quantity: int, instruction: str) -> tuple:
+        response = await asyncio.to_thread(self.client.place_market_order, quantity, instruction, self.ticker)
+        order_id = order_id_from_response(response)
+        quantity, price = await wait_for_fill(self.client, order_id, timeout=self.fill_timeout, poll_interval=self.poll_interval)
+        self.fills.append({"order_id": order_id, "instruction": instruction, "quantity": quantity, "price": price,
+                           "bar": self.data.schedule[len(self.data) - 1]})
+        return quantity, price
+
+
+    def _settle(self, exit_price: float) -> None:
+        if self.trades:
+            trade = self.trades.pop()
+            self.closed_trades.append({**trade, "exit_price": exit_price, "exit_bar": self.data.schedule[len(self.data) - 1]})
+
+
+    async def _close(self, portion: float) -> None:
+        if not self.position_size:
+            return
+        if self.bracket_id is not None:
+            cancel = await asyncio.to_thread(self.client.cancel_order, self.bracket_id)
+            if not cancel.ok:
+                # i.e. the bracket filled since the last sync(), the account says what's still held
+                logger.warning("Canceling bracket %s failed with %s, syncing with the account.", self.bracket_id, cancel.status_code)
+                await self.sync()
+            self.bracket_id = None
+            if not self.position_size:
+                return
+        quantity = max(1, int(round(self.position_size * portion)))
+        filled, price = await self._market(quantity, "SELL")
+        self.cash += filled * price
+        self.position_size -= filled
+        if not self.position_size:
+            self._settle(price)
+            self.entry_price = None
+
+
+    async def _enter(self, order: dict) -> None:
+        if self.exclusive_orders:
+            await self._close(1.)
+        price = self.data.Close[-1]
+        quantity = int(self.equity * order["size"] // price) if order["size"] < 1 else int(order["size"])
+        if quantity < 1:
+            logger.warning("Equity of %s can't buy a share of %s at %s.", self.equity, self.ticker, price)
+            return
+        filled, fill_price = await self._market(quantity, "BUY")
+        self.cash -= filled * fill_price
+        self.position_size += filled
+        self.entry_price = fill_price
+        self.trades.append({"size": filled, "entry_price": fill_price, "entry_bar": self.data.schedule[len(self.data) - 1], "tag": order["tag"]})
+        if order["tp"] is not None:
+            response = await asyncio.to_thread(self.client.place_oco_order, quantity=int(filled), limit_price=round(order["tp"], 2),
+                                               stop_limit_price=round(order["sl"], 2), stop_price=round(order["sl"] - self.stop_limit_offset, 2),
+                                               ticker=self.ticker)
+            self.bracket_id = order_id_from_response(response)
+
+
+    async def execute(self) -> None:
+        """
+        Sends the orders queued by the last next(), in the order they were made.
+        """
+        orders, self.orders = self.orders, []
+        for order in orders:
+            if order["kind"] == "close":
+                await self._close(order["portion"])
+            else:
+                await self._enter(order)
+
+
+def session_schedule(session: datetime.date, minutes: int=1) -> pd.DatetimeIndex:
+    """
+    Start times of every bar of a session (US/Eastern wall-clock time, timezone-naive like the bar store's index).
+    """
+    calendar = get_calendar()
+    return pd.date_range(calendar.session_open(session), calendar.session_close(session), freq=f"{minutes}min", inclusive="left",
+                         name="Datetime").as_unit("ns")
+
+
+async def quote_bars(provider: QuoteProvider, ticker: str, schedule: pd.DatetimeIndex, poll_interval: float=1.0):
+    """
+    Builds bars from a quote source in real time: polls provider every poll_interval seconds during each scheduled bar and yields
+    (bar start, open, high, low, close, volume) once the bar is over.  Quotes carry no volume, so it's 0.  Bars already over when this starts
+    are skipped.
+    """
+    width = schedule[1] - schedule[0] if len(schedule) > 1 else pd.Timedelta(minutes=1)
+    for start in schedule:
+        end = start + width
+        if market_now() >= end:
+            continue
+        await asyncio.sleep(max(0.0, (start - market_now()).total_seconds()))
+        prices = []
+        while True:
+            prices.append(await asyncio.to_thread(provider.last_price, ticker))
+            remaining = (end - market_now()).total_seconds()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(poll_interval, remaining))
+        yield start, prices[0], max(prices), min(prices), prices[-1], 0
+
+
+async def frame_bars(frame: pd.DataFrame):
+    """
+    Yields a frame's bars one after another without waiting, to dry-run a strategy through the live path (e.g. against the mock server).
+    """
+    for row in frame.itertuples():
+        yield row.Index, row.Open, row.High, row.Low, row.Close, row.Volume
+
+
+def _indicators_unsupported(*args, **kwargs):
+    raise NotImplementedError("self.I() indicators aren't updated live, keep one of backtest/indicators.py's streaming classes "
+                              "(i.e. stream(\"sma\", n=20)) on the strategy and update it in next() instead.")
+
+
+class LiveRunner:
+    """
+    Runs a strategy class on one stream of bars.
+
+    Inputs:
+    ------
+    model: the backtesting.Strategy subclass, exactly as backtested
+    client: the SchwabClient orders go through
+    ticker: what the strategy trades
+    capacity: bars the strategy can look back over
+    broker_kwargs: passed on to LiveBroker (exclusive_orders, stop_limit_offset, fill_timeout, poll_interval)
+    params: strategy parameters, as for Backtest.run
+    """
+    def __init__(self, model, client: SchwabClient, ticker: str="TQQQ", capacity: int=1024, broker_kwargs: dict=None, **params):
+        self.model = model
+        self.client = client
+        self.ticker = ticker
+        self.capacity = capacity
+        self.broker_kwargs = broker_kwargs or {}
+        self.params = params
+
+
+    async def run(self, bars, schedule: pd.DatetimeIndex, warm_up: pd.DataFrame=None) -> LiveBroker:
+        """
+        Feeds bars (an async iterator like quote_bars or frame_bars) to the strategy.  schedule is every bar timestamp bars can produce and
+        warm_up the bars before them (e.g. the previous session's), which next() can look back on but isn't called for.  Returns the broker,
+        whose fills, trades and closed_trades record what happened.
+        """
+        warm_up = warm_up if warm_up is not None else pd.DataFrame({"Open": [], "High": [], "Low": [], "Close": [], "Volume": []}, index=schedule[:0])
+        data = RingBarData(warm_up.index.append(schedule), self.capacity)
+        for row in warm_up.itertuples():
+            data.append(row.Open, row.High, row.Low, row.Close, row.Volume)
+        broker = LiveBroker(self.client, self.ticker, data, **self.broker_kwargs)
+        await broker.sync()
+        strategy = self.model(broker, data, self.params)
+        # Strategy.I would compute an indicator once over the warm-up bars and never again, so next() would trade on stale values
+        strategy.I = _indicators_unsupported
+        data.initializing = True
+        strategy.init()
+        data.initializing = False
+        position = {ts: i for i, ts in enumerate(data.schedule.asi8)}
+        async for timestamp, open_, high, low, close, volume in bars:
+            expected = data.schedule[len(data)] if len(data) < len(data.schedule) else None
+            if timestamp != expected:
+                # a bar was skipped (e.g. the feed started late): fill the gap with flat bars so bar numbers keep matching the schedule
+                missing = position.get(pd.Timestamp(timestamp).value, len(data.schedule)) - len(data)
+                if missing < 0 or len(data) + missing >= len(data.schedule):
+                    logger.warning("Bar at %s isn't next in the schedule, skipping it.", timestamp)
+                    continue
+                last = data.Close[-1] if len(data) else open_
+                for _ in range(missing):
+                    data.append(last, last, last, last, 0)
+            data.append(open_, high, low, close, volume)
+            if broker.bracket_id is not None:
+                await broker.sync()
+            start = time.perf_counter()
+            strategy.next()
+            decided = time.perf_counter()
+            if broker.orders:
+                await broker.execute()
+                logger.info("Orders for the %s bar sent.", timestamp, extra={"event": "live_bar", "bar": str(timestamp),
+                            "next_us": round((decided - start) * 1e6, 1), "orders_ms": round((time.perf_counter() - decided) * 1000, 3)})
+        return broker
+
+
+def warm_up_bars(ticker: str, session: datetime.date, minutes: int=1) -> pd.DataFrame:
+    """
+    The previous session's stored bars (see src/storage/database.py), or when there are none a single bar at its previous close.
+    """
+    from src.storage.database import connect, read_bars
+    previous = get_calendar().previous_session(session)
+    conn = connect()
+    try:
+        bars = read_bars(conn, ticker, f"{minutes}m", datetime.datetime.combine(previous, datetime.time()), get_calendar().session_close(previous))
+    finally:
+        conn.close()
+    if len(bars):
+        return bars
+    close = previous_close(ticker, session)
+    index = pd.DatetimeIndex([get_calendar().session_close(previous) - pd.Timedelta(minutes=minutes)], name="Datetime").as_unit("ns")
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 0}, index=index)
+
+
+async def run_session(model, client: SchwabClient, ticker: str="TQQQ", provider: QuoteProvider=None, session: datetime.date=None,
+                      poll_interval: float=1.0, **params) -> LiveBroker:
+    """
+    Runs a strategy through today's (or session's) regular hours on minute bars built from provider's quotes (Schwab's through client by
+    default), warmed up on the previous session.
+    """
+    session = session or datetime.date.today()
+    if not get_calendar().is_session(session):
+        raise ValueError(f"{session} isn't a trading session.")
+    schedule = session_schedule(session)
+    bars = quote_bars(provider or SchwabQuoteProvider(client), ticker, schedule, poll_interval=poll_interval)
+    return await LiveRunner(model, client, ticker, **params).run(bars, schedule, warm_up_bars(ticker, session))
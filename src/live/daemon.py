@@ -0,0 +1,309 @@
+"""
+Long-running trading daemon, the single process replacing the separate morning and afternoon workflow runs.
+
+One SchwabClient is created at start and kept for the whole run, so its session keeps the connection to Schwab open and its token is
+refreshed ahead of expiry instead of on the order path.  On every trading session (from the calendar, half-days included) it:
+- enters at the open (entry_delay after it) through the entry pipeline: buy, wait for the fill, OCO bracket around the fill
+- polls positions and today's orders every poll_interval seconds, upserting the orders into trading_data.sqlite
+- while holding, checks the quote every quote_interval seconds and sells at market if the price has gone through the bracket's stop leg
+  without it filling (the stop leg is a stop-limit, which a gap can jump straight past)
+- exits whatever is left exit_lead before the close, cancelling the bracket first
+- records the day's fills, orders and P&L after the close
+
+What's been done each session is kept in the daemon_state table, written before and after every action, so a restarted daemon neither
+repeats an entry it already placed nor forgets a position it's guarding.
+
+    python -m src.live.daemon --ticker TQQQ
+"""
+import os
+import asyncio
+import logging
+import argparse
+import datetime
+import signal
+
+from src.schwab.client import SchwabClient
+from src.schwab.pipeline import run_entry_pipeline, order_id_from_response, wait_for_fill, fill_from_order
+from src.market_calendar.nyse import get_calendar, market_now
+from src.stock_data.quotes import SchwabQuoteProvider
+from src.storage.database import DB_PATH, connect, upsert_orders, upsert_fills, record_daily_pnl, get_state, put_state
+
+
+logger = logging.getLogger(__name__)
+
+# order statuses that can still fill, and so have to be cancelled before selling out
+OPEN_STATUSES = {"WORKING", "QUEUED", "ACCEPTED", "PENDING_ACTIVATION", "AWAITING_PARENT_ORDER", "AWAITING_CONDITION", "AWAITING_STOP_CONDITION"}
+ACTIONS = ["entry", "exit", "record"]
+
+
+def _flatten_orders(orders: list) -> list:
+    # OCO children come both nested in their parent and on their own, so they're deduplicated by order id
+    flat, stack = {}, list(orders)
+    while stack:
+        order = stack.pop()
+        stack.extend(order.get("childOrderStrategies", []))
+        flat.setdefault(str(order.get("orderId")), order)
+    return list(flat.values())
+
+
+def _symbol(order: dict) -> str:
+    legs = order.get("orderLegCollection") or [{}]
+    return legs[0].get("instrument", {}).get("symbol")
+
+
+class TradingDaemon:
+    """
+    Trades one ticker on every session until stopped.
+
+    Inputs:
+    ------
+    client: the SchwabClient kept warm for the whole run
+    ticker: what to trade
+    db_path: trading database, for orders, fills, P&L and the daemon's own state
+    poll_interval: seconds between position/order polls (and between checks for due actions)
+    quote_interval: seconds between quote checks while holding
+    entry_delay, exit_lead, record_delay: when the actions run, relative to the open, before the close and after the close
+    max_entry_delay: an entry that couldn't run within this long of its time (e.g. the daemon was down) is skipped rather than made late
+    profit_capture_percent, loss_aversion_percent: the OCO bracket around the fill, as in run_entry_pipeline
+    get_quote: function ticker -> last price, defaults to Schwab's quotes through client
+    clock: function returning the current US/Eastern wall-clock time, replaceable to run a session faster than real time against the mock server
+    """
+    def __init__(self, client: SchwabClient, ticker: str="TQQQ", db_path: str=DB_PATH, poll_interval: float=5.0, quote_interval: float=1.0,
+                 entry_delay: datetime.timedelta=datetime.timedelta(0), exit_lead: datetime.timedelta=datetime.timedelta(minutes=5),
+                 record_delay: datetime.timedelta=datetime.timedelta(minutes=5), max_entry_delay: datetime.timedelta=datetime.timedelta(minutes=5),
+                 profit_capture_percent: float=0.025, loss_aversion_percent: float=0.01, get_quote=None, clock=market_now):
+        self.client = client
+        self.ticker = ticker
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.quote_interval = quote_interval
+        self.entry_delay = entry_delay
+        self.exit_lead = exit_lead
+        self.record_delay = record_delay
+        self.max_entry_delay = max_entry_delay
+        self.profit_capture_percent = profit_capture_percent
+        self.loss_aversion_percent = loss_aversion_percent
+        self.get_quote = get_quote or SchwabQuoteProvider(client)
+        self.clock = clock
+        self.conn = None
+        self.state = None
+        # held while orders are going out, so the guard and a scheduled exit never both sell
+        self._trading = asyncio.Lock()
+
+
+    def schedule(self, session: datetime.date) -> dict:
+        """
+        When each action is due on a session.
+        """
+        calendar = get_calendar()
+        open_, close = calendar.session_open(session), calendar.session_close(session)
+        return {"entry": open_ + self.entry_delay, "exit": close - self.exit_lead, "record": close + self.record_delay}
+
+
+    def _load(self, session: datetime.date) -> dict:
+        if self.state is None or self.state["session"] != session.isoformat():
+            self.state = get_state(self.conn, f"session:{session.isoformat()}", {"session": session.isoformat(), "done": {}, "position": 0})
+            if self.state["done"]:
+                logger.info("Resuming session %s with %s already done.", session, sorted(self.state["done"]), extra={"event": "resume", "state": self.state})
+        return self.state
+
+
+    def _save(self) -> None:
+        put_state(self.conn, f"session:{self.state['session']}", self.state)
+
+
+    def _done(self, action: str, **details) -> None:
+        self.state["done"][action] = {"at": self.clock().isoformat(), **details}
+        self._save()
+
+
+    async def _call(self, function, *args, **kwargs):
+        return await asyncio.to_thread(function, *args, **kwargs)
+
+
+    async def _orders_today(self) -> list:
+        response = await self._call(self.client.get_orders_from_today)
+        response.raise_for_status()
+        return response.json()
+
+
+    async def _recover_entry(self) -> dict:
+        """
+        The entry's fill, read back from today's orders after a crash between placing it and recording it.
+        """
+        for order in _flatten_orders(await self._orders_today()):
+            legs = order.get("orderLegCollection") or [{}]
+            if order.get("orderType") == "MARKET" and legs[0].get("instruction") == "BUY" and _symbol(order) == self.ticker:
+                quantity, price = fill_from_order(order)
+                if price is not None:
+                    loss_stop_price = round(price * (1 - self.loss_aversion_percent), 2)
+                    return {"entry_order_id": str(order.get("orderId")), "quantity": quantity, "fill_price": price,
+                            "loss_stop_price": loss_stop_price, "loss_price": round(loss_stop_price - 0.01, 2), "recovered": True}
+        return {"quantity": 0, "recovered": True}
+
+
+    async def enter(self) -> dict:
+        if self.state.get("entry_started"):
+            # placed before a crash, don't buy twice
+            result = await self._recover_entry()
+            logger.warning("Entry was already started before a restart, recovered %s.", result, extra={"event": "entry_recovered"})
+            return result
+        self.state["entry_started"] = self.clock().isoformat()
+        self._save()
+        async with self._trading:
+            result = await run_entry_pipeline(self.client, ticker=self.ticker, profit_capture_percent=self.profit_capture_percent,
+                                              loss_aversion_percent=self.loss_aversion_percent, get_quote=self.get_quote)
+        self.state["position"] = result["quantity"]
+        return result
+
+
+    async def exit_position(self, reason: str) -> dict:
+        """
+        Cancels the ticker's open orders (the bracket) and sells whatever is held at market.
+        """
+        async with self._trading:
+            acct, orders = await asyncio.gather(self._call(self.client.get_account_positions), self._orders_today())
+            quantity = acct["positions"].get(self.ticker, {}).get("quantity", 0)
+            if not quantity:
+                return {"reason": reason, "quantity": 0}
+            open_orders = [o for o in _flatten_orders(orders) if o.get("status") in OPEN_STATUSES and _symbol(o) == self.ticker]
+            await asyncio.gather(*(self._call(self.client.cancel_order, str(o["orderId"])) for o in open_orders))
+            order_id = order_id_from_response(await self._call(self.client.place_market_order, quantity, "SELL", self.ticker))
+            filled, price = await wait_for_fill(self.client, order_id)
+        self.state["position"] = quantity - filled
+        result = {"reason": reason, "order_id": order_id, "quantity": filled, "price": price, "cancelled": [str(o["orderId"]) for o in open_orders]}
+        logger.info("Sold %s %s at %s (%s).", filled, self.ticker, price, reason, extra={"event": "exit", **result})
+        return result
+
+
+    async def record(self, session: datetime.date) -> dict:
+        transactions = await self._call(self.client.get_transactions_from_today)
+        transactions.raise_for_status()
+        fills = upsert_fills(self.conn, transactions.json())
+        orders = upsert_orders(self.conn, await self._orders_today())
+        record_daily_pnl(self.conn, session)
+        return {"fills": fills, "orders": orders}
+
+
+    async def poll(self) -> None:
+        """
+        Refreshes the position and today's orders, which is how a bracket filling at Schwab shows up.
+        """
+        acct, orders = await asyncio.gather(self._call(self.client.get_account_positions), self._orders_today())
+        upsert_orders(self.conn, orders)
+        position = acct["positions"].get(self.ticker, {}).get("quantity", 0)
+        if position != self.state["position"]:
+            logger.info("Position in %s went from %s to %s.", self.ticker, self.state["position"], position,
+                        extra={"event": "position_changed", "before": self.state["position"], "after": position})
+            self.state["position"] = position
+        self.state["liquidity"] = acct["liquidity"]
+        self.state["polled"] = self.clock().isoformat()
+        self._save()
+
+
+    async def tick(self) -> None:
+        """
+        One pass of the main loop: runs whatever actions are due and polls the account while the market's open.
+        """
+        now = self.clock()
+        session = now.date()
+        if not get_calendar().is_session(session):
+            return
+        due = self.schedule(session)
+        if now < due["entry"] - datetime.timedelta(minutes=5) or now > due["record"] + datetime.timedelta(minutes=5):
+            return
+        state = self._load(session)
+        # touching the token refreshes it here if it's close to expiring, rather than in the middle of an order
+        await self._call(lambda: self.client.access_token)
+        for action in ACTIONS:
+            if action in state["done"] or now < due[action]:
+                continue
+            if action == "entry":
+                if now > due["entry"] + self.max_entry_delay and not state.get("entry_started"):
+                    logger.warning("Entry due at %s is too late to place at %s, skipping it.", due["entry"], now, extra={"event": "entry_skipped"})
+                    self._done("entry", skipped=True)
+                    continue
+                self.state["entry"] = await self.enter()
+                self._done("entry")
+            elif action == "exit":
+                result = await self.exit_position("close")
+                if result["quantity"]:
+                    self.state["exit"] = result
+                self._done("exit", sold=result["quantity"])
+            else:
+                self._done("record", **await self.record(session))
+        if due["entry"] <= now < due["record"]:
+            await self.poll()
+
+
+    async def guard(self, stop: asyncio.Event) -> None:
+        """
+        Watches the quote while holding a position from today's entry, selling at market once it's at or below the stop leg's limit.
+        """
+        while not stop.is_set():
+            state = self.state
+            entry = (state or {}).get("entry") or {}
+            if state and state["position"] and entry.get("loss_price") and "exit" not in state:
+                try:
+                    price = await self._call(self.get_quote, self.ticker)
+                    if price <= entry["loss_price"] and not self._trading.locked():
+                        logger.warning("%s at %s is through the stop at %s with the position still open.", self.ticker, price, entry["loss_price"],
+                                       extra={"event": "guard_triggered", "price": price})
+                        state["exit"] = await self.exit_position("guard")
+                        self._save()
+                except Exception:
+                    logger.exception("Quote check failed.")
+            try:
+                await asyncio.wait_for(stop.wait(), self.quote_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+    async def run(self, stop: asyncio.Event=None) -> None:
+        """
+        Runs until stop is set.  A failing pass is logged and retried on the next one rather than taking the daemon down.
+        """
+        stop = stop or asyncio.Event()
+        self.conn = connect(self.db_path)
+        put_state(self.conn, "daemon", {"pid": os.getpid(), "ticker": self.ticker, "started": self.clock().isoformat()})
+        guard = asyncio.create_task(self.guard(stop))
+        try:
+            while not stop.is_set():
+                try:
+                    await self.tick()
+                except Exception:
+                    logger.exception("Daemon pass failed, retrying in %s seconds.", self.poll_interval)
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            stop.set()
+            await guard
+            self.conn.close()
+
+
+async def main(ticker: str, poll_interval: float, quote_interval: float) -> None:
+    client = SchwabClient()
+    client.refresh_access_token()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in [signal.SIGINT, signal.SIGTERM]:
+        loop.add_signal_handler(sig, stop.set)
+    logger.info("Daemon started for %s.", ticker)
+    try:
+        await TradingDaemon(client, ticker, poll_interval=poll_interval, quote_interval=quote_interval).run(stop)
+    finally:
+        client.close()
+        logger.info("Daemon stopped.")
+
+
+if __name__=="__main__":
+    from src.logger.logger import init_logger
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticker", default=os.environ.get("TICKER", "TQQQ"))
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="seconds between position and order polls")
+    parser.add_argument("--quote-interval", type=float, default=1.0, help="seconds between quote checks while holding")
+    args = parser.parse_args()
+    init_logger()
+    asyncio.run(main(args.ticker, args.poll_interval, args.quote_interval))
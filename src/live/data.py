@@ -0,0 +1,91 @@
+"""
+Bar data for running backtesting.py strategies live, standing in for backtesting.py's _Data.
+
+backtesting.py hands a strategy the whole history up front and reveals it a bar at a time by slicing.  Live there's no history to slice, so
+RingBarData keeps the last capacity bars in a fixed ring buffer instead: appending a bar is O(1) and never reallocates, and each column is a
+contiguous, read-only view of the most recent bars, so data.Close[-1], data.Close[-2] or data.Close[-20:] work just like in a backtest.
+
+Every bar is written twice, at slot and slot + capacity, which is what keeps the window of the last capacity bars contiguous without copying.
+"""
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+class RingBarData:
+    """
+    The last capacity bars of a run, looking like backtesting.py's strategy data.
+
+    Inputs:
+    ------
+    schedule: timestamps of every bar the run will see (warm-up bars included), the index a strategy sees in init(), so masks precomputed
+              from it (e.g. is_buy_time) line up with len(data) - 1 as they do in a backtest
+    capacity: how many bars the columns reach back, negative indices further back than that aren't available
+    """
+    def __init__(self, schedule: pd.DatetimeIndex, capacity: int=1024):
+        self.schedule = schedule
+        self.capacity = capacity
+        self.initializing = False
+        self._buffer = np.zeros((len(COLUMNS), 2 * capacity))
+        self._n = 0
+        self._views = {}
+
+
+    def append(self, open_: float, high: float, low: float, close: float, volume: float) -> None:
+        if self._n >= len(self.schedule):
+            raise IndexError(f"All {len(self.schedule)} scheduled bars have already been appended.")
+        slot = self._n % self.capacity
+        bar = (open_, high, low, close, volume)
+        self._buffer[:, slot] = bar
+        self._buffer[:, slot + self.capacity] = bar
+        self._n += 1
+        self._views.clear()
+
+
+    def __len__(self) -> int:
+        # bars seen so far, not bars kept, so bar numbers match a backtest's
+        return self._n
+
+
+    def _column(self, name: str) -> np.ndarray:
+        view = self._views.get(name)
+        if view is None:
+            end = (self._n - 1) % self.capacity + 1 + self.capacity if self._n else self.capacity
+            view = self._buffer[COLUMNS.index(name), end - min(self._n, self.capacity):end]
+            view.flags.writeable = False
+            self._views[name] = view
+        return view
+
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        if name in COLUMNS:
+            return self._column(name)
+        raise AttributeError(f"Column '{name}' not in data")
+
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._column(name)
+
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        # the whole schedule during init(), as backtesting.py shows the whole history there, afterwards only the bars seen so far
+        return self.schedule if self.initializing else self.schedule[:self._n]
+
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The bars still in the buffer as a frame (a copy).
+        """
+        kept = min(self._n, self.capacity)
+        return pd.DataFrame({c: self._column(c).copy() for c in COLUMNS}, index=self.schedule[self._n - kept:self._n])
+
+
+    def __repr__(self) -> str:
+        if not self._n:
+            return "<RingBarData (empty)>"
+        last = ", ".join(f"{c}={self._column(c)[-1]}" for c in COLUMNS)
+        return f"<RingBarData i={self._n - 1} ({self.schedule[self._n - 1]}) {last}>"
@@ -1,12 +1,77 @@
-import logging
+"""
+One logging setup for every workflow.  Modules just do logging.getLogger(__name__) and log with %-style arguments; the scripts call
+init_logger() once at the top, which routes every record through a queue to a listener thread:
+
+- the trading thread only builds a LogRecord and puts it on the queue, the message is formatted and written to disk by the listener, so
+  no file I/O (and no formatting of order dicts or responses) happens between the buy and the OCO placement
+- records below the level never get built at all, since the arguments are only formatted when a record is written
+- each record is one JSON object per line, with any extra={...} fields (e.g. timings) as keys of their own
+- logs/app.log rotates at max_bytes, so the copy the workflows commit stays bounded
+
+    logger.info("Entry pipeline finished.", extra={"event": "entry_pipeline", "timings": timings})
+"""
 import os
+import json
+import queue
+import atexit
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+LOG_PATH = os.path.join("logs", "app.log")
+MAX_BYTES = 1_000_000
+BACKUP_COUNT = 3
+# attributes every LogRecord has, anything else on a record came in through extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
 
 
-def init_logger() -> logging.Logger:
+class JsonLinesFormatter(logging.Formatter):
     """
-    Initializes a logger for use that will write to logs/app.log.
+    Formats a record as a single line of JSON: time, level, logger, message, the extra fields, and the traceback if there is one.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"), "level": record.levelname,
+                 "logger": record.name, "message": record.getMessage()}
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare formats the message on the calling thread so the record can be pickled.  The queue never leaves this process,
+        # so the record goes on as it is and the listener does the formatting.  Arguments are read when the record is written, not when it's
+        # logged, so don't mutate what you log afterwards.
+        return record
+
+
+def init_logger(name: str=None, path: str=LOG_PATH, level=None, max_bytes: int=MAX_BYTES, backup_count: int=BACKUP_COUNT) -> logging.Logger:
+    """
+    Sets up logging for the process (once, later calls only hand back loggers) and returns the logger called name.
+
+    Inputs:
+    ------
+    name: the logger to return, the root logger by default
+    path: file the records are written to
+    level: lowest level recorded, defaults to the LOG_LEVEL environment variable, or DEBUG
+    max_bytes: size at which the file is rotated to path.1, path.2...
+    backup_count: how many rotated files are kept
     """
-    logger = logging.getLogger(__name__)
-    log_file_path = os.path.join(os.getcwd(), "logs", "app.log")
-    logging.basicConfig(filename=log_file_path, format="%(asctime)s %(levelname)s %(message)s", level=logging.DEBUG)
-    return logger
\ No newline at end of file
+    global _listener
+    if _listener is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(JsonLinesFormatter())
+        records = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.setLevel(level or os.environ.get("LOG_LEVEL", "DEBUG"))
+        root.addHandler(_DeferredQueueHandler(records))
+        _listener = QueueListener(records, file_handler)
+        _listener.start()
+        # flushes whatever is still queued when the script exits
+        atexit.register(_listener.stop)
+    return logging.getLogger(name)
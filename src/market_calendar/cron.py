@@ -0,0 +1,48 @@
+"""
+Generates the GitHub Actions cron schedules for the trading workflows from the calendar, replacing the manual edits every time daylight
+saving time starts or ends (see the README's to-do list).
+
+GitHub's cron runs in UTC and has no year field, so a schedule is generated per year: one line per month and UTC time, listing exactly the
+session days, which also leaves out holidays and moves the afternoon run earlier on half-days.  Day-of-week is left as * on purpose,
+since cron matches a day when either the day-of-month or the day-of-week field does.
+
+    python -m src.market_calendar.cron 2025 --anchor open                 # morning run, at the open
+    python -m src.market_calendar.cron 2025 --anchor close --offset -5    # afternoon run, five minutes before the close
+"""
+import argparse
+import datetime
+import numpy as np
+
+from src.market_calendar.nyse import TradingCalendar, get_calendar
+
+
+def cron_lines(year: int, anchor: str="open", offset: datetime.timedelta=datetime.timedelta(0), calendar: TradingCalendar=None) -> list:
+    """
+    Cron expressions (UTC) firing offset after each session's open or close, for every session in year.
+    """
+    calendar = calendar or get_calendar()
+    if anchor not in ["open", "close"]:
+        raise ValueError(f"anchor should be 'open' or 'close', not {anchor!r}.")
+    in_year = (calendar.dates >= np.datetime64(f"{year}-01-01")) & (calendar.dates < np.datetime64(f"{year + 1}-01-01"))
+    utc_ns = (calendar.open_utc_ns if anchor == "open" else calendar.close_utc_ns)[in_year] + int(offset.total_seconds() * 10**9)
+    groups = {}
+    for instant in utc_ns.view("datetime64[ns]").astype("datetime64[s]").tolist():
+        groups.setdefault((instant.month, instant.hour, instant.minute), []).append(instant.day)
+    return [f"{minute} {hour} {','.join(map(str, days))} {month} *" for (month, hour, minute), days in sorted(groups.items())]
+
+
+def workflow_schedule(year: int, anchor: str="open", offset: datetime.timedelta=datetime.timedelta(0), calendar: TradingCalendar=None) -> str:
+    """
+    The schedule block to paste under a workflow's on: key.
+    """
+    lines = [f"    - cron: '{line}'" for line in cron_lines(year, anchor, offset, calendar)]
+    return "\n".join(["  schedule:"] + lines)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("year", type=int)
+    parser.add_argument("--anchor", choices=["open", "close"], default="open")
+    parser.add_argument("--offset", type=int, default=0, help="minutes after (or, negative, before) the anchor")
+    args = parser.parse_args()
+    print(workflow_schedule(args.year, args.anchor, datetime.timedelta(minutes=args.offset)))
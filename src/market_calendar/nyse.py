@@ -0,0 +1,235 @@
+"""
+NYSE trading calendar: every session from FIRST_YEAR through LAST_YEAR, worked out once and kept as sorted NumPy arrays.
+
+Holidays follow the exchange's rules (weekend holidays observed on the nearest weekday, except New Year's Day on a Saturday which isn't
+observed at all, Juneteenth from 2022 on, Good Friday from the Easter computus) plus the one-off closures, and half-days close at 13:00.
+Open and close times are kept both as nanoseconds of US/Eastern wall-clock time, the same convention the bar store uses for its index,
+and as UTC nanoseconds, where daylight saving time shows up (which is what the cron schedules need).
+
+With the sessions in arrays, every lookup is a dictionary hit or a bisection instead of stepping a day at a time and checking whether
+YFinance has any bars.
+"""
+import datetime
+import functools
+import numpy as np
+import pandas as pd
+
+
+MARKET_TZ = "America/New_York"
+FIRST_YEAR = 2000
+LAST_YEAR = 2040
+OPEN_TIME = datetime.time(9, 30)
+CLOSE_TIME = datetime.time(16, 0)
+EARLY_CLOSE_TIME = datetime.time(13, 0)
+NS_PER_DAY = 86_400 * 10**9
+
+# closures outside the regular holiday rules: 9/11, presidential funerals and Hurricane Sandy
+SPECIAL_CLOSURES = [
+    datetime.date(2001, 9, 11), datetime.date(2001, 9, 12), datetime.date(2001, 9, 13), datetime.date(2001, 9, 14),
+    datetime.date(2004, 6, 11), datetime.date(2007, 1, 2), datetime.date(2012, 10, 29), datetime.date(2012, 10, 30),
+    datetime.date(2018, 12, 5), datetime.date(2025, 1, 9),
+]
+
+
+def _easter(year: int) -> datetime.date:
+    """
+    Easter Sunday by the anonymous Gregorian computus.
+    """
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    """
+    The nth (1-based) weekday (Monday is 0) of a month, or the last one when n is -1.
+    """
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(date: datetime.date) -> datetime.date:
+    if date.weekday() == 5:
+        return date - datetime.timedelta(days=1)
+    if date.weekday() == 6:
+        return date + datetime.timedelta(days=1)
+    return date
+
+
+def holidays(year: int) -> list:
+    """
+    Full-day market holidays of a year, including the special closures.
+    """
+    days = []
+    new_year = datetime.date(year, 1, 1)
+    # a Saturday New Year's Day isn't moved back into the previous year
+    if new_year.weekday() != 5:
+        days.append(_observed(new_year))
+    if year >= 1998:
+        days.append(_nth_weekday(year, 1, 0, 3))
+    days.append(_nth_weekday(year, 2, 0, 3))
+    days.append(_easter(year) - datetime.timedelta(days=2))
+    days.append(_nth_weekday(year, 5, 0, -1))
+    if year >= 2022:
+        days.append(_observed(datetime.date(year, 6, 19)))
+    days.append(_observed(datetime.date(year, 7, 4)))
+    days.append(_nth_weekday(year, 9, 0, 1))
+    days.append(_nth_weekday(year, 11, 3, 4))
+    days.append(_observed(datetime.date(year, 12, 25)))
+    days.extend(d for d in SPECIAL_CLOSURES if d.year == year)
+    return sorted(set(days))
+
+
+def early_closes(year: int) -> list:
+    """
+    Half-days closing at 13:00: July 3rd, the day after Thanksgiving and Christmas Eve, whenever those fall on a session.
+    """
+    closed = set(holidays(year))
+    candidates = [datetime.date(year, 7, 3), _nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1), datetime.date(year, 12, 24)]
+    return [d for d in candidates if d.weekday() < 5 and d not in closed]
+
+
+class TradingCalendar:
+    """
+    Sessions between first_year and last_year as sorted arrays.
+
+    Attributes:
+    ------
+    dates: datetime64[D] session dates
+    open_ns, close_ns: session open and close as nanoseconds of US/Eastern wall-clock time
+    open_utc_ns, close_utc_ns: the same instants as UTC nanoseconds
+    early_close: whether each session is a half-day
+    """
+    def __init__(self, first_year: int=FIRST_YEAR, last_year: int=LAST_YEAR):
+        closed = set()
+        half_days = set()
+        for year in range(first_year, last_year + 1):
+            closed.update(holidays(year))
+            half_days.update(early_closes(year))
+        days = np.arange(np.datetime64(f"{first_year}-01-01"), np.datetime64(f"{last_year + 1}-01-01"), dtype="datetime64[D]")
+        weekday = (days.view(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        closed_days = np.array(sorted(closed), dtype="datetime64[D]")
+        self.dates = days[(weekday < 5) & ~np.isin(days, closed_days)]
+        self.early_close = np.isin(self.dates, np.array(sorted(half_days), dtype="datetime64[D]"))
+        midnight = self.dates.astype("datetime64[ns]").view(np.int64)
+        seconds = lambda t: (t.hour * 3600 + t.minute * 60) * 10**9
+        self.open_ns = midnight + seconds(OPEN_TIME)
+        self.close_ns = midnight + np.where(self.early_close, seconds(EARLY_CLOSE_TIME), seconds(CLOSE_TIME))
+        to_utc = lambda ns: pd.DatetimeIndex(ns.view("datetime64[ns]")).tz_localize(MARKET_TZ).tz_convert("UTC").tz_localize(None).values.view(np.int64)
+        self.open_utc_ns = to_utc(self.open_ns)
+        self.close_utc_ns = to_utc(self.close_ns)
+        self._position = {d: i for i, d in enumerate(self.dates.tolist())}
+
+
+    def _day(self, date) -> np.datetime64:
+        return np.datetime64(pd.Timestamp(date).date(), "D")
+
+
+    def is_session(self, date) -> bool:
+        return pd.Timestamp(date).date() in self._position
+
+
+    def is_early_close(self, date) -> bool:
+        i = self._position.get(pd.Timestamp(date).date())
+        return i is not None and bool(self.early_close[i])
+
+
+    def previous_session(self, date) -> datetime.date:
+        """
+        The last session strictly before date.
+        """
+        i = np.searchsorted(self.dates, self._day(date), side="left") - 1
+        if i < 0:
+            raise LookupError(f"No session before {date} in the calendar.")
+        return self.dates[i].item()
+
+
+    def next_session(self, date) -> datetime.date:
+        """
+        The first session strictly after date.
+        """
+        i = np.searchsorted(self.dates, self._day(date), side="right")
+        if i >= len(self.dates):
+            raise LookupError(f"No session after {date} in the calendar.")
+        return self.dates[i].item()
+
+
+    def sessions_in_range(self, start, end) -> np.ndarray:
+        """
+        Session dates in [start, end).
+        """
+        return self.dates[np.searchsorted(self.dates, self._day(start)):np.searchsorted(self.dates, self._day(end))]
+
+
+    def session_open(self, date) -> pd.Timestamp:
+        return pd.Timestamp(self.open_ns[self._position[pd.Timestamp(date).date()]])
+
+
+    def session_close(self, date) -> pd.Timestamp:
+        return pd.Timestamp(self.close_ns[self._position[pd.Timestamp(date).date()]])
+
+
+    def session_of_bars(self, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Position in dates of the session each bar falls on (int64 US/Eastern wall-clock nanoseconds, like the bar store's), or -1 for bars
+        on days that aren't sessions.
+        """
+        day = (timestamps // NS_PER_DAY).astype("datetime64[D]")
+        i = np.searchsorted(self.dates, day)
+        found = (i < len(self.dates)) & (self.dates[np.minimum(i, len(self.dates) - 1)] == day)
+        return np.where(found, i, -1)
+
+
+    def session_bounds(self, timestamps: np.ndarray) -> tuple:
+        """
+        For each bar of an ascending bar index, the positions of the first bar of its session and one past the last, so bar i's session is
+        timestamps[starts[i]:stops[i]].  Bars on days that aren't sessions are grouped by day.
+        """
+        session = self.session_of_bars(timestamps)
+        # bars off the calendar still get grouped with the rest of their day
+        key = np.where(session >= 0, session, -1 - timestamps // NS_PER_DAY)
+        changes = np.flatnonzero(key[1:] != key[:-1]) + 1
+        edges = np.r_[0, changes, len(timestamps)]
+        group = np.repeat(np.arange(len(edges) - 1), np.diff(edges))
+        return edges[:-1][group], edges[1:][group]
+
+
+    def bars_in_session(self, timestamps: np.ndarray, date) -> slice:
+        """
+        The slice of an ascending bar index falling within one session's trading hours.
+        """
+        i = self._position[pd.Timestamp(date).date()]
+        return slice(int(np.searchsorted(timestamps, self.open_ns[i], side="left")), int(np.searchsorted(timestamps, self.close_ns[i], side="left")))
+
+
+def market_now() -> pd.Timestamp:
+    """
+    The current US/Eastern wall-clock time, timezone-naive like the session times and the bar store's index.
+    """
+    return pd.Timestamp.now(tz=MARKET_TZ).tz_localize(None)
+
+
+def bars_at_times(timestamps: np.ndarray, times: list) -> np.ndarray:
+    """
+    Mask of the bars (int64 wall-clock nanoseconds) stamped at any of the given datetime.time's of day.
+    """
+    seconds = np.array([(t.hour * 3600 + t.minute * 60 + t.second) * 10**9 for t in times], dtype=np.int64)
+    return np.isin(timestamps % NS_PER_DAY, seconds)
+
+
+@functools.lru_cache(maxsize=None)
+def get_calendar(first_year: int=FIRST_YEAR, last_year: int=LAST_YEAR) -> TradingCalendar:
+    """
+    The shared calendar, built on first use (a few milliseconds) and reused after that.
+    """
+    return TradingCalendar(first_year, last_year)
@@ -4,13 +4,20 @@ Idea here is that this should deal with all things account-based.  This includes
 import os
 import requests
 import datetime
-import pytz
 import logging
+from zoneinfo import ZoneInfo
 
 
 logger = logging.getLogger(__name__)
-log_file_path = os.path.join(os.getcwd(), "logs", "app.log")
-logging.basicConfig(filename=log_file_path, format="%(asctime)s %(levelname)s %(message)s", level=logging.DEBUG)
+
+
+def todays_trading_window() -> tuple:
+    """
+    From just before today's open (9:29 ET) until now, which is the window the transaction and order lookups use.
+    """
+    today_end = datetime.datetime.now(tz=ZoneInfo("America/New_York"))
+    today_start = today_end.replace(hour=9, minute=29, second=0, microsecond=0)
+    return today_start, today_end
 
 
 def get_transactions_from_today(access_token) -> requests.Response:
@@ -22,9 +29,8 @@ def get_transactions_from_today(access_token) -> requests.Response:
     base_url = os.environ["SCHWAB_BASE_URL"]
     acct_number = os.environ["SCHWAB_ACCT_NUMBER"]
     url = f"{base_url}/accounts/{acct_number}/transactions"
-    today_end = datetime.datetime.now(tz=pytz.timezone("US/Eastern"))
-    today_start = datetime.datetime.now(tz=pytz.timezone("US/Eastern")).replace(hour=9, minute=29, second=0)
-    logging.debug(f"Getting transactions starting at {today_start} until {today_end}.")
+    today_start, today_end = todays_trading_window()
+    logger.debug("Getting transactions starting at %s until %s.", today_start, today_end)
     header = {'Authorization': f'Bearer {access_token}'}
     params = {
         "startDate": today_start.isoformat(),
@@ -32,7 +38,7 @@ def get_transactions_from_today(access_token) -> requests.Response:
         "type": "TRADE"
     }
     response = requests.get(url=url, headers=header, params=params)
-    logger.info(f"Schwab response to the request to get today's transactions:\n{response}")
+    logger.info("Schwab response to the request to get today's transactions:\n%s", response)
     return response
 
 
@@ -46,16 +52,15 @@ def get_orders_from_today(access_token) -> requests.Response:
     base_url = os.environ["SCHWAB_BASE_URL"]
     acct_number = os.environ["SCHWAB_ACCT_NUMBER"]
     url = f"{base_url}/accounts/{acct_number}/orders"
-    today_end = datetime.datetime.now(tz=pytz.timezone("US/Eastern"))
-    today_start = datetime.datetime.now(tz=pytz.timezone("US/Eastern")).replace(hour=9, minute=29, second=0)
-    logger.debug(f"Getting orders placed starting at {today_start} and ending at {today_end}")
+    today_start, today_end = todays_trading_window()
+    logger.debug("Getting orders placed starting at %s and ending at %s", today_start, today_end)
     header = {'Authorization': f'Bearer {access_token}'}
     params = {
         "fromEnteredTime": today_start.isoformat(),
         "toEnteredTime": today_end.isoformat()
     }
     response = requests.get(url=url, headers=header, params=params)
-    logger.debug(f"Schwab's response to the request to get today's orders:\n{response}")
+    logger.debug("Schwab's response to the request to get today's orders:\n%s", response)
     return response
 
 
@@ -77,19 +82,26 @@ def get_account_positions(access_token) -> dict:
     url = f"{base_url}/accounts/{acct_number}"
     header = {'Authorization': f'Bearer {access_token}'}
     response = requests.get(url=url, headers=header, params={"fields": "positions"})
-    logger.debug(f"Schwab's response to the request for account positions:\n{response}")
+    logger.debug("Schwab's response to the request for account positions:\n%s", response)
     # TODO: Check to make sure response is valid
-    liquidity = response["securitiesAccount"]["currentBalances"]["buyingPowerNonMarginableTrade"]
-    logger.debug(f"Stored liquidity: {liquidity}")
-    positions = response["securitiesAccount"]["positions"]
-    logger.debug(f"Positions object type: {type(positions)}")
+    return parse_account_positions(response.json())
+
+
+def parse_account_positions(account: dict) -> dict:
+    """
+    Turns Schwab's account JSON (requested with fields=positions) into the liquidity/positions dictionary described in get_account_positions.
+    """
+    liquidity = account["securitiesAccount"]["currentBalances"]["buyingPowerNonMarginableTrade"]
+    logger.debug("Stored liquidity: %s", liquidity)
+    positions = account["securitiesAccount"].get("positions", [])
+    logger.debug("Positions object type: %s", type(positions))
     positions_dict = {}
     for position in positions:
         ticker = position["instrument"]["symbol"]
         quantity = position["longQuantity"]
         price = position["marketValue"]
         positions_dict[ticker] = {"quantity": quantity, "price": price}
-        logger.debug(f"Stored position with key {ticker} and value {positions_dict[ticker]}.")
+        logger.debug("Stored position with key %s and value %s.", ticker, positions_dict[ticker])
     ret_obj = {"liquidity": liquidity, "positions": positions_dict}
-    logger.debug(f"Will return:\n{ret_obj}")
+    logger.debug("Will return:\n%s", ret_obj)
     return ret_obj
\ No newline at end of file
@@ -1,31 +1,42 @@
 import os
 import base64
 import requests
-import webbrowser
 import logging
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(filename="logs/app.log", format="%(asctime)s %(levelname)s %(message)s", level=logging.DEBUG)
 
 
-def get_access_token():
+TOKEN_URL = "https://api.schwabapi.com/v1/oauth/token"
+
+
+def request_access_token(session: requests.Session=None, token_url: str=TOKEN_URL) -> dict:
     """
-    Use the refresh token stored in GitHub Secrets to retrieve a new access token which is then returned.
+    Use the refresh token stored in GitHub Secrets to request a new access token.
 
-    TODO: Confirm return value. 
+    Returns Schwab's whole token response, which carries "access_token" along with "expires_in" (seconds).
     """
-    logger.debug("Entered the get_access_token function.")
+    logger.debug("Entered the request_access_token function.")
     app_key = os.environ["SCHWAB_APP_KEY"]
     app_secret = os.environ["SCHWAB_APP_SECRET"]
     refresh_token = os.environ["SCHWAB_REFRESH_TOKEN"]
     headers = {'Authorization': f'Basic {base64.b64encode(bytes(f"{app_key}:{app_secret}", "utf-8")).decode("utf-8")}',
                'Content-Type': 'application/x-www-form-urlencoded'}
     data = {'grant_type': 'refresh_token', 'refresh_token': refresh_token}
-    resp = requests.post('https://api.schwabapi.com/v1/oauth/token', headers=headers, data=data)
+    resp = (session or requests).post(token_url, headers=headers, data=data)
     resp.raise_for_status()
+    logger.debug("About to return from the request_access_token function.")
+    return resp.json()
+
 
-    access_token = resp["access_token"]
+def get_access_token():
+    """
+    Use the refresh token stored in GitHub Secrets to retrieve a new access token which is then returned.
+
+    For anything making more than one call, SchwabClient (client.py) caches the token instead of refreshing it every time.
+    """
+    logger.debug("Entered the get_access_token function.")
+    access_token = request_access_token()["access_token"]
     logger.debug("About to return from the get_access_token function.")
     return access_token
 
@@ -41,6 +52,8 @@ def get_refresh_token(callback_url: str="https://127.0.0.1"):
     app_secret = os.environ['SCHWAB_APP_SECRET']
 
     auth_url = f'https://api.schwabapi.com/v1/oauth/authorize?client_id={app_key}&redirect_uri={callback_url}'
+    # only needed for this manual step, so the trading runs don't pay for importing it
+    import webbrowser
     webbrowser.open(url=auth_url, new=1)
 
     response_url = input("Enter the URL provided by the authorization here:  ")
@@ -0,0 +1,169 @@
+"""
+Object-oriented take on the Schwab module (see the README's to-do on SchwabTrader): one SchwabClient holds the credentials, account number
+and base URL read once from the environment, a keep-alive requests.Session so every call after the first reuses the same TLS connection,
+and the access token along with its expiry so it only gets refreshed when it's about to run out.
+
+The module level functions in account.py and order.py still work, this just wraps the same requests with less overhead per call, which
+matters most on the morning path between reading the price and the order reaching Schwab.
+"""
+import os
+import time
+import json
+import logging
+import threading
+from typing import Literal
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.schwab.auth import request_access_token, TOKEN_URL
+from src.schwab.account import parse_account_positions, todays_trading_window
+from src.schwab.order import build_market_order, build_oco_order
+
+
+logger = logging.getLogger(__name__)
+
+MARKET_DATA_URL = "https://api.schwabapi.com/marketdata/v1"
+
+
+class SchwabClient:
+    """
+    Keeps one session and one cached access token around for every Schwab call made in a run.
+
+    Inputs:
+    ------
+    base_url: trader API base URL, defaults to the SCHWAB_BASE_URL environment variable
+    acct_number: account number (hash) to trade in, defaults to the SCHWAB_ACCT_NUMBER environment variable
+    token_url: OAuth token endpoint
+    market_data_url: market data API base URL, used for quotes
+    refresh_margin: how many seconds before expiry the token gets refreshed, so a request never goes out with a token about to expire
+    timeout: seconds to wait on any one request
+    """
+    def __init__(self, base_url: str=None, acct_number: str=None, token_url: str=TOKEN_URL, market_data_url: str=MARKET_DATA_URL,
+                 refresh_margin: float=60, timeout: float=10):
+        self.base_url = base_url or os.environ["SCHWAB_BASE_URL"]
+        self.acct_number = acct_number or os.environ["SCHWAB_ACCT_NUMBER"]
+        self.token_url = token_url
+        self.market_data_url = market_data_url
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token = None
+        self._token_expiry = 0.0
+        self._token_lock = threading.Lock()
+
+
+    @property
+    def access_token(self) -> str:
+        """
+        The cached access token, refreshed first if it expires within refresh_margin seconds.
+        """
+        with self._token_lock:
+            if self._token is None or time.monotonic() >= self._token_expiry - self.refresh_margin:
+                self.refresh_access_token()
+            return self._token
+
+
+    def refresh_access_token(self) -> None:
+        """
+        Trades the refresh token for a new access token and remembers when it expires.  Schwab's access tokens last 30 minutes.
+        """
+        token = request_access_token(session=self.session, token_url=self.token_url)
+        self._token = token["access_token"]
+        self._token_expiry = time.monotonic() + float(token.get("expires_in", 1800))
+        logger.debug("Access token refreshed.")
+
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        headers = kwargs.pop("headers", {})
+        headers["Authorization"] = f"Bearer {self.access_token}"
+        response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+        if response.status_code == 401:
+            # token was revoked or expired early, refresh once and retry
+            with self._token_lock:
+                self.refresh_access_token()
+            headers["Authorization"] = f"Bearer {self._token}"
+            response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+        return response
+
+
+    @property
+    def _account_url(self) -> str:
+        return f"{self.base_url}/accounts/{self.acct_number}"
+
+
+    def get_account_positions(self) -> dict:
+        """
+        Liquidity and positions of the account, structured as in account.get_account_positions.
+        """
+        response = self._request("GET", self._account_url, params={"fields": "positions"})
+        response.raise_for_status()
+        return parse_account_positions(response.json())
+
+
+    def get_transactions_from_today(self) -> requests.Response:
+        """
+        Today's trades, same as account.get_transactions_from_today.
+        """
+        today_start, today_end = todays_trading_window()
+        params = {"startDate": today_start.isoformat(), "endDate": today_end.isoformat(), "type": "TRADE"}
+        return self._request("GET", f"{self._account_url}/transactions", params=params)
+
+
+    def get_orders_from_today(self) -> requests.Response:
+        """
+        Orders entered today, same as account.get_orders_from_today.
+        """
+        today_start, today_end = todays_trading_window()
+        params = {"fromEnteredTime": today_start.isoformat(), "toEnteredTime": today_end.isoformat()}
+        return self._request("GET", f"{self._account_url}/orders", params=params)
+
+
+    def get_order(self, order_id: str) -> requests.Response:
+        """
+        A single order, including its status and executions.
+        """
+        return self._request("GET", f"{self._account_url}/orders/{order_id}")
+
+
+    def get_quote(self, ticker: str="TQQQ") -> float:
+        """
+        Last traded price of a ticker from Schwab's market data API.
+        """
+        response = self._request("GET", f"{self.market_data_url}/quotes", params={"symbols": ticker, "fields": "quote"})
+        response.raise_for_status()
+        return float(response.json()[ticker]["quote"]["lastPrice"])
+
+
+    def _place(self, order: dict) -> requests.Response:
+        return self._request("POST", f"{self._account_url}/orders", headers={"Content-Type": "application/json"}, data=json.dumps(order))
+
+
+    def place_market_order(self, quantity, instruction: Literal["BUY", "SELL"], ticker: str="TQQQ") -> requests.Response:
+        """
+        Places a market order, see order.place_market_order.
+        """
+        logger.info("Placing market order to %s for %s of %s.", instruction, quantity, ticker)
+        return self._place(build_market_order(quantity=quantity, instruction=instruction, ticker=ticker))
+
+
+    def place_oco_order(self, quantity, limit_price: float, stop_limit_price: float, stop_price: float, ticker: str="TQQQ") -> requests.Response:
+        """
+        Places the OCO sell bracket, see order.place_oco_order.
+        """
+        logger.info("Placing OCO order to sell %s of %s at %s or on a stop at %s.", quantity, ticker, limit_price, stop_limit_price)
+        return self._place(build_oco_order(quantity=quantity, limit_price=limit_price, stop_limit_price=stop_limit_price, stop_price=stop_price, ticker=ticker))
+
+
+    def cancel_order(self, order_id: str) -> requests.Response:
+        """
+        Cancels an order, see order.cancel_order.
+        """
+        logger.info("Cancelling order %s", order_id)
+        return self._request("DELETE", f"{self._account_url}/orders/{order_id}")
+
+
+    def close(self) -> None:
+        self.session.close()
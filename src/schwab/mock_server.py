@@ -0,0 +1,208 @@
+"""
+Local stand-in for the parts of Schwab's API the trading scripts use, so the order path can be run end to end and benchmarked offline.
+
+Covers the OAuth token endpoint, account positions, quotes, placing/getting/listing/cancelling orders and transactions.  Market orders fill
+at the current quote fill_delay seconds after they're placed, and every response is held back by latency seconds to mimic the network.
+
+Running this module benchmarks the entry pipeline against it:
+    python -m src.schwab.mock_server
+"""
+import re
+import json
+import time
+import asyncio
+import threading
+import statistics
+import itertools
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockSchwabServer:
+    """
+    Threaded HTTP server faking Schwab.  Use as a context manager, or call start() and stop().
+
+    Inputs:
+    ------
+    liquidity: buying power of the fake account
+    prices: ticker -> last price served by the quotes endpoint and used for fills
+    latency: seconds every response is delayed by
+    fill_delay: seconds after placement that a market order shows up as FILLED
+    acct_number: the account number the fake account answers to
+    """
+    def __init__(self, liquidity: float=10_000, prices: dict=None, latency: float=0.0, fill_delay: float=0.05, acct_number: str="MOCK"):
+        self.liquidity = liquidity
+        self.prices = prices or {"TQQQ": 75.0}
+        self.latency = latency
+        self.fill_delay = fill_delay
+        self.acct_number = acct_number
+        self.orders = {}
+        self.positions = {}
+        self.requests = []
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = None
+
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/trader/v1"
+
+
+    @property
+    def token_url(self) -> str:
+        return f"{self.url}/v1/oauth/token"
+
+
+    @property
+    def market_data_url(self) -> str:
+        return f"{self.url}/marketdata/v1"
+
+
+    def client_kwargs(self) -> dict:
+        """
+        Keyword arguments pointing a SchwabClient at this server.
+        """
+        return {"base_url": self.base_url, "acct_number": self.acct_number, "token_url": self.token_url, "market_data_url": self.market_data_url}
+
+
+    def start(self) -> "MockSchwabServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def _order_view(self, order_id: str) -> dict:
+        """
+        An order as Schwab would show it right now, filling market orders whose fill_delay has passed.
+        """
+        order = self.orders[order_id]
+        if order.get("orderType") == "MARKET" and order["status"] == "WORKING" and time.monotonic() - order["_placed"] >= self.fill_delay:
+            leg = order["orderLegCollection"][0]
+            ticker, quantity = leg["instrument"]["symbol"], leg["quantity"]
+            price = self.prices[ticker]
+            sign = 1 if leg["instruction"] == "BUY" else -1
+            self.positions[ticker] = self.positions.get(ticker, 0) + sign * quantity
+            self.liquidity -= sign * quantity * price
+            order.update({"status": "FILLED", "filledQuantity": quantity,
+                          "orderActivityCollection": [{"executionLegs": [{"quantity": quantity, "price": price}]}]})
+        return {k: v for k, v in order.items() if not k.startswith("_")}
+
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out as separate writes, without this Nagle holds the body back for the client's delayed ACK (~40ms)
+            disable_nagle_algorithm = True
+
+            def _reply(self, code: int, body=None, headers: dict=None):
+                time.sleep(server.latency)
+                payload = b"" if body is None else json.dumps(body).encode()
+                self.send_response(code)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _route(self, method: str):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                # work out the answer under the lock, but sleep off the latency outside it so concurrent requests overlap like they would
+                with server._lock:
+                    server.requests.append((method, parsed.path, time.perf_counter()))
+                    reply = self._dispatch(method, parsed.path, parse_qs(parsed.query), body)
+                self._reply(*reply)
+
+            def _dispatch(self, method: str, path: str, query: dict, body: bytes) -> tuple:
+                account = f"/trader/v1/accounts/{server.acct_number}"
+                if method == "POST" and path == "/v1/oauth/token":
+                    return 200, {"access_token": "mock-token", "expires_in": 1800, "token_type": "Bearer"}
+                if method == "GET" and path == "/marketdata/v1/quotes":
+                    return 200, {t: {"quote": {"lastPrice": server.prices[t]}} for t in query["symbols"][0].split(",")}
+                if method == "GET" and path == account:
+                    positions = [{"instrument": {"symbol": t}, "longQuantity": q, "marketValue": q * server.prices[t]} for t, q in server.positions.items() if q]
+                    return 200, {"securitiesAccount": {"currentBalances": {"buyingPowerNonMarginableTrade": server.liquidity}, "positions": positions}}
+                if method == "POST" and path == f"{account}/orders":
+                    order = json.loads(body)
+                    order_ids = []
+                    for child in [order] + order.get("childOrderStrategies", []):
+                        order_id = str(next(server._ids))
+                        child.update({"orderId": order_id, "status": "WORKING", "_placed": time.monotonic()})
+                        server.orders[order_id] = child
+                        order_ids.append(order_id)
+                    return 201, None, {"Location": f"{server.base_url}/accounts/{server.acct_number}/orders/{order_ids[0]}"}
+                if method == "GET" and path == f"{account}/orders":
+                    return 200, [server._order_view(i) for i in list(server.orders)]
+                if method == "GET" and path == f"{account}/transactions":
+                    return 200, []
+                match = re.fullmatch(f"{account}/orders/(\\w+)", path)
+                if match and match.group(1) in server.orders:
+                    if method == "GET":
+                        return 200, server._order_view(match.group(1))
+                    if method == "DELETE":
+                        server.orders[match.group(1)]["status"] = "CANCELED"
+                        return 200, None
+                return 404, {"error": f"{method} {path} isn't mocked."}
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def benchmark_entry_pipeline(runs: int=20, latency: float=0.02, fill_delay: float=0.05) -> dict:
+    """
+    Runs the entry pipeline against a fresh mock server runs times and returns the median milliseconds to reach each stage.
+    """
+    import os
+    from src.schwab.client import SchwabClient
+    from src.schwab.pipeline import run_entry_pipeline
+    os.environ.setdefault("SCHWAB_APP_KEY", "mock")
+    os.environ.setdefault("SCHWAB_APP_SECRET", "mock")
+    os.environ.setdefault("SCHWAB_REFRESH_TOKEN", "mock")
+    timings = []
+    for _ in range(runs):
+        with MockSchwabServer(latency=latency, fill_delay=fill_delay) as server:
+            client = SchwabClient(**server.client_kwargs())
+            client.refresh_access_token()
+            result = asyncio.run(run_entry_pipeline(client, poll_interval=0.01))
+            timings.append(result["timings"])
+            client.close()
+    return {stage: statistics.median(t[stage] for t in timings) for stage in timings[0]}
+
+
+if __name__=="__main__":
+    print(benchmark_entry_pipeline())
@@ -6,7 +6,62 @@ import logging
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(filename="logs/app.log", format="%(asctime)s %(levelname)s %(message)s", level=logging.DEBUG)
+
+
+def _sell_leg(quantity, ticker: str) -> dict:
+    return {"instruction": "SELL", "quantity": quantity, "instrument": {"symbol": ticker, "assetType": "EQUITY"}}
+
+
+def build_market_order(quantity, instruction: Literal["BUY", "SELL"], ticker: str="TQQQ") -> dict:
+    """
+    Builds the JSON body of a market order for an equity, see place_market_order.
+    """
+    if instruction not in ["BUY", "SELL"]:
+        logger.error("Was given a weird instruction: %s", instruction)
+        raise Exception("Invalid instruction!")
+    return {"orderType": "MARKET",
+            "session": "NORMAL",
+            "duration": "DAY",
+            "orderStrategyType": "SINGLE",
+            "orderLegCollection": [
+                {
+                    "instruction": instruction,
+                    "quantity": quantity,
+                    "instrument": {
+                        "symbol": ticker,
+                        "assetType": "EQUITY"
+                    }
+                }
+            ]
+            }
+
+
+def build_oco_order(quantity, limit_price: float, stop_limit_price: float, stop_price: float, ticker: str="TQQQ") -> dict:
+    """
+    Builds the JSON body of the OCO sell bracket, see place_oco_order.  Both legs sell the same quantity of the same ticker.
+    """
+    return {
+        "orderStrategyType": "OCO",
+        "childOrderStrategies": [
+            {
+                "orderType": "LIMIT",
+                "session": "NORMAL",
+                "price": limit_price,
+                "duration": "DAY",
+                "orderStrategyType": "SINGLE",
+                "orderLegCollection": [_sell_leg(quantity, ticker)]
+            },
+            {
+                "orderType": "STOP_LIMIT",
+                "session": "NORMAL",
+                "price": stop_price,
+                "stopPrice": stop_limit_price,
+                "duration": "DAY",
+                "orderStrategyType": "SINGLE",
+                "orderLegCollection": [_sell_leg(quantity, ticker)]
+            }
+        ]
+    }
 
 
 def place_market_order(access_token, quantity, instruction: Literal["BUY", "SELL"], ticker: str="TQQQ") -> requests.Response:
@@ -21,37 +76,19 @@ def place_market_order(access_token, quantity, instruction: Literal["BUY", "SELL
     ticker:  The ticker to use with Schwab
     order_type: what kind of order to place (usually just MARKET)
     """
-    logger.info(f"Placing market order to {instruction} for {quantity} of {ticker}.")
+    logger.info("Placing market order to %s for %s of %s.", instruction, quantity, ticker)
     base_url = os.environ["SCHWAB_BASE_URL"]
     acct_number = os.environ["SCHWAB_ACCT_NUMBER"]
 
-    if instruction not in ["BUY", "SELL"]:
-        logger.error(f"Was given a weird instruction: {instruction}")
-        raise Exception("Invalid instruction!")
-    
     url = f"{base_url}/accounts/{acct_number}/orders"
     headers = {
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {access_token}'
     }
-    order = {"orderType": "MARKET",
-         "session": "NORMAL",
-         "duration": "DAY",
-         "orderStrategyType": "SINGLE",
-         "orderLegCollection": [
-             {
-                 "instruction": instruction,
-                 "quantity": quantity,
-                 "instrument": {
-                     "symbol": ticker,
-                     "assetType": "EQUITY"
-                 }
-             }
-            ]
-         }
-    logger.debug(f"Here's the order placed: {order}")
+    order = build_market_order(quantity=quantity, instruction=instruction, ticker=ticker)
+    logger.debug("Here's the order placed: %s", order)
     response = requests.post(url=url, headers=headers, data=json.dumps(order))
-    logger.debug(f"Here's Schwab's response to placing the market order:\n{response}")
+    logger.debug("Here's Schwab's response to placing the market order:\n%s", response)
     logger.info("Market order placed.")
     return response
 
@@ -69,7 +106,7 @@ def place_oco_order(access_token, quantity, limit_price: float, stop_limit_price
     stop_price: the price to sell the stock for in the event of loss
     ticker: What could this be? :)
     """
-    logger.info(f"Placing OCO order to sell {quantity} of {ticker} if price reaches a high of ${limit_price} or a loss of ${stop_limit_price}.")
+    logger.info("Placing OCO order to sell %s of %s if price reaches a high of $%s or a loss of $%s.", quantity, ticker, limit_price, stop_limit_price)
     base_url = os.environ["SCHWAB_BASE_URL"]
     acct_number = os.environ["SCHWAB_ACCT_NUMBER"]
     url = f"{base_url}/accounts/{acct_number}/orders"
@@ -77,49 +114,10 @@ def place_oco_order(access_token, quantity, limit_price: float, stop_limit_price
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {access_token}'
     }
-    order = { 
-        "orderStrategyType": "OCO", 
-        "childOrderStrategies": [ 
-        { 
-            "orderType": "LIMIT", 
-            "session": "NORMAL", 
-            "price": limit_price, 
-            "duration": "DAY", 
-            "orderStrategyType": "SINGLE", 
-            "orderLegCollection": [ 
-            { 
-            "instruction": "SELL", 
-            "quantity": quantity, 
-            "instrument": { 
-            "symbol": ticker, 
-            "assetType": "EQUITY" 
-            } 
-            } 
-            ] 
-        }, 
-        { 
-            "orderType": "STOP_LIMIT", 
-            "session": "NORMAL", 
-            "price": stop_price, 
-            "stopPrice": stop_limit_price, 
-            "duration": "DAY", 
-            "orderStrategyType": "SINGLE", 
-            "orderLegCollection": [ 
-            { 
-            "instruction": "SELL", 
-            "quantity": 2, 
-            "instrument": { 
-            "symbol": "XYZ", 
-            "assetType": "EQUITY" 
-            } 
-            } 
-            ] 
-        } 
-        ] 
-        }
-    logger.debug(f"The order placed looks like this:\n{order}")
-    response = requests.post(headers=headers, data=json.dumps(order))
-    logger.debug(f"Schwab's response to placing the OCO order is:\n{response}")
+    order = build_oco_order(quantity=quantity, limit_price=limit_price, stop_limit_price=stop_limit_price, stop_price=stop_price, ticker=ticker)
+    logger.debug("The order placed looks like this:\n%s", order)
+    response = requests.post(url=url, headers=headers, data=json.dumps(order))
+    logger.debug("Schwab's response to placing the OCO order is:\n%s", response)
     logger.info("OCO order placed.")
     return response
 
@@ -128,12 +126,12 @@ def cancel_order(access_token, order_id: str) -> requests.Response:
     """
     Cancel order, mostly for EOD or emergencies.
     """
-    logger.info(f"Cancelling order {order_id}")
+    logger.info("Cancelling order %s", order_id)
     base_url = os.environ["SCHWAB_BASE_URL"]
     acct_number = os.environ["SCHWAB_ACCT_NUMBER"]
     url = f"{base_url}/accounts/{acct_number}/orders/{order_id}"
     headers={'Authorization': f'Bearer {access_token}'}
     response = requests.delete(url=url, headers=headers)
-    logger.debug(f"Schwab's response to order cancellation is:\n{response}")
-    logger.info(f"Order {order_id} should be cancelled.")
+    logger.debug("Schwab's response to order cancellation is:\n%s", response)
+    logger.info("Order %s should be cancelled.", order_id)
     return response
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Asyncio pipeline for the morning entry.  Compared to running every step one after another, it:
+1. Fetches the account and the quote at the same time.
+2. Submits the market buy.
+3. Polls the order until it's filled (or a short timeout passes, canceling whatever hasn't filled by then).
+4. Places the OCO bracket around the actual fill price, for the quantity actually filled.
+
+Each stage is timestamped, so the latency between the price read and the orders reaching Schwab can be logged and benchmarked (see
+mock_server.py for running the whole thing offline).
+"""
+import time
+import asyncio
+import logging
+import requests
+
+from src.schwab.client import SchwabClient
+
+
+logger = logging.getLogger(__name__)
+
+
+# statuses an order never leaves again
+FINAL_STATUSES = ["FILLED", "REJECTED", "CANCELED", "EXPIRED"]
+
+
+class FillTimeout(Exception):
+    """
+    Raised when the entry order ends up with nothing filled, either on its own or after the fill timeout canceled it.
+    """
+
+
+def order_id_from_response(response: requests.Response) -> str:
+    """
+    Schwab answers a placed order with an empty 201 whose Location header ends with the new order's id.
+    """
+    response.raise_for_status()
+    return response.headers["Location"].rstrip("/").split("/")[-1]
+
+
+def fill_from_order(order: dict) -> tuple:
+    """
+    (filled quantity, average fill price) of an order, read from its execution legs.  The price is None when nothing has filled yet.
+    """
+    quantity, notional = 0.0, 0.0
+    for activity in order.get("orderActivityCollection", []):
+        for leg in activity.get("executionLegs", []):
+            quantity += leg["quantity"]
+            notional += leg["quantity"] * leg["price"]
+    return quantity, (notional / quantity if quantity else None)
+
+
+async def wait_for_fill(client: SchwabClient, order_id: str, timeout: float=5.0, poll_interval: float=0.1) -> tuple:
+    """
+    Polls an order until it's done, returning (filled quantity, average fill price).  An order that ends up REJECTED, CANCELED or EXPIRED
+    after filling partly returns that partial fill.  If the timeout passes first, the rest of the order is canceled and polled (for up to
+    another timeout) until it's done, so what's returned is everything that will ever fill and a bracket around it leaves nothing
+    unprotected.  With nothing filled FillTimeout is raised.
+    """
+    deadline = time.perf_counter() + timeout
+    canceled = False
+    while True:
+        response = await asyncio.to_thread(client.get_order, order_id)
+        response.raise_for_status()
+        order = response.json()
+        quantity, price = fill_from_order(order)
+        status = order.get("status")
+        if status in FINAL_STATUSES:
+            break
+        if time.perf_counter() >= deadline:
+            if canceled:
+                logger.error("Order %s is still %s after canceling it, %s filled so far.", order_id, status, quantity)
+                break
+            cancel = await asyncio.to_thread(client.cancel_order, order_id)
+            if not cancel.ok:
+                # i.e. it filled in the meantime, the next poll says so
+                logger.warning("Canceling order %s after the fill timeout failed with %s.", order_id, cancel.status_code)
+            canceled = True
+            deadline = time.perf_counter() + timeout
+            continue
+        await asyncio.sleep(poll_interval)
+    if not quantity:
+        raise FillTimeout(f"Order {order_id} ended up {status} without filling.")
+    if status != "FILLED":
+        logger.warning("Order %s ended up %s with %s filled.", order_id, status, quantity)
+    return quantity, price
+
+
+async def run_entry_pipeline(client: SchwabClient, ticker: str="TQQQ", profit_capture_percent: float=0.025, loss_aversion_percent: float=0.01,
+                             stop_limit_offset: float=0.01, fill_timeout: float=5.0, poll_interval: float=0.1, get_quote=None) -> dict:
+    """
+    Buys as much of ticker as the account can afford and brackets it with an OCO order.
+
+    Inputs:
+    ------
+    client: the SchwabClient to trade through
+    ticker: what to buy
+    profit_capture_percent: the limit leg sits this far above the fill price
+    loss_aversion_percent: the stop leg triggers this far below the fill price
+    stop_limit_offset: how far below the stop trigger the stop leg's limit price sits
+    fill_timeout: seconds to wait for the entry to fill
+    poll_interval: seconds between order status checks
+    get_quote: function taking a ticker and returning its last price, defaults to client.get_quote
+
+    Returns a dictionary with the order ids, the fill, the OCO prices and "timings", the milliseconds from the start of the pipeline at
+    which each stage finished.
+    """
+    get_quote = get_quote or client.get_quote
+    start = time.perf_counter()
+    timings = {}
+    mark = lambda stage: timings.__setitem__(stage, round((time.perf_counter() - start) * 1000, 3))
+
+    acct, price = await asyncio.gather(asyncio.to_thread(client.get_account_positions), asyncio.to_thread(get_quote, ticker))
+    mark("prefetched")
+    quantity = int(acct["liquidity"] // price)
+    if quantity < 1:
+        logger.warning("Liquidity of %s can't buy a share of %s at %s.", acct["liquidity"], ticker, price)
+        return {"quote": price, "quantity": 0, "timings": timings}
+
+    entry_id = order_id_from_response(await asyncio.to_thread(client.place_market_order, quantity, "BUY", ticker))
+    mark("entry_submitted")
+    filled_quantity, fill_price = await wait_for_fill(client, entry_id, timeout=fill_timeout, poll_interval=poll_interval)
+    mark("filled")
+
+    # same naming as morning_trade.py: the stop leg triggers at loss_stop_price and sells no lower than loss_price
+    profit_capture_price = round(fill_price * (1 + profit_capture_percent), 2)
+    loss_stop_price = round(fill_price * (1 - loss_aversion_percent), 2)
+    loss_price = round(loss_stop_price - stop_limit_offset, 2)
+    oco_response = await asyncio.to_thread(client.place_oco_order, quantity=int(filled_quantity), limit_price=profit_capture_price,
+                                           stop_limit_price=loss_stop_price, stop_price=loss_price, ticker=ticker)
+    oco_id = order_id_from_response(oco_response)
+    mark("oco_submitted")
+    result = {"quote": price, "entry_order_id": entry_id, "quantity": filled_quantity, "fill_price": fill_price, "oco_order_id": oco_id,
+              "profit_capture_price": profit_capture_price, "loss_stop_price": loss_stop_price, "loss_price": loss_price, "timings": timings}
+    logger.info("Entry pipeline finished: %s", result, extra={"event": "entry_pipeline", "timings_ms": timings})
+    return result
@@ -0,0 +1,123 @@
+"""
+Quote providers for the morning path, where every millisecond between reading the price and the order reaching Schwab counts.
+
+- YFinanceQuoteProvider reads Yahoo's lightweight fast_info last price rather than the whole .info blob.
+- SchwabQuoteProvider reuses a SchwabClient's warm session and token, so a quote costs a single request to an already open connection.
+- CachedQuoteProvider wraps either one and serves repeated lookups of the same ticker from memory for a few seconds.
+
+Yesterday's close doesn't need a quote at all: previous_close reads it from the bars already in trading_data.sqlite, downloading (and
+storing) a few daily bars only when they're missing.
+"""
+import time
+import datetime
+import logging
+import threading
+
+from src.storage.database import DB_PATH, connect, read_bar_arrays, upsert_bars
+from src.market_calendar.nyse import get_calendar
+
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteProvider:
+    """
+    Interface every quote source implements: last_price(ticker) returns the latest traded price of a ticker.
+    """
+    name = "base"
+
+    def last_price(self, ticker: str="TQQQ") -> float:
+        raise NotImplementedError
+
+    def __call__(self, ticker: str="TQQQ") -> float:
+        # lets a provider be passed anywhere a get_quote function is expected (e.g. run_entry_pipeline)
+        return self.last_price(ticker)
+
+
+class YFinanceQuoteProvider(QuoteProvider):
+    """
+    Last price from Yahoo Finance's fast_info, a single small chart request instead of the full company profile behind .info.
+    """
+    name = "yfinance"
+
+    def last_price(self, ticker: str="TQQQ") -> float:
+        import yfinance as yf
+        return float(yf.Ticker(ticker).fast_info["lastPrice"])
+
+
+class SchwabQuoteProvider(QuoteProvider):
+    """
+    Last price from Schwab's market data API through an existing SchwabClient.
+    """
+    name = "schwab"
+
+    def __init__(self, client):
+        self.client = client
+
+    def last_price(self, ticker: str="TQQQ") -> float:
+        return self.client.get_quote(ticker)
+
+
+class CachedQuoteProvider(QuoteProvider):
+    """
+    Remembers each ticker's price for ttl seconds, so several lookups in quick succession only go out to the provider once.
+    """
+    def __init__(self, provider: QuoteProvider, ttl: float=2.0):
+        self.provider = provider
+        self.ttl = ttl
+        self.name = f"cached {provider.name}"
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def last_price(self, ticker: str="TQQQ") -> float:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(ticker)
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1]
+        price = self.provider.last_price(ticker)
+        with self._lock:
+            self._cache[ticker] = (now, price)
+        return price
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+def _stored_close(conn, ticker: str, session: datetime.date) -> float:
+    """
+    Close of a session from the stored bars, checking daily bars first and then minute bars (up to the session's close, so after-hours
+    bars don't count).
+    """
+    start, end = datetime.datetime.combine(session, datetime.time()), get_calendar().session_close(session)
+    for interval in ["1d", "1m"]:
+        close = read_bar_arrays(conn, ticker, interval, start, end)["Close"]
+        if len(close):
+            return float(close[-1])
+    return None
+
+
+def previous_close(ticker: str="TQQQ", today: datetime.date=None, db_path: str=DB_PATH) -> float:
+    """
+    Closing price of the session before today.
+
+    The previous session comes from the trading calendar and its close from trading_data.sqlite.  Only if nothing is stored for that session
+    is the last week of daily bars downloaded, once, and upserted into the bars table so the next call finds them.
+    """
+    today = today or datetime.date.today()
+    session = get_calendar().previous_session(today)
+    conn = connect(db_path)
+    try:
+        close = _stored_close(conn, ticker, session)
+        if close is not None:
+            return close
+        import yfinance as yf
+        logger.debug("No stored close for %s before %s, downloading daily bars.", ticker, today)
+        data = yf.download(tickers=ticker, start=session - datetime.timedelta(days=7), end=today, interval="1d", progress=False, threads=False)
+        if data.empty:
+            raise LookupError(f"No daily bars for {ticker} around {session}.")
+        upsert_bars(conn, ticker, "1d", data)
+        return _stored_close(conn, ticker, session)
+    finally:
+        conn.close()
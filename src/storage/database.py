@@ -0,0 +1,265 @@
+"""
+SQLite storage for market data and the trade ledger, backing trading_data.sqlite.
+
+Tables:
+- bars: (ticker, interval, ts) keyed OHLCV bars, ts being nanoseconds since epoch of US/Eastern wall-clock time (same as the backtest bar store)
+- orders: Schwab orders, keyed by order id
+- fills: executed trades from Schwab's transactions endpoint, keyed by activity id
+- daily_pnl: one row per (date, ticker) with the day's realized P&L
+- daemon_state: JSON values by key, where the trading daemon keeps what it has done so it can pick up again after a crash
+
+Every write is an idempotent upsert done with a single executemany, so the morning and afternoon runs (or a re-run of either) can write the
+same rows again without duplicating anything.  The database runs in WAL mode so a backtest can read while a trading run writes.
+
+NumPy and pandas are only imported by the bar functions that need them, so the trading scripts (which only write orders, fills and P&L)
+can use this module with nothing but the standard library.
+"""
+from __future__ import annotations
+
+import sqlite3
+import json
+import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+DB_PATH = "trading_data.sqlite"
+MARKET_TZ = "America/New_York"
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume INTEGER NOT NULL,
+    PRIMARY KEY (ticker, interval, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    ticker TEXT,
+    instruction TEXT,
+    quantity REAL,
+    filled_quantity REAL,
+    order_type TEXT,
+    strategy_type TEXT,
+    status TEXT,
+    price REAL,
+    stop_price REAL,
+    entered_time TEXT,
+    close_time TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_orders_entered_time ON orders (entered_time);
+
+CREATE TABLE IF NOT EXISTS fills (
+    activity_id TEXT PRIMARY KEY,
+    order_id TEXT,
+    ticker TEXT,
+    quantity REAL,
+    price REAL,
+    net_amount REAL,
+    time TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_fills_ticker_time ON fills (ticker, time);
+
+CREATE TABLE IF NOT EXISTS daily_pnl (
+    date TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    realized_pnl REAL NOT NULL,
+    bought REAL NOT NULL,
+    sold REAL NOT NULL,
+    trades INTEGER NOT NULL,
+    PRIMARY KEY (date, ticker)
+);
+
+CREATE TABLE IF NOT EXISTS daemon_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+"""
+
+
+def connect(path: str=DB_PATH) -> sqlite3.Connection:
+    """
+    Opens the trading database in WAL mode, creating the tables and indexes if they aren't there yet.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is durable across application crashes in WAL mode, and skips an fsync per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _bar_timestamps(index: pd.Index) -> np.ndarray:
+    import numpy as np
+    import pandas as pd
+    index = pd.DatetimeIndex(pd.to_datetime(index))
+    if index.tz is not None:
+        index = index.tz_convert(MARKET_TZ).tz_localize(None)
+    return index.values.astype("datetime64[ns]").view(np.int64)
+
+
+def upsert_bars(conn: sqlite3.Connection, ticker: str, interval: str, data: pd.DataFrame) -> int:
+    """
+    Inserts or updates OHLCV bars, accepting either a timezone-aware index (YFinance) or a naive US/Eastern one (the bar store).
+
+    Returns the number of rows written.
+    """
+    import numpy as np
+    import pandas as pd
+    if data.empty:
+        return 0
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.droplevel(-1, axis="columns")
+    ts = _bar_timestamps(data.index)
+    values = data[BAR_COLUMNS].to_numpy(dtype=np.float64)
+    rows = zip([ticker.upper()] * len(ts), [interval] * len(ts), ts.tolist(), values[:, 0].tolist(), values[:, 1].tolist(),
+               values[:, 2].tolist(), values[:, 3].tolist(), values[:, 4].astype(np.int64).tolist())
+    with conn:
+        conn.executemany("""
+            INSERT INTO bars (ticker, interval, ts, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (ticker, interval, ts) DO UPDATE SET
+                open = excluded.open, high = excluded.high, low = excluded.low, close = excluded.close, volume = excluded.volume""", rows)
+    return len(ts)
+
+
+def _bar_range(ticker: str, interval: str, start: datetime.datetime, end: datetime.datetime) -> tuple:
+    import pandas as pd
+    query = "SELECT ts, open, high, low, close, volume FROM bars WHERE ticker = ? AND interval = ?"
+    params = [ticker.upper(), interval]
+    if start is not None:
+        query += " AND ts >= ?"
+        params.append(int(pd.Timestamp(start).value))
+    if end is not None:
+        query += " AND ts < ?"
+        params.append(int(pd.Timestamp(end).value))
+    return query + " ORDER BY ts", params
+
+
+def read_bar_arrays(conn: sqlite3.Connection, ticker: str, interval: str, start: datetime.datetime=None, end: datetime.datetime=None) -> dict:
+    """
+    Bars in [start, end) as NumPy arrays: "ts" (int64 ns), "Open", "High", "Low", "Close" (float64) and "Volume" (int64).
+    """
+    import numpy as np
+    query, params = _bar_range(ticker, interval, start, end)
+    rows = conn.execute(query, params).fetchall()
+    if not rows:
+        arrays = {"ts": np.empty(0, dtype=np.int64)}
+        arrays.update({c: np.empty(0, dtype=np.float64) for c in BAR_COLUMNS[:4]})
+        arrays["Volume"] = np.empty(0, dtype=np.int64)
+        return arrays
+    ts, o, h, l, c, v = zip(*rows)
+    return {"ts": np.array(ts, dtype=np.int64), "Open": np.array(o), "High": np.array(h), "Low": np.array(l), "Close": np.array(c),
+            "Volume": np.array(v, dtype=np.int64)}
+
+
+def read_bars(conn: sqlite3.Connection, ticker: str, interval: str, start: datetime.datetime=None, end: datetime.datetime=None) -> pd.DataFrame:
+    """
+    Bars in [start, end) as a Datetime indexed frame, laid out the same way as the backtest bar store's.
+    """
+    import pandas as pd
+    arrays = read_bar_arrays(conn, ticker, interval, start, end)
+    index = pd.DatetimeIndex(arrays.pop("ts").view("datetime64[ns]"), name="Datetime")
+    return pd.DataFrame(arrays, index=index)
+
+
+def upsert_orders(conn: sqlite3.Connection, orders: list) -> int:
+    """
+    Inserts or updates orders as returned by Schwab's orders endpoints.  OCO parents are stored along with each of their child orders.
+    """
+    rows = []
+    stack = list(orders)
+    while stack:
+        order = stack.pop()
+        stack.extend(order.get("childOrderStrategies", []))
+        if "orderId" not in order:
+            continue
+        legs = order.get("orderLegCollection") or [{}]
+        rows.append((str(order["orderId"]), legs[0].get("instrument", {}).get("symbol"), legs[0].get("instruction"), order.get("quantity"),
+                     order.get("filledQuantity"), order.get("orderType"), order.get("orderStrategyType"), order.get("status"),
+                     order.get("price"), order.get("stopPrice"), order.get("enteredTime"), order.get("closeTime"), json.dumps(order)))
+    with conn:
+        conn.executemany("""
+            INSERT INTO orders (order_id, ticker, instruction, quantity, filled_quantity, order_type, strategy_type, status, price, stop_price, entered_time, close_time, raw)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (order_id) DO UPDATE SET
+                filled_quantity = excluded.filled_quantity, status = excluded.status, close_time = excluded.close_time, raw = excluded.raw""", rows)
+    return len(rows)
+
+
+def upsert_fills(conn: sqlite3.Connection, transactions: list) -> int:
+    """
+    Inserts or updates fills from Schwab's transactions endpoint (type TRADE).  Fees and cash legs are skipped, only the equity leg is kept.
+    """
+    rows = []
+    for txn in transactions:
+        for item in txn.get("transferItems", []):
+            instrument = item.get("instrument", {})
+            if instrument.get("assetType") not in (None, "EQUITY", "COLLECTIVE_INVESTMENT"):
+                continue
+            rows.append((str(txn["activityId"]), str(txn.get("orderId")), instrument.get("symbol"), item.get("amount"), item.get("price"),
+                         txn.get("netAmount"), txn.get("time") or txn.get("tradeDate"), json.dumps(txn)))
+            break
+    with conn:
+        conn.executemany("""
+            INSERT INTO fills (activity_id, order_id, ticker, quantity, price, net_amount, time, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (activity_id) DO UPDATE SET
+                quantity = excluded.quantity, price = excluded.price, net_amount = excluded.net_amount, raw = excluded.raw""", rows)
+    return len(rows)
+
+
+def record_daily_pnl(conn: sqlite3.Connection, date: datetime.date) -> int:
+    """
+    Recomputes the daily_pnl rows of a date from that day's fills (net cash in minus net cash out, per ticker).
+    """
+    day = date.isoformat()
+    with conn:
+        cursor = conn.execute("""
+            INSERT INTO daily_pnl (date, ticker, realized_pnl, bought, sold, trades)
+            SELECT ?, ticker, SUM(net_amount), SUM(CASE WHEN net_amount < 0 THEN -net_amount ELSE 0 END),
+                   SUM(CASE WHEN net_amount > 0 THEN net_amount ELSE 0 END), COUNT(*)
+            FROM fills WHERE substr(time, 1, 10) = ? AND ticker IS NOT NULL GROUP BY ticker
+            ON CONFLICT (date, ticker) DO UPDATE SET
+                realized_pnl = excluded.realized_pnl, bought = excluded.bought, sold = excluded.sold, trades = excluded.trades""", (day, day))
+    return cursor.rowcount
+
+
+def put_state(conn: sqlite3.Connection, key: str, value) -> None:
+    """
+    Stores a JSON-able value under key, replacing what was there.
+    """
+    with conn:
+        conn.execute("""
+            INSERT INTO daemon_state (key, value, updated) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated = excluded.updated""",
+            (key, json.dumps(value, default=str), datetime.datetime.now().isoformat(timespec="seconds")))
+
+
+def get_state(conn: sqlite3.Connection, key: str, default=None):
+    """
+    The value stored under key, or default when there isn't one.
+    """
+    row = conn.execute("SELECT value FROM daemon_state WHERE key = ?", (key,)).fetchone()
+    return default if row is None else json.loads(row[0])
+
+
+def import_legacy_bars(conn: sqlite3.Connection, table: str, interval: str="1m") -> int:
+    """
+    Copies one of the old per-ticker tables written with DataFrame.to_sql (i.e. "TQQQ", as exp.py used to) into the bars table.
+    """
+    import pandas as pd
+    data = pd.read_sql(f'SELECT * FROM "{table}"', conn, index_col="Datetime")
+    data.index = pd.to_datetime(data.index, utc=True)
+    return upsert_bars(conn, table, interval, data)
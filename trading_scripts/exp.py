@@ -2,8 +2,8 @@ import logging
 from datetime import datetime
 import yfinance as yf
 import pandas as pd
-import sqlite3
 from src.schwab.account import get_account_positions
+from src.storage.database import connect, upsert_bars
 
 
 
@@ -15,6 +15,5 @@ from src.schwab.account import get_account_positions
 # logger.info(f"Time is now {datetime.now()}")
 
 # yahoo = yf.download("TQQQ", period="1d", interval="1m")
-# df = pd.DataFrame(yahoo)
-# conn = sqlite3.connect("trading_data.sqlite")
-# df.to_sql(name="TQQQ", con=con, if_exists="append")
\ No newline at end of file
+# conn = connect()
+# upsert_bars(conn, "TQQQ", "1m", yahoo)
\ No newline at end of file
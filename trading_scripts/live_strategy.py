@@ -0,0 +1,34 @@
+"""
+Runs a backtested strategy class live for today's session, unchanged, through the live adapter (src/live/adapter.py): minute bars are built
+from Schwab quotes and the strategy's orders are placed through the SchwabClient.
+"""
+import os
+import sys
+import asyncio
+
+from src.schwab.client import SchwabClient
+from src.live.adapter import run_session
+from src.logger.logger import init_logger
+from src.storage.database import connect, upsert_orders
+
+# the strategies live with the backtests and import each other with backtest/ on the path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backtest"))
+from models.VolatilityLongStrategy import VolatilityLongStrategy
+
+
+# init
+ticker = os.environ["TICKER"]
+logger = init_logger("live_strategy")
+logger.info("Live run of %s started.", VolatilityLongStrategy.__name__)
+client = SchwabClient()
+try:
+    client.refresh_access_token()
+except:
+    logger.critical("Error fetching access token.")
+    exit()
+
+broker = asyncio.run(run_session(VolatilityLongStrategy, client, ticker))
+logger.info("Live run finished with %s closed trade(s): %s", len(broker.closed_trades), broker.closed_trades)
+conn = connect()
+upsert_orders(conn, client.get_orders_from_today().json())
+conn.close()
@@ -2,44 +2,42 @@
 In the morning, we want to potentially buy stocks, and place the OCO order if we do.  BUT, we also want to check to make sure the orders go thru, and retry until they do.
 """
 import os
+import asyncio
 
-from src.schwab.auth import get_access_token
-from src.schwab.account import get_account_positions
-from src.schwab.order import place_market_order, place_oco_order
-from src.stock_data.yfin import get_current_price
+from src.schwab.client import SchwabClient
+from src.schwab.pipeline import run_entry_pipeline, FillTimeout
 from src.logger.logger import init_logger
+from src.storage.database import connect, upsert_orders
 
 
 
 # init
 ticker = os.environ["TICKER"]
-logger = init_logger()
+logger = init_logger("morning_trade")
 logger.info("Morning run started.")
+client = SchwabClient()
 try:
-    access_token = get_access_token()
+    # fetching the token up front also opens the connection that the orders below reuse
+    client.refresh_access_token()
 except:
     logger.critical("Error fetching access token.")
     exit()
 
-# First, we check to see how much money we have
-acct = get_account_positions(access_token=access_token)
-logger.debug(f"Account state at day start:\n{acct}")
-money = acct["liquidity"]
 # TODO: implement logic to decide if we want to buy or not, for now assume we always do
-# gets the current price, then calculates sale prices
-curr_price = get_current_price()
-profit_capture_price = 1.025 * curr_price
-loss_stop_price = 0.99 * curr_price
-loss_price = loss_stop_price - 0.01
-logger.debug(f"The current price is {curr_price}.  Spread has a high of {profit_capture_price} and low of {loss_stop_price}")
-
-# ordering time
-quantity = money / curr_price
-market_order_resp = place_market_order(access_token=access_token, quantity=quantity, instruction="BUY", ticker=ticker)
-logger.debug(f"Bought {quantity} of {ticker}, here's the response:\n{market_order_resp}")
-# TODO: make sure market order went thru
-oco_order_resp = place_oco_order(access_token=access_token, quantity=quantity, limit_price=profit_capture_price, stop_limit_price=loss_stop_price, stop_price=loss_price, ticker=ticker)
-logger.debug(f"Set OCO order, here's the response:\n{oco_order_resp}")
-# TODO: make sure OCO order is received
-logger.debug(f"Morning run complete.")
+# the pipeline reads the account and quote at once, buys, waits for the fill, then brackets the fill price with the OCO order
+try:
+    result = asyncio.run(run_entry_pipeline(client, ticker=ticker, profit_capture_percent=0.025, loss_aversion_percent=0.01))
+    logger.info("Entry pipeline timings (ms): %s", result["timings"], extra={"event": "entry_pipeline", "timings_ms": result["timings"]})
+except FillTimeout as e:
+    # the buy went out but nothing was bracketed, so whatever did get bought is sold again rather than held unprotected
+    logger.error("Entry didn't fill: %s", e)
+    position = client.get_account_positions()["positions"].get(ticker)
+    if position and position["quantity"] > 0:
+        logger.warning("Closing the %s shares of %s bought without a bracket.", position["quantity"], ticker)
+        response = client.place_market_order(quantity=position["quantity"], instruction="SELL", ticker=ticker)
+        logger.debug("Response from Schwab is:\n%s", response)
+conn = connect()
+upsert_orders(conn, client.get_orders_from_today().json())
+conn.close()
+logger.debug("Morning run complete.")
 